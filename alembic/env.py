@@ -0,0 +1,54 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.database import engine, Base
+from app import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Objetos de la búsqueda de texto (0005) que solo existen en PostgreSQL y no
+# están en los modelos; autogenerate no debe proponer borrarlos.
+SOLO_POSTGRES = {"busqueda", "ix_microrretos_busqueda", "ix_usuarios_nombre_prefijo"}
+
+
+def incluir_objeto(objeto, nombre, tipo, reflejado, comparado_con):
+    return not (reflejado and comparado_con is None and nombre in SOLO_POSTGRES)
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL sin conectarse (alembic upgrade --sql)."""
+    context.configure(
+        url=engine.url.render_as_string(hide_password=False),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    """Aplica las migraciones con el mismo engine que usa la aplicación."""
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_object=incluir_objeto,
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,106 @@
+"""Esquema inicial (el que creaba Base.metadata.create_all)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Las bases de datos existentes ya tienen estas tablas, así que solo se
+crean las que falten.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "usuarios" not in existentes:
+        op.create_table(
+            "usuarios",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("nombre", sa.String(), nullable=False),
+            sa.Column("edad", sa.Integer()),
+            sa.Column("categoria", sa.String()),
+            sa.Column("nivel", sa.Integer()),
+            sa.Column("racha_dias", sa.Integer()),
+            sa.Column("puntos", sa.Integer()),
+            sa.Column("activo", sa.Boolean()),
+        )
+        op.create_index("ix_usuarios_id", "usuarios", ["id"])
+
+    if "microrretos" not in existentes:
+        op.create_table(
+            "microrretos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("categoria", sa.String()),
+            sa.Column("dificultad", sa.String()),
+            sa.Column("contenido", sa.String()),
+            sa.Column("respuesta", sa.String()),
+        )
+        op.create_index("ix_microrretos_id", "microrretos", ["id"])
+
+    if "progreso" not in existentes:
+        op.create_table(
+            "progreso",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("reto_id", sa.Integer(), sa.ForeignKey("microrretos.id")),
+            sa.Column("completado", sa.Boolean()),
+            sa.Column("fecha", sa.DateTime()),
+        )
+        op.create_index("ix_progreso_id", "progreso", ["id"])
+
+    if "gamificacion" not in existentes:
+        op.create_table(
+            "gamificacion",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("badge", sa.String()),
+            sa.Column("puntos", sa.Integer()),
+        )
+        op.create_index("ix_gamificacion_id", "gamificacion", ["id"])
+
+    if "comunidades" not in existentes:
+        op.create_table(
+            "comunidades",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("nombre_reto", sa.String()),
+            sa.Column("categoria", sa.String()),
+            sa.Column("duracion", sa.Integer()),
+        )
+        op.create_index("ix_comunidades_id", "comunidades", ["id"])
+
+    if "usuarios_comunidad" not in existentes:
+        op.create_table(
+            "usuarios_comunidad",
+            sa.Column("usuario_id", sa.Integer(), sa.ForeignKey("usuarios.id")),
+            sa.Column("comunidad_id", sa.Integer(), sa.ForeignKey("comunidades.id")),
+        )
+
+    if "contadores" not in existentes:
+        op.create_table(
+            "contadores",
+            sa.Column("nombre", sa.String(), primary_key=True),
+            sa.Column("valor", sa.Integer(), nullable=False),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("contadores")
+    op.drop_table("usuarios_comunidad")
+    op.drop_table("comunidades")
+    op.drop_table("gamificacion")
+    op.drop_table("progreso")
+    op.drop_table("microrretos")
+    op.drop_table("usuarios")
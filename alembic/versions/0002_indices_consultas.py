@@ -0,0 +1,75 @@
+"""Índices para las consultas de los routers y clave compuesta en usuarios_comunidad
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Los índices simples se crean con CREATE INDEX CONCURRENTLY en PostgreSQL
+para no bloquear las escrituras sobre tablas grandes como `progreso`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, Sequence[str], None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nombre, tabla, columnas)
+INDICES = [
+    ("ix_usuarios_nombre", "usuarios", ["nombre"]),
+    ("ix_usuarios_activo", "usuarios", ["activo"]),
+    ("ix_gamificacion_puntos", "gamificacion", ["puntos"]),
+    ("ix_progreso_usuario_id", "progreso", ["usuario_id"]),
+    ("ix_progreso_reto_id", "progreso", ["reto_id"]),
+    ("ix_usuarios_comunidad_comunidad_id", "usuarios_comunidad", ["comunidad_id"]),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    # La clave compuesta exige filas sin nulos ni repetidas
+    op.execute("DELETE FROM usuarios_comunidad WHERE usuario_id IS NULL OR comunidad_id IS NULL")
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "DELETE FROM usuarios_comunidad a USING usuarios_comunidad b "
+            "WHERE a.ctid < b.ctid AND a.usuario_id = b.usuario_id AND a.comunidad_id = b.comunidad_id"
+        )
+    else:
+        op.execute(
+            "DELETE FROM usuarios_comunidad WHERE rowid NOT IN ("
+            "SELECT MIN(rowid) FROM usuarios_comunidad GROUP BY usuario_id, comunidad_id)"
+        )
+
+    with op.batch_alter_table("usuarios_comunidad") as batch:
+        batch.alter_column("usuario_id", existing_type=sa.Integer(), nullable=False)
+        batch.alter_column("comunidad_id", existing_type=sa.Integer(), nullable=False)
+        batch.create_primary_key("usuarios_comunidad_pkey", ["usuario_id", "comunidad_id"])
+
+    # Un usuario tiene como máximo un registro de gamificación: se conserva el primero
+    op.execute(
+        "DELETE FROM gamificacion WHERE usuario_id IS NOT NULL AND id NOT IN ("
+        "SELECT MIN(id) FROM gamificacion WHERE usuario_id IS NOT NULL GROUP BY usuario_id)"
+    )
+    op.create_index("ix_gamificacion_usuario_id", "gamificacion", ["usuario_id"], unique=True)
+
+    with op.get_context().autocommit_block():
+        for nombre, tabla, columnas in INDICES:
+            op.create_index(nombre, tabla, columnas, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for nombre, tabla, _ in reversed(INDICES):
+        op.drop_index(nombre, table_name=tabla)
+
+    op.drop_index("ix_gamificacion_usuario_id", table_name="gamificacion")
+
+    with op.batch_alter_table("usuarios_comunidad") as batch:
+        batch.drop_constraint("usuarios_comunidad_pkey", type_="primary")
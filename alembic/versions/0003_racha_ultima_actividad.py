@@ -0,0 +1,42 @@
+"""Última actividad del usuario e índice (usuario_id, fecha) en progreso
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+`usuarios.ultima_actividad` permite actualizar la racha en O(1) con cada
+progreso completado. Tras migrar, `python -m app.rachas` recalcula racha,
+nivel y puntos a partir del historial.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, Sequence[str], None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("usuarios", sa.Column("ultima_actividad", sa.Date()))
+
+    # El índice compuesto cubre también las búsquedas por usuario_id
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_progreso_usuario_id_fecha", "progreso", ["usuario_id", "fecha"],
+            postgresql_concurrently=True
+        )
+        op.drop_index("ix_progreso_usuario_id", table_name="progreso", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index("ix_progreso_usuario_id", "progreso", ["usuario_id"])
+    op.drop_index("ix_progreso_usuario_id_fecha", table_name="progreso")
+    with op.batch_alter_table("usuarios") as batch:
+        batch.drop_column("ultima_actividad")
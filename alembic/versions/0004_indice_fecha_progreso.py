@@ -0,0 +1,30 @@
+"""Índice por fecha en progreso
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Las estadísticas de /reportes/estadisticas filtran progreso por ventana de
+fechas; sin este índice cada consulta recorre la tabla completa.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, Sequence[str], None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index("ix_progreso_fecha", "progreso", ["fecha"], postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_progreso_fecha", table_name="progreso")
@@ -0,0 +1,76 @@
+"""Búsqueda de texto en microrretos y por prefijo en nombres de usuario
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Solo PostgreSQL (en SQLite la búsqueda usa un índice invertido en memoria,
+ver app/busqueda.py):
+  - sin_acentos(text): minúsculas y sin tildes. Usa la extensión unaccent si
+    el servidor la tiene y, si no, translate(); es IMMUTABLE para poder
+    usarse en columnas generadas e índices.
+  - microrretos.busqueda: tsvector generado (contenido con peso A, respuesta
+    con peso B) con el diccionario español, e índice GIN.
+  - índice por prefijo sobre sin_acentos(nombre) de los usuarios activos
+    (COLLATE "C" para que sirva también al ORDER BY).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Para translate() sobre el texto ya en minúsculas
+CON_TILDE = "áàâäéèêëíìîïóòôöúùûüñç"
+SIN_TILDE = "aaaaeeeeiiiioooouuuunc"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+
+    disponible = bind.exec_driver_sql(
+        "SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'"
+    ).scalar()
+    if disponible:
+        op.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+        cuerpo = "SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1))"
+    else:
+        cuerpo = f"SELECT translate(lower($1), '{CON_TILDE}', '{SIN_TILDE}')"
+
+    op.execute(
+        "CREATE OR REPLACE FUNCTION sin_acentos(text) RETURNS text "
+        f"LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE AS $$ {cuerpo} $$"
+    )
+
+    op.execute(
+        "ALTER TABLE microrretos ADD COLUMN busqueda tsvector GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('spanish'::regconfig, coalesce(sin_acentos(contenido), '')), 'A') || "
+        "setweight(to_tsvector('spanish'::regconfig, coalesce(sin_acentos(respuesta), '')), 'B')"
+        ") STORED"
+    )
+
+    with op.get_context().autocommit_block():
+        op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_microrretos_busqueda ON microrretos USING gin (busqueda)")
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usuarios_nombre_prefijo "
+            "ON usuarios ((sin_acentos(nombre) COLLATE \"C\"), id) WHERE activo"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("DROP INDEX IF EXISTS ix_usuarios_nombre_prefijo")
+    op.execute("DROP INDEX IF EXISTS ix_microrretos_busqueda")
+    op.execute("ALTER TABLE microrretos DROP COLUMN IF EXISTS busqueda")
+    op.execute("DROP FUNCTION IF EXISTS sin_acentos(text)")
@@ -0,0 +1,47 @@
+"""Índice (comunidad_id, usuario_id) para paginar participantes
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+Con el índice solo por comunidad_id, cada página de participantes tenía que
+ordenar todos los miembros de la comunidad; con el compuesto se lee
+directamente el tramo que sigue al cursor. Sustituye al índice simple, que
+queda cubierto por el prefijo del nuevo.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, Sequence[str], None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_usuarios_comunidad_comunidad_id_usuario_id", "usuarios_comunidad",
+            ["comunidad_id", "usuario_id"], postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_usuarios_comunidad_comunidad_id", table_name="usuarios_comunidad",
+            postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_usuarios_comunidad_comunidad_id", "usuarios_comunidad",
+            ["comunidad_id"], postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_usuarios_comunidad_comunidad_id_usuario_id", table_name="usuarios_comunidad",
+            postgresql_concurrently=True
+        )
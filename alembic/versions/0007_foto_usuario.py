@@ -0,0 +1,32 @@
+"""Foto de perfil del usuario
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+`usuarios.foto` guarda el hash del contenido de la imagen subida; las
+miniaturas están en app/static/img/uploads (ver app/avatares.py). Varios
+usuarios con la misma imagen comparten las miniaturas.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, Sequence[str], None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("usuarios", sa.Column("foto", sa.String(32)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("usuarios") as batch:
+        batch.drop_column("foto")
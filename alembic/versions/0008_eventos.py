@@ -0,0 +1,41 @@
+"""Outbox de eventos
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+Tabla `eventos`: una fila por cambio en usuarios, progreso, gamificación y
+comunidades, escrita en la misma transacción que el cambio. Los
+consumidores la leen por rangos de id (`GET /eventos?desde=`), así que basta
+la clave primaria.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008"
+down_revision: Union[str, Sequence[str], None] = "0007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "eventos",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("tipo", sa.String(), nullable=False),
+        sa.Column("entidad_id", sa.Integer()),
+        sa.Column("datos", sa.JSON()),
+        sa.Column("creado", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("eventos")
+    op.execute("DELETE FROM contadores WHERE nombre = 'eventos'")
@@ -0,0 +1,42 @@
+"""Id de eventos desde una secuencia
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+El id de `eventos` lo asignaba el contador `eventos`, cuya fila quedaba
+bloqueada hasta el commit y serializaba todas las escrituras con eventos.
+Ahora lo asigna la base de datos: en PostgreSQL una secuencia que empieza
+después del último id; en SQLite ya lo hace INTEGER PRIMARY KEY.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, Sequence[str], None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("CREATE SEQUENCE eventos_id_seq OWNED BY eventos.id")
+        op.execute("SELECT setval('eventos_id_seq', COALESCE((SELECT MAX(id) FROM eventos), 0) + 1, false)")
+        op.alter_column("eventos", "id", server_default=sa.text("nextval('eventos_id_seq')"))
+    op.execute("DELETE FROM contadores WHERE nombre = 'eventos'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        op.alter_column("eventos", "id", server_default=None)
+        op.execute("DROP SEQUENCE eventos_id_seq")
+    op.execute(
+        "INSERT INTO contadores (nombre, valor) "
+        "SELECT 'eventos', COALESCE(MAX(id), 0) FROM eventos"
+    )
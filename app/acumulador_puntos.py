@@ -0,0 +1,130 @@
+"""
+Archivo: acumulador_puntos.py
+Descripción: Escritura diferida de puntos (PUNTOS_ESCRITURA_DIFERIDA=1).
+Los incrementos de sumar_puntos se acumulan en memoria por usuario y se
+vuelcan en lote cada PUNTOS_INTERVALO_MS con un UPDATE por usuario dentro de
+una sola transacción. Si el proceso muere antes del volcado se pierden los
+incrementos pendientes (como mucho, un intervalo).
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from sqlalchemy import update, bindparam
+
+from app import models, contadores, eventos
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+ACTIVO = os.getenv("PUNTOS_ESCRITURA_DIFERIDA", "0") == "1"
+INTERVALO_S = int(os.getenv("PUNTOS_INTERVALO_MS", "200")) / 1000
+
+_tabla = models.Gamificacion.__table__
+
+_ACTUALIZAR = (
+    update(_tabla)
+    .where(_tabla.c.usuario_id == bindparam("u"))
+    .values(puntos=_tabla.c.puntos + bindparam("n"))
+)
+
+
+class AcumuladorPuntos:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._volcando = threading.Lock()  # Un volcado cada vez; ver `sin_volcar`
+        self._pendientes = defaultdict(int)
+        self._en_vuelo = {}  # lote que se está escribiendo ahora mismo
+
+    def sumar(self, usuario_id: int, puntos: int):
+        with self._lock:
+            self._pendientes[usuario_id] += puntos
+
+    def pendiente(self, usuario_id: int) -> int:
+        """
+        Puntos de `usuario_id` que todavía no están en la base de datos.
+        """
+        with self._lock:
+            return self._pendientes.get(usuario_id, 0) + self._en_vuelo.get(usuario_id, 0)
+
+    def pendientes(self) -> dict:
+        """
+        {usuario_id: puntos} de todos los incrementos que no están en la base de datos.
+        """
+        with self._lock:
+            pendientes = dict(self._en_vuelo)
+            for usuario_id, puntos in self._pendientes.items():
+                pendientes[usuario_id] = pendientes.get(usuario_id, 0) + puntos
+            return pendientes
+
+    def sin_volcar(self):
+        """
+        Context manager que espera al volcado en curso y no deja empezar otro
+        hasta salir: lo que se lea de la base de datos mientras tanto más
+        `pendientes()` es el total exacto.
+        """
+        return self._volcando
+
+    def volcar(self) -> int:
+        """
+        Escribe todos los incrementos pendientes. Devuelve cuántos usuarios se actualizaron.
+        """
+        with self._volcando:
+            return self._volcar()
+
+    def _volcar(self) -> int:
+        with self._lock:
+            if not self._pendientes or self._en_vuelo:
+                return 0
+            self._en_vuelo, self._pendientes = dict(self._pendientes), defaultdict(int)
+            lote = self._en_vuelo
+
+        # Orden fijo por usuario para que dos workers no se bloqueen mutuamente
+        filas = [{"u": usuario_id, "n": puntos} for usuario_id, puntos in sorted(lote.items()) if puntos]
+
+        db = SessionLocal()
+        try:
+            if filas:
+                db.execute(_ACTUALIZAR, filas)
+                contadores.incrementar(db, contadores.VERSION_RANKING)
+                eventos.registrar_varios(
+                    db, "gamificacion.puntos", [(fila["u"], {"sumados": fila["n"]}) for fila in filas]
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Se devuelven al acumulador para el siguiente intento, y dejan de
+            # estar en vuelo a la vez: `pendiente()` no los cuenta dos veces
+            with self._lock:
+                for usuario_id, puntos in lote.items():
+                    self._pendientes[usuario_id] += puntos
+                self._en_vuelo = {}
+            raise
+        finally:
+            db.close()
+            with self._lock:
+                self._en_vuelo = {}
+
+        return len(filas)
+
+
+acumulador = AcumuladorPuntos()
+
+
+async def volcado_periodico():
+    """
+    Tarea de fondo que vuelca el acumulador cada INTERVALO_S. Al cancelarse
+    (apagado de la aplicación) hace un último volcado.
+    """
+    try:
+        while True:
+            await asyncio.sleep(INTERVALO_S)
+            try:
+                await asyncio.to_thread(acumulador.volcar)
+            except Exception:
+                logger.exception("Falló el volcado de puntos diferidos")
+    finally:
+        acumulador.volcar()
@@ -0,0 +1,293 @@
+"""
+Archivo: avatares.py
+Descripción: Fotos de perfil de los usuarios.
+
+- La imagen subida se escribe por trozos en un temporal mientras se calcula
+  su hash; nunca se tiene entera en memoria.
+- El hash es el nombre de la foto (`usuarios.foto`): la misma imagen subida
+  dos veces (o por dos usuarios) se procesa una sola vez.
+- Las miniaturas WebP cuadradas (TAMANOS) las genera un pool de
+  AVATARES_PROCESOS procesos con prioridad baja, fuera de la petición. El
+  original no se guarda.
+- Las miniaturas quedan en app/static/img/uploads/<2 primeros>/<hash>-<tamaño>.webp
+  y, como su nombre depende del contenido, se sirven como inmutables.
+"""
+import asyncio
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app import contadores, estaticos, eventos, models
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CARPETA = os.path.join(estaticos.DIRECTORIO, "img", "uploads")
+URL = estaticos.PREFIJO + "img/uploads"
+TAMANOS = (48, 96, 256)
+PROCESOS = int(os.getenv("AVATARES_PROCESOS", "2"))
+MAX_PENDIENTES = int(os.getenv("AVATARES_MAX_PENDIENTES", "32"))
+MAX_BYTES = int(os.getenv("AVATARES_MAX_MB", "10")) * 1024 * 1024
+MAX_PIXELES = 50_000_000  # Más que esto no es una foto: se rechaza antes de decodificarla
+FORMATOS = {"JPEG", "PNG", "WEBP", "GIF"}
+TROZO = 64 * 1024
+CALIDAD = 80
+PRIORIDAD = 10  # os.nice() de los procesos del pool
+
+
+class ImagenInvalida(Exception):
+    pass
+
+
+class ImagenDemasiadoGrande(Exception):
+    pass
+
+
+class ColaLlena(Exception):
+    pass
+
+
+def ruta(foto: str, tamano: int) -> str:
+    return os.path.join(CARPETA, foto[:2], f"{foto}-{tamano}.webp")
+
+
+def url(foto, tamano: int):
+    """
+    URL de la miniatura de `tamano` px (en las plantillas, `avatar(...)`).
+    """
+    if not foto:
+        return None
+    return f"{URL}/{foto[:2]}/{foto}-{tamano}.webp"
+
+
+def miniaturas(foto: str) -> dict:
+    return {tamano: url(foto, tamano) for tamano in TAMANOS}
+
+
+def existe(foto: str) -> bool:
+    return all(os.path.exists(ruta(foto, tamano)) for tamano in TAMANOS)
+
+
+# ==========================================================
+#  RECEPCIÓN
+# ==========================================================
+class Subida:
+    """
+    Temporal donde se escribe la imagen mientras llega. `cerrar()` devuelve
+    el hash (nombre de la foto).
+    """
+
+    def __init__(self):
+        descriptor, self.temporal = tempfile.mkstemp(suffix=".avatar")
+        self._archivo = os.fdopen(descriptor, "wb")
+        self._hash = hashlib.blake2b(digest_size=16)
+        self.tamano = 0
+        self.foto = None
+
+    def escribir(self, trozo: bytes):
+        self.tamano += len(trozo)
+        if self.tamano > MAX_BYTES:
+            raise ImagenDemasiadoGrande()
+        self._hash.update(trozo)
+        self._archivo.write(trozo)
+
+    def cerrar(self) -> str:
+        self._archivo.close()
+        if self.tamano == 0:
+            raise ImagenInvalida("Archivo vacío")
+        self.foto = self._hash.hexdigest()
+        return self.foto
+
+    def descartar(self):
+        self._archivo.close()
+        if os.path.exists(self.temporal):
+            os.remove(self.temporal)
+
+
+async def recibir(trozos) -> Subida:
+    """
+    Copia el cuerpo de la petición (`request.stream()`) a una Subida cerrada.
+    """
+    subida = Subida()
+    try:
+        # Escrituras pequeñas a la caché de páginas del sistema: no merece la pena un hilo por trozo
+        async for trozo in trozos:
+            subida.escribir(trozo)
+        subida.cerrar()
+    except BaseException:
+        subida.descartar()
+        raise
+    return subida
+
+
+async def recibir_archivo(archivo) -> Subida:
+    """
+    Igual que `recibir` para un UploadFile de un formulario.
+    """
+    async def trozos():
+        while trozo := await archivo.read(TROZO):
+            yield trozo
+    return await recibir(trozos())
+
+
+def verificar(subida: Subida):
+    """
+    Comprueba formato y dimensiones leyendo solo la cabecera de la imagen.
+    Lanza ImagenInvalida.
+    """
+    try:
+        with Image.open(subida.temporal) as imagen:
+            formato, (ancho, alto) = imagen.format, imagen.size
+    except (OSError, Image.DecompressionBombError, ValueError):
+        raise ImagenInvalida("El archivo no es una imagen válida")
+    if formato not in FORMATOS:
+        raise ImagenInvalida(f"Formato no admitido: {formato}")
+    if ancho * alto > MAX_PIXELES:
+        raise ImagenInvalida("La imagen tiene demasiados píxeles")
+
+
+# ==========================================================
+#  PROCESOS DEL POOL
+# ==========================================================
+def _iniciar_proceso():
+    # Que el redimensionado no le quite CPU a los workers de la API
+    if hasattr(os, "nice"):
+        os.nice(PRIORIDAD)
+    Image.MAX_IMAGE_PIXELS = MAX_PIXELES
+
+
+def _guardar(imagen: Image.Image, destino: str):
+    # Temporal + replace: nunca se sirve una miniatura a medias
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix=".tmp")
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            imagen.save(archivo, "WEBP", quality=CALIDAD, method=4)
+        os.replace(temporal, destino)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+def _miniaturas(temporal: str, foto: str):
+    """
+    Se ejecuta dentro del pool. Genera las miniaturas de la mayor a la menor
+    (cada una a partir de la anterior) y borra el temporal.
+    """
+    try:
+        os.makedirs(os.path.dirname(ruta(foto, TAMANOS[0])), exist_ok=True)
+        with Image.open(temporal) as imagen:
+            # En JPEG decodifica directamente a 1/2, 1/4 o 1/8 si basta para el mayor tamaño
+            imagen.draft("RGB", (max(TAMANOS), max(TAMANOS)))
+            imagen = ImageOps.exif_transpose(imagen)
+            imagen = imagen.convert("RGBA" if "A" in imagen.getbands() or "transparency" in imagen.info else "RGB")
+            for tamano in sorted(TAMANOS, reverse=True):
+                imagen = ImageOps.fit(imagen, (tamano, tamano), Image.Resampling.LANCZOS)
+                _guardar(imagen, ruta(foto, tamano))
+    finally:
+        os.remove(temporal)
+
+
+# ==========================================================
+#  PROCESADOR
+# ==========================================================
+class ProcesadorAvatares:
+
+    def __init__(self, procesos: int, max_pendientes: int):
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self._en_curso = {}  # foto -> Future
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _ejecutor(self) -> ProcessPoolExecutor:
+        # "spawn": los procesos no heredan las conexiones ni los hilos del worker
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_proceso
+            )
+        return self._pool
+
+    def procesar(self, subida: Subida):
+        """
+        Encola las miniaturas de la subida y devuelve su Future, o None si ya
+        existen. Si la misma imagen ya se está procesando devuelve ese mismo
+        Future. Lanza ColaLlena si hay max_pendientes en curso.
+        """
+        foto = subida.foto
+        with self._lock:
+            futuro = self._en_curso.get(foto)
+            if futuro is None and not existe(foto):
+                if len(self._en_curso) >= self.max_pendientes:
+                    subida.descartar()
+                    raise ColaLlena()
+                futuro = self._ejecutor().submit(_miniaturas, subida.temporal, foto)
+                self._en_curso[foto] = futuro
+                nuevo = True
+            else:
+                nuevo = False
+
+        if not nuevo:
+            subida.descartar()
+            return futuro
+        futuro.add_done_callback(lambda _: self._terminar(foto))
+        return futuro
+
+    def _terminar(self, foto: str):
+        with self._lock:
+            self._en_curso.pop(foto, None)
+
+    def pendientes(self) -> int:
+        with self._lock:
+            return len(self._en_curso)
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+procesador = ProcesadorAvatares(PROCESOS, MAX_PENDIENTES)
+
+
+# ==========================================================
+#  ASIGNACIÓN AL USUARIO
+# ==========================================================
+def asignar(db: Session, usuario_id: int, foto: str):
+    """
+    Pone la foto al usuario. No hace commit.
+    """
+    db.execute(update(models.Usuario).where(models.Usuario.id == usuario_id).values(foto=foto))
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.foto", usuario_id, foto=foto)
+
+
+def asignar_en_sesion(usuario_id: int, foto: str):
+    db = SessionLocal()
+    try:
+        asignar(db, usuario_id, foto)
+        db.commit()
+    finally:
+        db.close()
+
+
+async def asignar_al_terminar(futuro, usuario_id: int, foto: str):
+    """
+    Tarea en segundo plano: cuando estén las miniaturas, asigna la foto. Si
+    el procesado falla, el usuario se queda con la foto que tenía.
+    """
+    try:
+        await asyncio.wrap_future(futuro)
+    except Exception:
+        logger.exception("Falló el procesado de la foto %s del usuario %s", foto, usuario_id)
+        return
+    await asyncio.to_thread(asignar_en_sesion, usuario_id, foto)
@@ -0,0 +1,236 @@
+"""
+Archivo: busqueda.py
+Descripción: Búsqueda de texto en los microrretos (contenido y respuesta,
+ordenada por relevancia) y sugerencias de usuarios por prefijo del nombre.
+
+En PostgreSQL se usa la columna tsvector `microrretos.busqueda` con su
+índice GIN y el índice por prefijo de nombres (migración 0005): diccionario
+español, sin distinguir mayúsculas ni tildes.
+
+En SQLite (desarrollo y pruebas) se usa un índice invertido en memoria con
+la misma normalización y una versión simplificada de la reducción a raíces;
+se reconstruye en la siguiente búsqueda tras cualquier escritura.
+"""
+import math
+import re
+import threading
+import unicodedata
+
+from sortedcontainers import SortedList
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import ES_SQLITE
+
+PESO_CONTENIDO = 1.0    # peso A en PostgreSQL
+PESO_RESPUESTA = 0.4    # peso B en PostgreSQL
+
+
+# ==========================================================
+#  NORMALIZACIÓN (índice en memoria)
+# ==========================================================
+PALABRAS_VACIAS = frozenset("""
+a al algo como con cual cuando de del desde donde el ella en entre es esa ese esta este
+fue ha hay la las le lo los mas me mi muy no o para pero por que se si sin sobre su sus
+tambien te tu un una uno unos y ya
+""".split())
+
+# Sufijos que se quitan (el más largo primero), como aproximación al stemmer español
+SUFIJOS = (
+    "amientos", "imientos", "amiento", "imiento", "aciones", "uciones", "idades",
+    "mente", "acion", "ucion", "idad", "ances", "ancia", "encia", "ible", "able",
+    "ando", "iendo", "ados", "idos", "adas", "idas", "ado", "ido", "ada", "ida",
+    "ar", "er", "ir", "es", "os", "as", "s", "o", "a", "e",
+)
+LARGO_MINIMO_RAIZ = 3
+
+_PALABRA = re.compile(r"\w+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Minúsculas y sin tildes (la ñ pasa a n, igual que en sin_acentos()).
+    """
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def raiz(palabra: str) -> str:
+    for sufijo in SUFIJOS:
+        if palabra.endswith(sufijo) and len(palabra) - len(sufijo) >= LARGO_MINIMO_RAIZ:
+            return palabra[:-len(sufijo)]
+    return palabra
+
+
+def terminos(texto: str):
+    return [
+        raiz(palabra) for palabra in _PALABRA.findall(normalizar(texto or ""))
+        if palabra not in PALABRAS_VACIAS
+    ]
+
+
+class IndiceMemoria:
+    """
+    Índice invertido de microrretos y lista ordenada de nombres de usuario.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._retos = None       # (término -> {reto_id: peso}, total de retos)
+        self._usuarios = None    # SortedList de (nombre normalizado, id, nombre)
+        # Si cambian mientras se construye un índice, no se guarda (estaría viejo)
+        self._version_retos = 0
+        self._version_usuarios = 0
+
+    def invalidar_retos(self):
+        with self._lock:
+            self._retos = None
+            self._version_retos += 1
+
+    def invalidar_usuarios(self):
+        with self._lock:
+            self._usuarios = None
+            self._version_usuarios += 1
+
+    def _indice_retos(self, db: Session):
+        with self._lock:
+            if self._retos is not None:
+                return self._retos
+            version = self._version_retos
+
+        indice = {}
+        total = 0
+        filas = db.execute(select(models.MicroReto.id, models.MicroReto.contenido, models.MicroReto.respuesta))
+        for reto_id, contenido, respuesta in filas:
+            total += 1
+            for texto, peso in ((contenido, PESO_CONTENIDO), (respuesta, PESO_RESPUESTA)):
+                for termino in terminos(texto):
+                    pesos = indice.setdefault(termino, {})
+                    pesos[reto_id] = pesos.get(reto_id, 0.0) + peso
+
+        with self._lock:
+            if version == self._version_retos:
+                self._retos = (indice, total)
+        return indice, total
+
+    def _indice_usuarios(self, db: Session):
+        with self._lock:
+            if self._usuarios is not None:
+                return self._usuarios
+            version = self._version_usuarios
+
+        nombres = SortedList(
+            (normalizar(nombre), usuario_id, nombre)
+            for usuario_id, nombre in db.execute(
+                select(models.Usuario.id, models.Usuario.nombre).where(models.Usuario.activo == True)
+            )
+        )
+
+        with self._lock:
+            if version == self._version_usuarios:
+                self._usuarios = nombres
+        return nombres
+
+    def buscar_retos(self, db: Session, texto: str, desde: int, limite: int):
+        """
+        [(reto_id, relevancia)] de los retos que contienen todos los términos,
+        ordenados por relevancia (tf-idf) y después por ID.
+        """
+        indice, total = self._indice_retos(db)
+        consulta = set(terminos(texto))
+        if not consulta:
+            return []
+
+        # Se intersecan primero las listas más cortas
+        listas = sorted((indice.get(termino, {}) for termino in consulta), key=len)
+        candidatos = set(listas[0])
+        for pesos in listas[1:]:
+            candidatos &= pesos.keys()
+
+        puntuados = [
+            (sum(pesos[r] * math.log(1 + total / len(pesos)) for pesos in listas), r)
+            for r in candidatos
+        ]
+        puntuados.sort(key=lambda p: (-p[0], p[1]))
+        return [(r, round(p, 4)) for p, r in puntuados[desde:desde + limite]]
+
+    def sugerir_usuarios(self, db: Session, prefijo: str, limite: int):
+        nombres = self._indice_usuarios(db)
+        prefijo = normalizar(prefijo)
+        resultado = []
+        for normalizado, usuario_id, nombre in nombres.irange((prefijo,)):
+            if not normalizado.startswith(prefijo) or len(resultado) >= limite:
+                break
+            resultado.append((usuario_id, nombre))
+        return resultado
+
+
+indice = IndiceMemoria()
+
+
+# ==========================================================
+#  POSTGRESQL
+# ==========================================================
+_BUSQUEDA = literal_column("microrretos.busqueda")
+# Pesos {D, C, B, A} de ts_rank
+_PESOS = literal_column(f"'{{0.1, 0.2, {PESO_RESPUESTA}, {PESO_CONTENIDO}}}'::float4[]")
+
+
+def _buscar_retos_pg(db: Session, texto: str, desde: int, limite: int):
+    consulta = func.websearch_to_tsquery(literal_column("'spanish'::regconfig"), func.sin_acentos(texto))
+    relevancia = func.ts_rank(_PESOS, _BUSQUEDA, consulta)
+    filas = db.execute(
+        select(models.MicroReto.id, relevancia)
+        .where(_BUSQUEDA.op("@@")(consulta))
+        .order_by(relevancia.desc(), models.MicroReto.id)
+        .offset(desde)
+        .limit(limite)
+    )
+    return [(reto_id, round(valor, 4)) for reto_id, valor in filas]
+
+
+def _sugerir_usuarios_pg(db: Session, prefijo: str, limite: int):
+    # Misma expresión que el índice ix_usuarios_nombre_prefijo
+    normalizado = func.sin_acentos(models.Usuario.nombre).collate("C")
+    patron = re.sub(r"([\\%_])", r"\\\1", normalizar(prefijo)) + "%"
+    filas = db.execute(
+        select(models.Usuario.id, models.Usuario.nombre)
+        .where(models.Usuario.activo == True, normalizado.like(patron, escape="\\"))
+        .order_by(normalizado, models.Usuario.id)
+        .limit(limite)
+    )
+    return [tuple(fila) for fila in filas]
+
+
+# ==========================================================
+#  API DEL MÓDULO
+# ==========================================================
+def buscar_retos(db: Session, texto: str, desde: int = 0, limite: int = 20):
+    """
+    [(reto_id, relevancia)] de la página pedida.
+    """
+    if ES_SQLITE:
+        return indice.buscar_retos(db, texto, desde, limite)
+    return _buscar_retos_pg(db, texto, desde, limite)
+
+
+def sugerir_usuarios(db: Session, prefijo: str, limite: int = 10):
+    """
+    [(usuario_id, nombre)] de los usuarios activos cuyo nombre empieza por
+    `prefijo`, en orden alfabético.
+    """
+    if ES_SQLITE:
+        return indice.sugerir_usuarios(db, prefijo, limite)
+    return _sugerir_usuarios_pg(db, prefijo, limite)
+
+
+def invalidar_retos():
+    """
+    Llamar tras escribir microrretos (en PostgreSQL no hace falta, pero es inocuo).
+    """
+    indice.invalidar_retos()
+
+
+def invalidar_usuarios():
+    indice.invalidar_usuarios()
@@ -0,0 +1,226 @@
+"""
+Archivo: cache_respuestas.py
+Descripción: Caché de respuestas JSON ya serializadas para los endpoints de
+lectura del catálogo (microrretos y comunidades). Guarda los bytes de la
+respuesta con su ETag; los handlers de escritura invalidan su espacio y los
+clientes que ya tienen la versión vigente reciben un 304.
+
+Backends:
+  - MemoriaTTL (por defecto): LRU con TTL dentro del proceso. Con varios
+    workers cada uno invalida solo su copia; el TTL acota lo que puede
+    tardar en verse un cambio hecho en otro worker.
+  - RedisCache (CACHE_REDIS_URL): compartido entre workers. Acepta cualquier
+    cliente con get/set/incr (redis-py, fakeredis...).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+import anyio
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.paginacion import CABECERA_CURSOR
+
+TTL_S = int(os.getenv("CACHE_TTL_S", "300"))
+MAX_ENTRADAS = int(os.getenv("CACHE_MAX_ENTRADAS", "2048"))
+MAX_AGE_S = int(os.getenv("CACHE_MAX_AGE_S", "60"))
+REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+# Espacios que invalidan los handlers de escritura
+MICRORRETOS = "microrretos"
+COMUNIDADES = "comunidades"
+
+# Cabeceras de la respuesta original que se guardan junto al cuerpo
+CABECERAS_GUARDADAS = (CABECERA_CURSOR,)
+
+
+# ==========================================================
+#  BACKENDS
+# ==========================================================
+class MemoriaTTL:
+    remoto = False
+
+    def __init__(self, max_entradas: int, ttl_s: int):
+        self.max_entradas = max_entradas
+        self.ttl_s = ttl_s
+        self._entradas = OrderedDict()  # clave -> (caduca, bytes)
+        self._versiones = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            if entrada[0] <= time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return entrada[1]
+
+    def guardar(self, clave: str, valor: bytes):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic() + self.ttl_s, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def version(self, espacio: str) -> int:
+        with self._lock:
+            return self._versiones.get(espacio, 0)
+
+    def invalidar(self, espacio: str):
+        # Las entradas de la versión anterior ya no se piden y salen por LRU/TTL
+        with self._lock:
+            self._versiones[espacio] = self._versiones.get(espacio, 0) + 1
+
+
+class RedisCache:
+    remoto = True
+
+    def __init__(self, cliente, ttl_s: int, prefijo: str = "cache:"):
+        self.cliente = cliente
+        self.ttl_s = ttl_s
+        self.prefijo = prefijo
+
+    def obtener(self, clave: str) -> Optional[bytes]:
+        return self.cliente.get(self.prefijo + clave)
+
+    def guardar(self, clave: str, valor: bytes):
+        self.cliente.set(self.prefijo + clave, valor, ex=self.ttl_s)
+
+    def version(self, espacio: str) -> int:
+        return int(self.cliente.get(self.prefijo + "version:" + espacio) or 0)
+
+    def invalidar(self, espacio: str):
+        self.cliente.incr(self.prefijo + "version:" + espacio)
+
+
+def crear_backend():
+    if not REDIS_URL:
+        return MemoriaTTL(MAX_ENTRADAS, TTL_S)
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("CACHE_REDIS_URL requiere el paquete 'redis' (pip install redis)")
+    return RedisCache(redis.Redis.from_url(REDIS_URL), TTL_S)
+
+
+backend = crear_backend()
+
+
+def usar_backend(nuevo):
+    """
+    Sustituye el backend (por ejemplo, RedisCache con un cliente falso).
+    """
+    global backend
+    backend = nuevo
+
+
+def invalidar(espacio: str):
+    """
+    Llamar tras el commit de cualquier escritura que cambie el espacio.
+    """
+    backend.invalidar(espacio)
+
+
+# ==========================================================
+#  ENTRADAS: ETag + cabeceras + cuerpo JSON
+# ==========================================================
+def _clave(espacio: str, version: int, request: Request) -> str:
+    parametros = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    return f"{espacio}:{version}:{request.url.path}?{parametros}"
+
+
+def _empaquetar(cuerpo: bytes, cabeceras: dict):
+    etag = '"' + hashlib.blake2b(cuerpo, digest_size=12).hexdigest() + '"'
+    encabezado = json.dumps({"etag": etag, "cabeceras": cabeceras}).encode()
+    return encabezado + b"\n" + cuerpo
+
+
+def _desempaquetar(entrada: bytes):
+    encabezado, cuerpo = entrada.split(b"\n", 1)
+    datos = json.loads(encabezado)
+    return datos["etag"], datos["cabeceras"], cuerpo
+
+
+def _serializar(adaptador: TypeAdapter, valor, respuesta: Response) -> bytes:
+    cabeceras = {
+        nombre: respuesta.headers[nombre]
+        for nombre in CABECERAS_GUARDADAS if nombre in respuesta.headers
+    }
+    if isinstance(valor, bytes):
+        # Ya serializado (respuestas_rapidas)
+        return _empaquetar(valor, cabeceras)
+    # Igual que response_model: validar desde los objetos ORM y serializar
+    modelo = adaptador.validate_python(valor, from_attributes=True)
+    return _empaquetar(adaptador.dump_json(modelo), cabeceras)
+
+
+def _responder(request: Request, entrada: bytes) -> Response:
+    etag, cabeceras, cuerpo = _desempaquetar(entrada)
+    cabeceras = dict(cabeceras, ETag=etag)
+    cabeceras["Cache-Control"] = f"max-age={MAX_AGE_S}, must-revalidate"
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=cabeceras)
+    return Response(cuerpo, media_type="application/json", headers=cabeceras)
+
+
+_adaptadores = {}
+
+
+def _adaptador(modelo) -> TypeAdapter:
+    adaptador = _adaptadores.get(modelo)
+    if adaptador is None:
+        adaptador = _adaptadores[modelo] = TypeAdapter(modelo)
+    return adaptador
+
+
+# ==========================================================
+#  USO DESDE LOS ENDPOINTS
+# ==========================================================
+def responder(request: Request, espacio: str, modelo, consultar: Callable[[Response], object]) -> Response:
+    """
+    Devuelve la respuesta cacheada de esta URL o, si no está, llama a
+    `consultar(respuesta)` (que puede poner cabeceras en `respuesta`),
+    la serializa con `modelo` (salvo que ya devuelva bytes) y la guarda. Las excepciones (404...) no se
+    cachean.
+    """
+    version = backend.version(espacio)
+    clave = _clave(espacio, version, request)
+
+    entrada = backend.obtener(clave)
+    if entrada is None:
+        respuesta = Response()
+        entrada = _serializar(_adaptador(modelo), consultar(respuesta), respuesta)
+        backend.guardar(clave, entrada)
+
+    return _responder(request, entrada)
+
+
+async def responder_async(request: Request, espacio: str, modelo, consultar) -> Response:
+    """
+    Igual que `responder` con `consultar` asíncrona. Con un backend remoto
+    las llamadas al backend se hacen en un hilo para no bloquear el bucle.
+    """
+    async def llamar(funcion, *argumentos):
+        if backend.remoto:
+            return await anyio.to_thread.run_sync(funcion, *argumentos)
+        return funcion(*argumentos)
+
+    version = await llamar(backend.version, espacio)
+    clave = _clave(espacio, version, request)
+
+    entrada = await llamar(backend.obtener, clave)
+    if entrada is None:
+        respuesta = Response()
+        entrada = _serializar(_adaptador(modelo), await consultar(respuesta), respuesta)
+        await llamar(backend.guardar, clave, entrada)
+
+    return _responder(request, entrada)
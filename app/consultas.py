@@ -0,0 +1,80 @@
+"""
+Archivo: consultas.py
+Descripción: Consultas de los endpoints de lectura, como select(). Las usan
+tanto los routers síncronos (Session) como app/routers/lecturas_async.py
+(AsyncSession, DB_MODO=async), para que los dos caminos filtren igual.
+
+Los listados devuelven tuplas o objetos ORM según RESPUESTAS_RAPIDAS (ver
+app/respuestas_rapidas.py): al paginarlos, `escalares=ESCALARES`.
+"""
+from typing import Optional
+
+from sqlalchemy import select
+
+from app import models, respuestas_rapidas, schemas
+
+# Con respuestas rápidas se seleccionan columnas (filas), si no, objetos ORM
+ESCALARES = not respuestas_rapidas.ACTIVO
+
+
+# ==========================================================
+#  USUARIOS
+# ==========================================================
+def usuarios(activo: bool = True, categoria: Optional[str] = None):
+    consulta = respuestas_rapidas.seleccion(models.Usuario, schemas.Usuario)
+    consulta = consulta.where(models.Usuario.activo == activo)
+    if categoria:
+        consulta = consulta.where(models.Usuario.categoria == categoria)
+    return consulta
+
+
+def usuario(usuario_id: int):
+    return select(models.Usuario).where(models.Usuario.id == usuario_id)
+
+
+def usuario_activo_por_nombre(nombre: str):
+    return select(models.Usuario).where(models.Usuario.nombre == nombre, models.Usuario.activo == True)
+
+
+# ==========================================================
+#  MICRORRETOS
+# ==========================================================
+def microrretos(categoria: Optional[str] = None, dificultad: Optional[str] = None):
+    consulta = respuestas_rapidas.seleccion(models.MicroReto, schemas.MicroReto)
+    if categoria:
+        consulta = consulta.where(models.MicroReto.categoria == categoria)
+    if dificultad:
+        consulta = consulta.where(models.MicroReto.dificultad == dificultad)
+    return consulta
+
+
+def microrreto(microrreto_id: int):
+    return select(models.MicroReto).where(models.MicroReto.id == microrreto_id)
+
+
+# ==========================================================
+#  GAMIFICACIÓN
+# ==========================================================
+def gamificaciones(badge: Optional[str] = None):
+    consulta = respuestas_rapidas.seleccion(models.Gamificacion, schemas.Gamificacion)
+    if badge:
+        consulta = consulta.where(models.Gamificacion.badge == badge)
+    return consulta
+
+
+def gamificacion(usuario_id: int):
+    return select(models.Gamificacion).where(models.Gamificacion.usuario_id == usuario_id)
+
+
+# ==========================================================
+#  COMUNIDADES
+# ==========================================================
+def comunidades(categoria: Optional[str] = None):
+    consulta = respuestas_rapidas.seleccion(models.Comunidad, schemas.Comunidad)
+    if categoria:
+        consulta = consulta.where(models.Comunidad.categoria == categoria)
+    return consulta
+
+
+def comunidad(comunidad_id: int):
+    return select(models.Comunidad).where(models.Comunidad.id == comunidad_id)
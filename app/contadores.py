@@ -0,0 +1,164 @@
+"""
+Archivo: contadores.py
+Descripción: Contadores con nombre guardados en la tabla `contadores`
+(versiones de datos, totales, etc.). Las funciones no hacen commit:
+el cambio viaja en la misma transacción que la escritura que lo origina.
+La excepción es `subir_despues`, para escrituras muy frecuentes.
+"""
+import os
+import random
+import threading
+
+from sqlalchemy import select, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+
+VERSION_RANKING = "version_ranking"
+VERSION_USUARIOS = "version_usuarios"  # Altas, cambios y bajas en /usuarios/vista (no los puntos)
+
+TOTAL_USUARIOS = "total_usuarios"
+TOTAL_PROGRESOS = "total_progresos"
+TOTAL_RETOS = "total_retos"
+
+# Contador -> columna que cuenta. La reconciliación recalcula estos totales.
+TOTALES = {
+    TOTAL_USUARIOS: models.Usuario.id,
+    TOTAL_PROGRESOS: models.Progreso.id,
+    TOTAL_RETOS: models.MicroReto.id,
+}
+
+# Contadores repartidos en varias filas ("nombre", "nombre#1", ...): cada
+# incremento va a una al azar y las escrituras concurrentes no esperan todas
+# por la misma fila. Se leen sumándolas.
+FRAGMENTOS = {
+    TOTAL_PROGRESOS: int(os.getenv("CONTADORES_FRAGMENTOS", "8")),
+}
+
+
+def _filas(nombre: str):
+    return [nombre] + [f"{nombre}#{n}" for n in range(1, FRAGMENTOS.get(nombre, 1))]
+
+
+def _insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(models.Contador)
+    return sqlite.insert(models.Contador)
+
+
+def leer(db: Session, nombre: str):
+    """
+    Devuelve el valor del contador o None si todavía no existe.
+    """
+    if nombre not in FRAGMENTOS:
+        return db.execute(
+            select(models.Contador.valor).where(models.Contador.nombre == nombre)
+        ).scalar_one_or_none()
+    return db.execute(
+        select(func.sum(models.Contador.valor)).where(models.Contador.nombre.in_(_filas(nombre)))
+    ).scalar()
+
+
+def _sumar(db: Session, fila: str, delta: int):
+    consulta = _insert(db).values(nombre=fila, valor=delta)
+    consulta = consulta.on_conflict_do_update(
+        index_elements=[models.Contador.nombre],
+        set_={"valor": models.Contador.valor + delta}
+    )
+    db.execute(consulta)
+
+
+def incrementar(db: Session, nombre: str, delta: int = 1):
+    """
+    Suma `delta` al contador en una sola sentencia (lo crea si no existe).
+    """
+    _sumar(db, random.choice(_filas(nombre)), delta)
+
+
+def fijar(db: Session, nombre: str, valor: int):
+    """
+    Sobrescribe el valor del contador.
+    """
+    for fila in _filas(nombre):
+        consulta = _insert(db).values(nombre=fila, valor=valor)
+        consulta = consulta.on_conflict_do_update(
+            index_elements=[models.Contador.nombre],
+            set_={"valor": valor}
+        )
+        db.execute(consulta)
+        valor = 0  # Todo en la primera fila; las demás a cero
+
+
+# ==========================================================
+#  VERSIONES DIFERIDAS
+# ==========================================================
+VERSIONES_INTERVALO_S = int(os.getenv("VERSIONES_INTERVALO_MS", "500")) / 1000
+
+_por_subir = set()
+_lock_por_subir = threading.Lock()
+
+
+def subir_despues(nombre: str):
+    """
+    Apunta que hay que incrementar el contador, fuera de la transacción
+    actual: `subir_pendientes` lo incrementa una sola vez por muchas
+    llamadas. Para versiones que cambian con escrituras muy frecuentes
+    (cada suma de puntos), donde la fila del contador sería un cuello de
+    botella. Llamar después del commit.
+    """
+    with _lock_por_subir:
+        _por_subir.add(nombre)
+
+
+def subir_pendientes(db: Session) -> set:
+    """
+    Incrementa los contadores apuntados con `subir_despues`. Hace commit.
+    Devuelve los nombres incrementados.
+    """
+    global _por_subir
+    with _lock_por_subir:
+        nombres, _por_subir = _por_subir, set()
+    try:
+        for nombre in sorted(nombres):
+            incrementar(db, nombre)
+        db.commit()
+    except Exception:
+        db.rollback()
+        with _lock_por_subir:
+            _por_subir |= nombres
+        raise
+    return nombres
+
+
+def leer_varios(db: Session, nombres):
+    """
+    Lee varios contadores en una sola consulta. Los que no existen no aparecen.
+    """
+    contador_de = {fila: nombre for nombre in nombres for fila in _filas(nombre)}
+    valores = {}
+    for fila, valor in db.execute(
+        select(models.Contador.nombre, models.Contador.valor)
+        .where(models.Contador.nombre.in_(list(contador_de)))
+    ):
+        nombre = contador_de[fila]
+        valores[nombre] = valores.get(nombre, 0) + valor
+    return valores
+
+
+def reconciliar_totales(db: Session, nombres=None):
+    """
+    Recalcula con COUNT(*) los totales indicados (todos por defecto) y
+    corrige cualquier desvío acumulado. Hace commit (uno por total).
+    """
+    valores = {}
+    for nombre in nombres or TOTALES:
+        # Primero se bloquean las filas del contador (sumar 0 las bloquea y
+        # las crea si faltan). Quien haya insertado y aún no incrementado
+        # espera a este commit y suma después; quien ya incrementó ha hecho
+        # commit antes de que el COUNT empiece, y el COUNT lo ve.
+        for fila in sorted(_filas(nombre)):
+            _sumar(db, fila, 0)
+        valores[nombre] = db.execute(select(func.count(TOTALES[nombre]))).scalar_one()
+        fijar(db, nombre, valores[nombre])
+        db.commit()
+    return valores
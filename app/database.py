@@ -1,7 +1,12 @@
 import os
+import anyio
+import anyio.to_thread
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import StaticPool
 from dotenv import load_dotenv
+from app import metricas, instrumentacion
 
 load_dotenv()
 
@@ -11,19 +16,95 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    connect_args={"sslmode": "require"}
-)
+# ==========================================================
+#  POOL DE CONEXIONES (configurable por variables de entorno)
+# ==========================================================
+# DATABASE_URL=sqlite:///./local.db (o sqlite:// en memoria) permite usar
+# SQLite en local y en pruebas; en ese caso no se aplica la configuración del pool.
+ES_SQLITE = DATABASE_URL.startswith("sqlite")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Segundos tras los que una conexión se recicla (antes de que el servidor la corte)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# pre_ping añade un SELECT 1 a cada checkout; con pool_recycle no suele hacer falta
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0") == "1"
+DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+
+# Conexiones que un worker puede llegar a tener abiertas a la vez
+CAPACIDAD_POOL = DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+
+def _opciones_engine(asincrono=False):
+    if ES_SQLITE:
+        opciones = {"connect_args": {"check_same_thread": False}}
+        if DATABASE_URL in ("sqlite://", "sqlite:///:memory:"):
+            # Una única conexión compartida para que la base en memoria no desaparezca
+            opciones["poolclass"] = StaticPool
+        return opciones
+
+    return {
+        "poolclass": metricas.PoolAsyncMedido if asincrono else metricas.PoolMedido,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "connect_args": {"ssl": DB_SSLMODE} if asincrono else {"sslmode": DB_SSLMODE},
+    }
+
+
+engine = create_engine(DATABASE_URL, **_opciones_engine())
+metricas.registrar(engine)
+instrumentacion.registrar(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+# Como mucho CAPACIDAD_POOL peticiones tienen una sesión abierta a la vez; el
+# resto espera aquí, en el event loop, sin ocupar hilos. Si esperaran dentro del
+# threadpool, los hilos bloqueados pidiendo conexión podrían dejar sin hilo a
+# las peticiones que ya tienen una y deben terminar para devolverla.
+_sesiones = None
+
+async def get_db():
+    global _sesiones
+    if _sesiones is None:
+        _sesiones = anyio.Semaphore(CAPACIDAD_POOL)
+
+    async with _sesiones:
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await anyio.to_thread.run_sync(db.close)
+
+
+# ==========================================================
+#  MODO ASÍNCRONO (DB_MODO=async)
+# ==========================================================
+# En modo async los endpoints de lectura usan AsyncSession (asyncpg) y no
+# ocupan un hilo del threadpool mientras esperan a PostgreSQL.
+DB_MODO = os.getenv("DB_MODO", "sync")
+
+def _url_async(url):
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+async_engine = None
+AsyncSessionLocal = None
+
+if DB_MODO == "async":
+    async_engine = create_async_engine(_url_async(DATABASE_URL), **_opciones_engine(asincrono=True))
+    metricas.registrar(async_engine.sync_engine)
+    instrumentacion.registrar(async_engine.sync_engine)
+    AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
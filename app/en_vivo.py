@@ -0,0 +1,234 @@
+"""
+Archivo: en_vivo.py
+Descripción: Clasificación y progreso en directo por WebSocket
+(/gamificacion/en-vivo), para que el front deje de pedir /gamificacion/ cada
+pocos segundos.
+
+- Un único hub por worker con un canal global y uno por comunidad
+  (`usuarios_comunidad`).
+- Cada EN_VIVO_TICK_MS el hub lee del outbox (app/eventos.py) los eventos
+  nuevos de gamificación y progreso, de todos los workers, y los agrupa: un
+  usuario que suma puntos diez veces en un tick aparece una vez, con su
+  total. Cada canal recibe un solo mensaje por tick, serializado una vez
+  para todos sus clientes. Sin clientes conectados no hace consultas.
+- Cada cliente tiene una cola de EN_VIVO_COLA mensajes. Si se llena (el
+  cliente no lee), se le desconecta con 1013; al reconectar recibe la
+  clasificación actual.
+"""
+import asyncio
+import json
+import logging
+import os
+
+from sqlalchemy import select
+
+from app import eventos, models
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TICK_S = int(os.getenv("EN_VIVO_TICK_MS", "250")) / 1000
+COLA = int(os.getenv("EN_VIVO_COLA", "8"))
+MAX_CONEXIONES = int(os.getenv("EN_VIVO_MAX_CONEXIONES", "20000"))
+LOTE_EVENTOS = 5000
+
+GLOBAL = None  # Canal global; los de comunidad son su comunidad_id
+
+
+class HubLleno(Exception):
+    pass
+
+
+class Cliente:
+    __slots__ = ("canal", "cola")
+
+    def __init__(self, canal):
+        self.canal = canal
+        self.cola = asyncio.Queue(COLA)
+
+
+def _json(mensaje: dict) -> str:
+    return json.dumps(mensaje, ensure_ascii=False, separators=(",", ":"))
+
+
+class Hub:
+
+    def __init__(self):
+        self._canales = {}   # canal -> {Cliente}
+        self.conexiones = 0
+        self._desde = None   # Último evento leído; None hasta que el primer cliente da el suyo
+        self._iniciado = False  # Ya se leyó desde _desde: no se puede retroceder
+
+    # ------------------------------------------------------------------
+    # Suscripciones (desde el loop)
+    # ------------------------------------------------------------------
+    def suscribir(self, comunidad_id=GLOBAL) -> Cliente:
+        """
+        Lanza HubLleno con MAX_CONEXIONES clientes en este worker.
+        """
+        if self.conexiones >= MAX_CONEXIONES:
+            raise HubLleno()
+        cliente = Cliente(comunidad_id)
+        self._canales.setdefault(comunidad_id, set()).add(cliente)
+        self.conexiones += 1
+        return cliente
+
+    def partir_de(self, cursor: int):
+        """
+        Cursor del outbox tomado antes del estado inicial de un cliente
+        nuevo. Con el hub parado (sin clientes), empieza a leer desde el
+        menor de los que lleguen antes de la primera lectura; si ya estaba en
+        marcha, sus lecturas ya cubren a ese cliente (se suscribió antes).
+        """
+        if self._desde is None or (not self._iniciado and cursor < self._desde):
+            self._desde = cursor
+
+    def desuscribir(self, cliente: Cliente):
+        clientes = self._canales.get(cliente.canal)
+        if clientes is None or cliente not in clientes:
+            return
+        clientes.discard(cliente)
+        if not clientes:
+            del self._canales[cliente.canal]
+        self.conexiones -= 1
+
+    def publicar(self, canal, mensaje: str):
+        lentos = []
+        for cliente in self._canales.get(canal, ()):
+            try:
+                cliente.cola.put_nowait(mensaje)
+            except asyncio.QueueFull:
+                lentos.append(cliente)
+        for cliente in lentos:
+            # Se vacía su cola y se le avisa de que tiene que desconectarse
+            while not cliente.cola.empty():
+                cliente.cola.get_nowait()
+            cliente.cola.put_nowait(None)
+            self.desuscribir(cliente)
+
+    # ------------------------------------------------------------------
+    # Lectura de cambios (en un hilo)
+    # ------------------------------------------------------------------
+    def _leer_cambios(self, canales) -> dict:
+        """
+        {canal: mensaje} con los cambios desde el tick anterior para los
+        canales que tienen clientes.
+        """
+        db = SessionLocal()
+        try:
+            filas, self._desde, _ = eventos.leer(db, self._desde, LOTE_EVENTOS)
+
+            puntos = set()
+            progreso = {}  # usuario_id -> [intentos, completados]
+            for fila in filas:
+                if fila.tipo.startswith("gamificacion."):
+                    puntos.add(fila.entidad_id)
+                elif fila.tipo == "progreso.creado":
+                    contador = progreso.setdefault(fila.datos["usuario_id"], [0, 0])
+                    contador[0] += 1
+                    contador[1] += bool(fila.datos.get("completado"))
+            usuarios = puntos | set(progreso)
+            if not usuarios:
+                return {}
+
+            # Estado actual (no la suma de los eventos): vale aunque se hayan perdido ticks
+            estado = {}
+            if puntos:
+                estado = {
+                    usuario_id: {"usuario_id": usuario_id, "nombre": nombre, "puntos": total, "badge": badge}
+                    for usuario_id, nombre, total, badge in db.execute(
+                        select(models.Gamificacion.usuario_id, models.Usuario.nombre,
+                               models.Gamificacion.puntos, models.Gamificacion.badge)
+                        .join(models.Usuario, models.Usuario.id == models.Gamificacion.usuario_id)
+                        .where(models.Gamificacion.usuario_id.in_(puntos))
+                    )
+                }
+
+            miembros = {}  # comunidad_id -> {usuario_id}
+            comunidades = [canal for canal in canales if canal is not GLOBAL]
+            if comunidades:
+                uc = models.usuarios_comunidad
+                for comunidad_id, usuario_id in db.execute(
+                    select(uc.c.comunidad_id, uc.c.usuario_id)
+                    .where(uc.c.comunidad_id.in_(comunidades), uc.c.usuario_id.in_(usuarios))
+                ):
+                    miembros.setdefault(comunidad_id, set()).add(usuario_id)
+        finally:
+            db.close()
+
+        def mensaje(ids):
+            return _json({
+                "tipo": "cambios",
+                # Sin fila de gamificación (eliminada): puntos None
+                "puntos": [estado.get(u, {"usuario_id": u, "puntos": None}) for u in sorted(puntos & ids)],
+                "progreso": [
+                    {"usuario_id": u, "intentos": progreso[u][0], "completados": progreso[u][1]}
+                    for u in sorted(progreso.keys() & ids)
+                ],
+            })
+
+        mensajes = {comunidad_id: mensaje(ids) for comunidad_id, ids in miembros.items()}
+        if GLOBAL in canales:
+            mensajes[GLOBAL] = mensaje(usuarios)
+        return mensajes
+
+    async def tick(self):
+        """
+        Lee los cambios desde el tick anterior y manda un mensaje a cada
+        canal afectado.
+        """
+        if not self.conexiones:
+            self._desde = None
+            self._iniciado = False
+            return
+        if self._desde is None:
+            return  # El primer cliente aún no ha dado su cursor
+        self._iniciado = True
+        try:
+            mensajes = await asyncio.to_thread(self._leer_cambios, set(self._canales))
+        except Exception:
+            logger.exception("Falló la lectura de cambios en directo")
+            return
+        for canal, mensaje in mensajes.items():
+            self.publicar(canal, mensaje)
+
+    async def ejecutar(self):
+        """
+        Tarea de fondo (lifespan).
+        """
+        while True:
+            await asyncio.sleep(TICK_S)
+            await self.tick()
+
+
+hub = Hub()
+
+
+# ==========================================================
+#  CONEXIONES
+# ==========================================================
+async def _enviar(websocket, cliente: Cliente):
+    try:
+        while True:
+            mensaje = await cliente.cola.get()
+            if mensaje is None:
+                await websocket.close(code=1013, reason="Cliente demasiado lento")
+                return
+            await websocket.send_text(mensaje)
+    except Exception:
+        # El cliente se fue a mitad de un envío: lo detecta la recepción
+        pass
+
+
+async def atender(websocket, cliente: Cliente, inicial: dict):
+    """
+    Envía `inicial` y después los mensajes del canal hasta que el cliente
+    se desconecte. Lo que mande el cliente se ignora.
+    """
+    await websocket.send_text(_json(inicial))
+    envio = asyncio.create_task(_enviar(websocket, cliente))
+    try:
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        envio.cancel()
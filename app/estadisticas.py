@@ -0,0 +1,239 @@
+"""
+Archivo: estadisticas.py
+Descripción: Estadísticas de progreso sobre millones de filas. La agregación
+(GROUP BY por categoría, dificultad, día o usuario) se hace en SQL; lo que
+queda (tasas, acumulados, percentiles) se calcula con NumPy sobre columnas,
+nunca con objetos ORM. Los resultados se guardan en caché por ventana de
+fechas.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, time as hora, timedelta
+
+import numpy as np
+from sqlalchemy import Integer, case, cast, func, select
+from sqlalchemy.orm import Session
+
+from app import models, contadores
+from app.database import ES_SQLITE
+
+DIAS_POR_DEFECTO = 30
+TTL_S = float(os.getenv("ESTADISTICAS_TTL_S", "300"))
+MAX_ENTRADAS = int(os.getenv("ESTADISTICAS_CACHE_ENTRADAS", "256"))
+
+
+# ==========================================================
+#  VENTANA DE FECHAS
+# ==========================================================
+def ventana(desde: date = None, hasta: date = None):
+    """
+    Normaliza la ventana a días completos [desde, hasta]. Por defecto,
+    los últimos DIAS_POR_DEFECTO días hasta hoy.
+    """
+    hasta = hasta or date.today()
+    desde = desde or hasta - timedelta(days=DIAS_POR_DEFECTO - 1)
+    if desde > hasta:
+        raise ValueError("'desde' no puede ser posterior a 'hasta'")
+    return desde, hasta
+
+
+def _filtro_fechas(desde: date, hasta: date):
+    # Rango semiabierto sobre la columna tal cual, para que use el índice
+    inicio = datetime.combine(desde, hora.min)
+    fin = datetime.combine(hasta + timedelta(days=1), hora.min)
+    return (models.Progreso.fecha >= inicio, models.Progreso.fecha < fin)
+
+
+def _dia(columna):
+    if ES_SQLITE:
+        return func.date(columna)
+    return func.date_trunc("day", columna)
+
+
+def _completados():
+    return func.sum(cast(case((models.Progreso.completado, 1), else_=0), Integer))
+
+
+# ==========================================================
+#  COLUMNAS
+# ==========================================================
+def _columnas(resultado, tipos):
+    """
+    Convierte las filas de `resultado` en un arreglo NumPy por columna
+    (`tipos` indica el dtype de cada una).
+    """
+    filas = resultado.all()
+    if not filas:
+        return [np.empty(0, dtype=tipo) for tipo in tipos]
+    return [
+        np.fromiter((fila[i] for fila in filas), dtype=tipo, count=len(filas))
+        if tipo is not object else np.array([fila[i] for fila in filas], dtype=object)
+        for i, tipo in enumerate(tipos)
+    ]
+
+
+def _tasa(completados, intentos):
+    return np.divide(
+        completados, intentos,
+        out=np.zeros(len(intentos), dtype=np.float64),
+        where=intentos > 0
+    )
+
+
+def _texto_dia(valor):
+    if isinstance(valor, datetime):
+        return valor.date().isoformat()
+    return str(valor)
+
+
+# ==========================================================
+#  CONSULTAS
+# ==========================================================
+def tasa_por(db: Session, columna, desde: date, hasta: date):
+    """
+    Intentos, completados y tasa de finalización agrupados por una columna
+    de MicroReto (categoría o dificultad).
+    """
+    consulta = (
+        select(columna, func.count(), _completados())
+        .select_from(models.Progreso)
+        .join(models.MicroReto, models.MicroReto.id == models.Progreso.reto_id)
+        .where(*_filtro_fechas(desde, hasta))
+        .group_by(columna)
+        .order_by(columna)
+    )
+    grupos, intentos, completados = _columnas(db.execute(consulta), (object, np.int64, np.int64))
+    tasas = _tasa(completados, intentos)
+
+    return [
+        {"grupo": grupo, "intentos": int(i), "completados": int(c), "tasa": round(float(t), 4)}
+        for grupo, i, c, t in zip(grupos, intentos, completados, tasas)
+    ]
+
+
+def activos_diarios(db: Session, desde: date, hasta: date):
+    """
+    Usuarios distintos con algún progreso por día. Los días sin actividad
+    aparecen con 0 para que la serie sea continua.
+    """
+    dia = _dia(models.Progreso.fecha)
+    consulta = (
+        select(dia, func.count(models.Progreso.usuario_id.distinct()))
+        .where(*_filtro_fechas(desde, hasta))
+        .group_by(dia)
+        .order_by(dia)
+    )
+    dias, usuarios = _columnas(db.execute(consulta), (object, np.int64))
+
+    total_dias = (hasta - desde).days + 1
+    serie = np.zeros(total_dias, dtype=np.int64)
+    if len(dias):
+        posiciones = np.array(
+            [(date.fromisoformat(_texto_dia(d)) - desde).days for d in dias], dtype=np.int64
+        )
+        serie[posiciones] = usuarios
+
+    return {
+        "dias": [(desde + timedelta(days=i)).isoformat() for i in range(total_dias)],
+        "usuarios": serie.tolist(),
+        "media": round(float(serie.mean()), 2) if total_dias else 0.0,
+        "maximo": int(serie.max()) if total_dias else 0,
+    }
+
+
+def curva_usuario(db: Session, usuario_id: int, desde: date, hasta: date):
+    """
+    Retos completados por día y acumulado de un usuario en la ventana.
+    """
+    dia = _dia(models.Progreso.fecha)
+    consulta = (
+        select(dia, func.count())
+        .where(
+            models.Progreso.usuario_id == usuario_id,
+            models.Progreso.completado.is_(True),
+            *_filtro_fechas(desde, hasta)
+        )
+        .group_by(dia)
+        .order_by(dia)
+    )
+    dias, completados = _columnas(db.execute(consulta), (object, np.int64))
+
+    return {
+        "usuario_id": usuario_id,
+        "dias": [_texto_dia(d) for d in dias],
+        "completados": completados.tolist(),
+        "acumulado": np.cumsum(completados).tolist(),
+    }
+
+
+def distribucion_usuarios(db: Session, desde: date, hasta: date):
+    """
+    Cómo se reparten los retos completados entre los usuarios activos de la
+    ventana: SQL agrupa por usuario y NumPy calcula media y percentiles.
+    """
+    consulta = (
+        select(_completados())
+        .where(*_filtro_fechas(desde, hasta))
+        .group_by(models.Progreso.usuario_id)
+    )
+    (completados,) = _columnas(db.execute(consulta), (np.int64,))
+
+    if not len(completados):
+        return {"usuarios": 0, "media": 0.0, "sin_completar": 0, "percentiles": {}}
+
+    cortes = (50, 75, 90, 99)
+    valores = np.percentile(completados, cortes)
+    return {
+        "usuarios": int(len(completados)),
+        "media": round(float(completados.mean()), 2),
+        "sin_completar": int((completados == 0).sum()),
+        "percentiles": {f"p{c}": round(float(v), 2) for c, v in zip(cortes, valores)},
+    }
+
+
+# ==========================================================
+#  CACHÉ POR VENTANA
+# ==========================================================
+class CacheEstadisticas:
+    """
+    Resultados por (consulta, parámetros, ventana). Cada entrada se guarda
+    junto con el total de progresos del momento: si entra progreso nuevo la
+    entrada deja de coincidir, y el TTL cubre los cambios en microrretos.
+    """
+
+    def __init__(self, ttl_s: float, max_entradas: int):
+        self.ttl_s = ttl_s
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()  # clave -> (version, caduca, valor)
+        self._lock = threading.Lock()
+
+    def obtener_o_calcular(self, clave, version, calcular):
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada and entrada[0] == version and entrada[1] > ahora:
+                self._entradas.move_to_end(clave)
+                return entrada[2]
+
+        valor = calcular()
+
+        with self._lock:
+            self._entradas[clave] = (version, ahora + self.ttl_s, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return valor
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+cache = CacheEstadisticas(TTL_S, MAX_ENTRADAS)
+
+
+def en_cache(db: Session, nombre: str, desde: date, hasta: date, calcular, *parametros):
+    version = contadores.leer(db, contadores.TOTAL_PROGRESOS)
+    return cache.obtener_o_calcular((nombre, desde, hasta, *parametros), version, calcular)
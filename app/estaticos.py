@@ -0,0 +1,145 @@
+"""
+Archivo: estaticos.py
+Descripción: Archivos de /static con nombre versionado y precomprimidos.
+
+`scripts/construir_estaticos.py` copia cada archivo de app/static a
+ESTATICOS_DIR con el hash del contenido en el nombre (css/styles.<hash>.css),
+junto con sus variantes .br y .gz, y escribe manifest.json con la
+correspondencia. En tiempo de ejecución:
+
+- `url("css/styles.css")` (en las plantillas, `estatico(...)`) devuelve la
+  URL versionada, o la original si el archivo no está en el manifiesto.
+- `Estaticos` sirve las URL versionadas con la variante comprimida que
+  acepte el cliente y `Cache-Control: immutable`: el navegador no vuelve a
+  pedirlas hasta que cambie el contenido (y con él, la URL). Las miniaturas
+  de img/uploads (ver app/avatares.py) ya llevan el hash en el nombre y
+  también son inmutables. El resto se sirve como antes, revalidando con ETag.
+
+Sin manifiesto (desarrollo sin construir) todo funciona como antes.
+"""
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = "app/static"
+COMPILADOS = os.getenv("ESTATICOS_DIR") or "app/static_dist"
+MANIFIESTO = "manifest.json"
+PREFIJO = "/static/"
+
+INMUTABLE = "public, max-age=31536000, immutable"
+REVALIDAR = "no-cache"
+
+# Archivos que ya llevan el hash del contenido en el nombre
+YA_VERSIONADOS = re.compile(r"img/uploads/[0-9a-f]{2}/[0-9a-f]{32}-\d+\.webp")
+
+# Content-Encoding -> extensión, en orden de preferencia
+CODIFICACIONES = {"br": ".br", "gzip": ".gz"}
+
+
+def cargar_manifiesto(carpeta: str = COMPILADOS) -> dict:
+    """
+    {"archivos": {ruta original: ruta versionada},
+     "comprimidos": {ruta versionada: [codificaciones]}}; vacío si no existe.
+    """
+    try:
+        with open(os.path.join(carpeta, MANIFIESTO), encoding="utf-8") as archivo:
+            return json.load(archivo)
+    except FileNotFoundError:
+        return {"archivos": {}, "comprimidos": {}}
+
+
+manifiesto = cargar_manifiesto()
+
+
+def url(ruta: str) -> str:
+    return PREFIJO + manifiesto["archivos"].get(ruta, ruta)
+
+
+def codificaciones_aceptadas(cabecera: str) -> set:
+    """
+    Codificaciones de Accept-Encoding con q > 0.
+    """
+    aceptadas = set()
+    for parte in cabecera.split(","):
+        nombre, _, parametros = parte.partition(";")
+        nombre = nombre.strip().lower()
+        calidad = parametros.strip()
+        if calidad.startswith("q="):
+            try:
+                if float(calidad[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if nombre:
+            aceptadas.add(nombre)
+    return aceptadas
+
+
+class Estaticos(StaticFiles):
+    """
+    StaticFiles que además sirve, desde `compilados`, las rutas versionadas
+    del manifiesto.
+    """
+
+    def __init__(self, directory: str = DIRECTORIO, compilados: str = COMPILADOS, manifiesto: dict = None):
+        super().__init__(directory=directory)
+        self.compilados = compilados
+        manifiesto = manifiesto if manifiesto is not None else cargar_manifiesto(compilados)
+
+        # ruta versionada -> [(codificación o None, ruta en disco, stat)], en orden de preferencia.
+        # Los archivos versionados no cambian: el stat se hace una sola vez.
+        self._versionados = {}
+        for versionada in manifiesto["archivos"].values():
+            disponibles = set(manifiesto["comprimidos"].get(versionada, ()))
+            variantes = [
+                (codificacion, versionada + extension)
+                for codificacion, extension in CODIFICACIONES.items()
+                if codificacion in disponibles
+            ] + [(None, versionada)]
+            try:
+                self._versionados[versionada] = [
+                    (codificacion, ruta, os.stat(os.path.join(compilados, ruta)))
+                    for codificacion, ruta in variantes
+                ]
+            except FileNotFoundError:
+                logger.warning("Falta %s en %s; vuelve a construir los estáticos", versionada, compilados)
+
+    async def get_response(self, path: str, scope) -> Response:
+        variantes = self._versionados.get(path)
+        if variantes is None or scope["method"] not in ("GET", "HEAD"):
+            respuesta = await super().get_response(path, scope)
+            respuesta.headers.setdefault(
+                "Cache-Control", INMUTABLE if YA_VERSIONADOS.fullmatch(path) else REVALIDAR
+            )
+            return respuesta
+
+        cabeceras = Headers(scope=scope)
+        aceptadas = codificaciones_aceptadas(cabeceras.get("accept-encoding", ""))
+        codificacion, ruta, stat_result = next(
+            variante for variante in variantes if variante[0] is None or variante[0] in aceptadas
+        )
+
+        extra = {"Cache-Control": INMUTABLE}
+        if len(variantes) > 1:
+            extra["Vary"] = "Accept-Encoding"
+        if codificacion is not None:
+            extra["Content-Encoding"] = codificacion
+
+        respuesta = FileResponse(
+            os.path.join(self.compilados, ruta),
+            stat_result=stat_result,
+            headers=extra,
+            media_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+        )
+        if self.is_not_modified(respuesta.headers, cabeceras):
+            return NotModifiedResponse(respuesta.headers)
+        return respuesta
@@ -0,0 +1,325 @@
+"""
+Archivo: eventos.py
+Descripción: Outbox de cambios y feed para consumidores externos (analítica,
+notificaciones, almacén de datos), para que no tengan que releer tablas
+enteras.
+
+- `registrar` añade el evento en la misma transacción que el cambio: si el
+  cambio se deshace, el evento también. Debe ser lo último antes del commit.
+- El id lo asigna la base de datos (autoincremental), sin bloqueos entre
+  transacciones. Por eso un id menor puede confirmarse después que uno
+  mayor, y los rollbacks dejan huecos. `leer` no pasa de un hueco hasta que
+  se llena o tiene más de EVENTOS_ESPERA_HUECO_MS: así quien lee `id > desde`
+  no se salta un evento que se confirme un poco más tarde.
+- `GET /eventos?desde=` y el flujo SSE leen por rangos de la clave
+  primaria: el coste depende solo de los eventos nuevos.
+- Los eventos de más de EVENTOS_RETENCION_DIAS se purgan periódicamente.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+SONDEO_S = int(os.getenv("EVENTOS_SONDEO_MS", "500")) / 1000
+LATIDO_S = int(os.getenv("EVENTOS_LATIDO_S", "15"))
+RETENCION_DIAS = int(os.getenv("EVENTOS_RETENCION_DIAS", "7"))
+# Un hueco más antiguo que esto es un rollback (el evento se inserta justo antes del commit)
+ESPERA_HUECO = timedelta(milliseconds=int(os.getenv("EVENTOS_ESPERA_HUECO_MS", "2000")))
+PURGAR_CADA_S = 3600
+LOTE_PURGA = 10000
+LOTE_FLUJO = 500
+
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+# ==========================================================
+#  ESCRITURA
+# ==========================================================
+def registrar(db: Session, tipo: str, entidad_id: int = None, **datos):
+    """
+    Añade un evento `tipo` ("progreso.creado", "usuario.eliminado", ...).
+    No hace commit.
+    """
+    registrar_varios(db, tipo, [(entidad_id, datos)])
+
+
+def registrar_varios(db: Session, tipo: str, eventos):
+    """
+    Igual que `registrar` para varios (entidad_id, datos) del mismo tipo,
+    con un solo INSERT. Debe llamarse justo antes del commit: cuanto menos
+    tarde el commit desde aquí, antes lo pueden leer los consumidores.
+    """
+    eventos = list(eventos)
+    if not eventos:
+        return
+    ahora = datetime.utcnow()
+    db.execute(insert(models.Evento), [
+        {
+            "tipo": tipo,
+            "entidad_id": entidad_id,
+            "datos": {clave: _json(valor) for clave, valor in datos.items()},
+            "creado": ahora,
+        }
+        for entidad_id, datos in eventos
+    ])
+    db.info["eventos"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(db: Session):
+    # Los clientes SSE de este worker se enteran sin esperar al sondeo
+    if db.info.pop("eventos", False):
+        vigia.avisar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _al_deshacer(db: Session):
+    db.info.pop("eventos", None)
+
+
+# ==========================================================
+#  LECTURA
+# ==========================================================
+def leer(db: Session, desde: int, limite: int, tipo: str = None):
+    """
+    (eventos, cursor, retenidos): los eventos con id > `desde`, como mucho
+    `limite` filas leídas, hasta el primer hueco reciente. `retenidos` es
+    True si hay eventos posteriores al hueco (se devolverán cuando se llene
+    o caduque). Con `tipo` (prefijo, p. ej. "progreso.") se descartan los
+    demás, pero el cursor avanza igualmente hasta la última fila leída.
+    """
+    filas = db.execute(
+        select(models.Evento)
+        .where(models.Evento.id > desde)
+        .order_by(models.Evento.id)
+        .limit(limite)
+    ).scalars().all()
+
+    # Los ids empiezan en 1. Con desde=0 tras una purga, la primera fila es
+    # antigua y el hueco (los ids purgados) no la retiene
+    esperado = desde + 1
+    limite_hueco = datetime.utcnow() - ESPERA_HUECO
+    leidas = len(filas)
+    for n, fila in enumerate(filas):
+        if fila.id != esperado and fila.creado > limite_hueco:
+            leidas = n
+            break
+        esperado = fila.id + 1
+    retenidos = leidas < len(filas)
+    filas = filas[:leidas]
+
+    cursor = filas[-1].id if filas else desde
+    if tipo:
+        filas = [fila for fila in filas if fila.tipo.startswith(tipo)]
+    return filas, cursor, retenidos
+
+
+def primero(db: Session):
+    return db.execute(select(func.min(models.Evento.id))).scalar()
+
+
+def ultimo(db: Session) -> int:
+    return db.execute(select(func.max(models.Evento.id))).scalar() or 0
+
+
+def horizonte(db: Session) -> int:
+    """
+    Id del último evento antes del primer hueco reciente (ver `leer`): quien
+    empiece a leer desde aquí no se pierde lo que aún esté por confirmarse.
+    """
+    cursor = db.execute(
+        select(models.Evento.id)
+        .where(models.Evento.creado <= datetime.utcnow() - ESPERA_HUECO)
+        .order_by(models.Evento.id.desc())
+        .limit(1)
+    ).scalar() or 0
+    # Solo quedan los eventos recientes
+    for id_ in db.execute(select(models.Evento.id).where(models.Evento.id > cursor).order_by(models.Evento.id)).scalars():
+        if id_ != cursor + 1:
+            break
+        cursor = id_
+    return cursor
+
+
+def purgar(db: Session, antes: datetime) -> int:
+    """
+    Borra los eventos creados antes de `antes`, en lotes por rangos de
+    LOTE_PURGA ids. Hace commit. Devuelve cuántos borró.
+    """
+    # Recorre en orden de id solo las filas que se van a borrar
+    limite = db.execute(
+        select(models.Evento.id).where(models.Evento.creado >= antes).order_by(models.Evento.id).limit(1)
+    ).scalar()
+    if limite is None:
+        # El último se conserva siempre: en SQLite el siguiente id sale de MAX(id)
+        limite = ultimo(db)
+
+    borrados = 0
+    desde = primero(db)
+    while desde is not None and desde < limite:
+        hasta = min(desde + LOTE_PURGA, limite)
+        borrados += db.execute(
+            delete(models.Evento).where(models.Evento.id >= desde, models.Evento.id < hasta)
+        ).rowcount
+        db.commit()
+        desde = hasta
+    return borrados
+
+
+# ==========================================================
+#  AVISOS PARA EL FLUJO SSE
+# ==========================================================
+class Vigia:
+    """
+    Último id de evento visto por este worker. Hace una sola consulta cada
+    SONDEO_S para todos los clientes SSE conectados (y solo si hay alguno);
+    los commits con eventos de este mismo worker lo despiertan al momento.
+    """
+
+    def __init__(self):
+        self.ultimo = 0
+        self.clientes = 0
+        self._loop = None
+        self._despertar = None
+        self._cambio = None
+
+    def _eventos(self):
+        if self._cambio is None:
+            self._despertar = asyncio.Event()
+            self._cambio = asyncio.Event()
+
+    def avisar(self):
+        """
+        Se puede llamar desde cualquier hilo.
+        """
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._despertar.set)
+
+    def publicar(self, ultimo: int):
+        if ultimo > self.ultimo:
+            self.ultimo = ultimo
+            cambio, self._cambio = self._cambio, asyncio.Event()
+            cambio.set()
+
+    async def esperar(self, desde: int, espera: float) -> bool:
+        """
+        True cuando haya eventos posteriores a `desde`; False si pasan
+        `espera` segundos sin novedades.
+        """
+        self._eventos()
+        fin = asyncio.get_running_loop().time() + espera
+        while self.ultimo <= desde:
+            restante = fin - asyncio.get_running_loop().time()
+            if restante <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._cambio.wait(), restante)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def ejecutar(self):
+        """
+        Tarea de fondo (lifespan).
+        """
+        self._eventos()
+        self._loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._despertar.wait(), SONDEO_S)
+                except asyncio.TimeoutError:
+                    pass
+                self._despertar.clear()
+                if not self.clientes:
+                    continue
+                try:
+                    self.publicar(await asyncio.to_thread(_ultimo_en_sesion))
+                except Exception:
+                    logger.exception("Falló el sondeo de eventos")
+        finally:
+            self._loop = None
+
+
+vigia = Vigia()
+
+
+def _ultimo_en_sesion() -> int:
+    db = SessionLocal()
+    try:
+        return ultimo(db)
+    finally:
+        db.close()
+
+
+def _leer_en_sesion(desde: int, tipo: str):
+    db = SessionLocal()
+    try:
+        filas, cursor, retenidos = leer(db, desde, LOTE_FLUJO, tipo)
+        filas = [(fila.id, fila.tipo, fila.entidad_id, fila.datos, fila.creado) for fila in filas]
+        return filas, cursor, retenidos
+    finally:
+        db.close()
+
+
+async def flujo(desde: int, tipo: str = None, serializar=None):
+    """
+    Generador de mensajes SSE a partir de `desde`: primero los eventos ya
+    guardados, después los nuevos según llegan, y un comentario de latido
+    cada LATIDO_S sin novedades. Un cliente lento no retiene nada: vuelve a
+    leer de la tabla desde su propio cursor.
+    """
+    vigia.clientes += 1
+    try:
+        yield f"retry: {int(SONDEO_S * 1000) * 2}\n\n"
+        while True:
+            filas, cursor, retenidos = await asyncio.to_thread(_leer_en_sesion, desde, tipo)
+            for fila in filas:
+                yield f"id: {fila[0]}\nevent: {fila[1]}\ndata: {serializar(fila)}\n\n"
+            if cursor > desde:
+                vigia.publicar(cursor)
+                desde = cursor
+                continue
+            if retenidos:
+                # Parado en un hueco: el vigía ya sabe que hay eventos después
+                await asyncio.sleep(SONDEO_S)
+                continue
+            if not await vigia.esperar(desde, LATIDO_S):
+                yield ": latido\n\n"
+    finally:
+        vigia.clientes -= 1
+
+
+async def purga_periodica():
+    """
+    Tarea de fondo que borra los eventos de más de RETENCION_DIAS cada
+    PURGAR_CADA_S.
+    """
+    while True:
+        await asyncio.sleep(PURGAR_CADA_S)
+        try:
+            await asyncio.to_thread(_purgar_en_sesion)
+        except Exception:
+            logger.exception("Falló la purga de eventos")
+
+
+def _purgar_en_sesion():
+    db = SessionLocal()
+    try:
+        borrados = purgar(db, datetime.utcnow() - timedelta(days=RETENCION_DIAS))
+        if borrados:
+            logger.info("Purgados %s eventos", borrados)
+    finally:
+        db.close()
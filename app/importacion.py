@@ -0,0 +1,197 @@
+"""
+Archivo: importacion.py
+Descripción: Utilidades para las cargas masivas (/usuarios/importar,
+/microrretos/importar, /progreso/importar). El cuerpo puede ser un arreglo
+JSON, NDJSON (una fila JSON por línea) o CSV con cabecera; NDJSON y CSV se
+leen a medida que llegan. Las filas se validan con los esquemas de
+`schemas`, se escriben en lotes con un único INSERT por lote y los errores
+se informan por número de fila (en CSV, la línea del archivo donde empieza,
+contando la cabecera: un campo entre comillas puede ocupar varias líneas).
+"""
+import csv
+import json
+from collections import deque
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+TAMANO_LOTE = 1000
+# Errores que se devuelven en detalle; el resto solo se cuentan
+MAX_ERRORES_DETALLE = 1000
+
+TIPOS_ADMITIDOS = "application/json, application/x-ndjson o text/csv"
+
+
+async def _lineas(request: Request):
+    pendiente = b""
+    async for bloque in request.stream():
+        pendiente += bloque
+        *completas, pendiente = pendiente.split(b"\n")
+        for linea in completas:
+            yield linea.decode("utf-8-sig")
+    if pendiente:
+        yield pendiente.decode("utf-8-sig")
+
+
+class _Pendientes:
+    """
+    Líneas ya recibidas para csv.reader. Cuando se vacía termina la
+    iteración, pero se puede volver a llenar y seguir leyendo.
+    """
+
+    def __init__(self):
+        self.lineas = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self.lineas:
+            raise StopIteration
+        return self.lineas.popleft()
+
+
+async def _registros_csv(request: Request):
+    """
+    Genera (línea, valores | error) por cada registro CSV con un único
+    csv.reader. Solo se le pide el siguiente registro cuando las comillas de
+    las líneas pendientes están cerradas, así nunca se queda a medias.
+    """
+    def siguiente():
+        inicio = lector.line_num + 1
+        try:
+            return inicio, next(lector)
+        except csv.Error as error:
+            return inicio, f"CSV inválido: {error}"
+
+    pendientes = _Pendientes()
+    lector = csv.reader(pendientes)
+    comillas = 0
+    async for linea in _lineas(request):
+        pendientes.lineas.append(linea + "\n")
+        comillas += linea.count('"')
+        if comillas % 2 == 0:
+            comillas = 0
+            while pendientes.lineas:
+                yield siguiente()
+    while pendientes.lineas:
+        # Comillas sin cerrar al final del archivo
+        yield siguiente()
+
+
+async def leer_filas(request: Request):
+    """
+    Genera (número_de_fila, dict | error) a partir del cuerpo de la petición.
+    """
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+
+    if tipo == "application/json":
+        try:
+            datos = json.loads(await request.body())
+        except json.JSONDecodeError as error:
+            raise HTTPException(status_code=400, detail=f"JSON inválido: {error}")
+        if not isinstance(datos, list):
+            raise HTTPException(status_code=400, detail="Se esperaba un arreglo JSON")
+        for numero, fila in enumerate(datos, start=1):
+            yield numero, fila
+
+    elif tipo in ("application/x-ndjson", "application/jsonl"):
+        numero = 0
+        async for linea in _lineas(request):
+            if not linea.strip():
+                continue
+            numero += 1
+            try:
+                yield numero, json.loads(linea)
+            except json.JSONDecodeError as error:
+                yield numero, f"JSON inválido: {error}"
+
+    elif tipo == "text/csv":
+        cabecera = None
+        async for numero, valores in _registros_csv(request):
+            if isinstance(valores, str):
+                yield numero, valores
+                continue
+            if not valores or (len(valores) == 1 and not valores[0].strip()):
+                continue
+            if cabecera is None:
+                cabecera = [columna.strip() for columna in valores]
+                continue
+            if len(valores) != len(cabecera):
+                yield numero, f"Se esperaban {len(cabecera)} columnas y hay {len(valores)}"
+                continue
+            # Las celdas vacías se tratan como ausentes para que apliquen los valores por defecto
+            yield numero, {clave: valor for clave, valor in zip(cabecera, valores) if valor != ""}
+
+    else:
+        raise HTTPException(status_code=415, detail=f"Tipo de contenido no admitido; use {TIPOS_ADMITIDOS}")
+
+
+def _mensaje(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(parte) for parte in detalle['loc'])}: {detalle['msg']}"
+        for detalle in error.errors()
+    )
+
+
+class Resultado:
+
+    def __init__(self):
+        self.insertados = 0
+        self.total_errores = 0
+        self.errores = []
+
+    def error(self, numero: int, mensaje: str):
+        self.total_errores += 1
+        if len(self.errores) < MAX_ERRORES_DETALLE:
+            self.errores.append({"fila": numero, "error": mensaje})
+
+    def respuesta(self):
+        return {
+            "insertados": self.insertados,
+            "con_error": self.total_errores,
+            "errores": sorted(self.errores, key=lambda error: error["fila"]),
+        }
+
+
+async def importar(request: Request, db: Session, esquema: type[BaseModel], insertar_lote):
+    """
+    Lee y valida las filas de `request` con `esquema` y llama a
+    `insertar_lote(db, lote, resultado)` (en el threadpool) cada TAMANO_LOTE
+    filas válidas. `lote` es una lista de (número_de_fila, modelo validado).
+    """
+    resultado = Resultado()
+    lote = []
+
+    async for numero, fila in leer_filas(request):
+        if isinstance(fila, str):
+            resultado.error(numero, fila)
+            continue
+        if not isinstance(fila, dict):
+            resultado.error(numero, "Cada fila debe ser un objeto")
+            continue
+        try:
+            lote.append((numero, esquema.model_validate(fila)))
+        except ValidationError as error:
+            resultado.error(numero, _mensaje(error))
+            continue
+
+        if len(lote) >= TAMANO_LOTE:
+            await run_in_threadpool(insertar_lote, db, lote, resultado)
+            lote = []
+
+    if lote:
+        await run_in_threadpool(insertar_lote, db, lote, resultado)
+
+    return resultado.respuesta()
+
+
+def valores_existentes(db: Session, columna, valores) -> set:
+    """
+    Subconjunto de `valores` que ya existe en `columna` (una sola consulta).
+    """
+    if not valores:
+        return set()
+    return set(db.execute(select(columna).where(columna.in_(list(valores)))).scalars())
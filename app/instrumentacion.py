@@ -0,0 +1,408 @@
+"""
+Archivo: instrumentacion.py
+Descripción: Medición por petición. Un middleware ASGI registra la latencia
+de cada ruta (histograma), y los eventos before/after_cursor_execute de
+SQLAlchemy cuentan las consultas y el tiempo en base de datos de la petición
+en curso. Los datos salen en la cabecera Server-Timing de cada respuesta y,
+acumulados, en /metrics (formato de texto de Prometheus). Los valores son
+por proceso (worker).
+
+Opcionales:
+  - CONSULTAS_LENTAS_MS: registra en el log las consultas que tardan más,
+    con su SQL y parámetros.
+  - PERFILADOR=1: con la cabecera `X-Perfilar: 1` la respuesta se sustituye
+    por el perfil del endpoint (pyinstrument si está instalado; si no,
+    cProfile). Solo cubre la función del endpoint, no las dependencias ni
+    la serialización.
+"""
+import cProfile
+import functools
+import inspect
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+from contextvars import ContextVar
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+ACTIVO = os.getenv("INSTRUMENTACION", "1") == "1"
+CONSULTAS_LENTAS_MS = float(os.getenv("CONSULTAS_LENTAS_MS", "0"))  # 0 = desactivado
+PERFILADOR = os.getenv("PERFILADOR", "0") == "1"
+
+CABECERA_PERFIL = b"x-perfilar"
+CUBETAS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_PARAMETROS_LOG = 500  # caracteres de los parámetros en el log de consultas lentas
+FILAS_PERFIL = 40
+
+
+# ==========================================================
+#  PETICIÓN EN CURSO
+# ==========================================================
+class MedicionPeticion:
+
+    def __init__(self, scope, perfilar: bool = False):
+        self.scope = scope
+        self.consultas = 0
+        self.db_s = 0.0
+        self.perfilar = perfilar
+        self.perfil = None  # (media_type, texto) si se perfiló el endpoint
+
+    def server_timing(self, total_s: float) -> str:
+        return (
+            f'app;dur={total_s * 1000:.1f}, '
+            f'db;dur={self.db_s * 1000:.1f};desc="{self.consultas} consultas"'
+        )
+
+
+# La hereda el threadpool (anyio copia el contexto), así que los endpoints
+# síncronos suman sus consultas a la misma medición
+_actual: ContextVar = ContextVar("medicion_peticion", default=None)
+
+
+def _ruta(scope) -> str:
+    # La plantilla de la ruta (/usuarios/{usuario_id}), no la URL, para no
+    # crear una serie por ID
+    return getattr(scope.get("route"), "path", None) or "(sin ruta)"
+
+
+# ==========================================================
+#  ACUMULADOS (para /metrics)
+# ==========================================================
+class Histograma:
+
+    def __init__(self):
+        self.cubetas = [0] * len(CUBETAS_S)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        self.suma += valor
+        self.total += 1
+        for i, limite in enumerate(CUBETAS_S):
+            if valor <= limite:
+                self.cubetas[i] += 1
+                break
+
+
+class Registro:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencias = {}   # (metodo, ruta) -> Histograma
+        self._peticiones = {}  # (metodo, ruta, codigo) -> n
+        self._consultas = {}   # (metodo, ruta) -> [consultas, segundos]
+        self.consultas_total = 0
+        self.db_total_s = 0.0
+        self.consultas_lentas = 0
+
+    def observar_peticion(self, metodo: str, ruta: str, codigo: int, duracion_s: float, medicion: MedicionPeticion):
+        with self._lock:
+            clave = (metodo, ruta)
+            histograma = self._latencias.get(clave)
+            if histograma is None:
+                histograma = self._latencias[clave] = Histograma()
+            histograma.observar(duracion_s)
+            clave_codigo = (metodo, ruta, str(codigo))
+            self._peticiones[clave_codigo] = self._peticiones.get(clave_codigo, 0) + 1
+            acumulado = self._consultas.setdefault(clave, [0, 0.0])
+            acumulado[0] += medicion.consultas
+            acumulado[1] += medicion.db_s
+
+    def observar_consulta(self, duracion_s: float, lenta: bool):
+        with self._lock:
+            self.consultas_total += 1
+            self.db_total_s += duracion_s
+            if lenta:
+                self.consultas_lentas += 1
+
+    def texto(self, pools: dict = None) -> str:
+        """
+        Formato de exposición de texto de Prometheus. `pools` es
+        {nombre_engine: metricas.resumen(engine)}.
+        """
+        lineas = []
+
+        def metrica(nombre, tipo, ayuda):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+        with self._lock:
+            metrica("http_peticiones_total", "counter", "Peticiones atendidas por ruta y código.")
+            for (metodo, ruta, codigo), n in sorted(self._peticiones.items()):
+                lineas.append(f"http_peticiones_total{_etiquetas(metodo=metodo, ruta=ruta, codigo=codigo)} {n}")
+
+            metrica("http_duracion_peticion_segundos", "histogram", "Latencia de las peticiones por ruta.")
+            for (metodo, ruta), histograma in sorted(self._latencias.items()):
+                acumulado = 0
+                for limite, n in zip(CUBETAS_S, histograma.cubetas):
+                    acumulado += n
+                    lineas.append(
+                        f"http_duracion_peticion_segundos_bucket"
+                        f"{_etiquetas(metodo=metodo, ruta=ruta, le=repr(limite))} {acumulado}"
+                    )
+                etiquetas = _etiquetas(metodo=metodo, ruta=ruta)
+                lineas.append(
+                    f"http_duracion_peticion_segundos_bucket{_etiquetas(metodo=metodo, ruta=ruta, le='+Inf')} "
+                    f"{histograma.total}"
+                )
+                lineas.append(f"http_duracion_peticion_segundos_sum{etiquetas} {histograma.suma:.6f}")
+                lineas.append(f"http_duracion_peticion_segundos_count{etiquetas} {histograma.total}")
+
+            metrica("db_consultas_peticion_total", "counter", "Consultas SQL hechas por las peticiones de cada ruta.")
+            for (metodo, ruta), (consultas, _) in sorted(self._consultas.items()):
+                lineas.append(f"db_consultas_peticion_total{_etiquetas(metodo=metodo, ruta=ruta)} {consultas}")
+
+            metrica("db_duracion_peticion_segundos_total", "counter", "Tiempo en base de datos de cada ruta.")
+            for (metodo, ruta), (_, segundos) in sorted(self._consultas.items()):
+                lineas.append(f"db_duracion_peticion_segundos_total{_etiquetas(metodo=metodo, ruta=ruta)} {segundos:.6f}")
+
+            metrica("db_consultas_total", "counter", "Consultas SQL (incluye tareas de fondo).")
+            lineas.append(f"db_consultas_total {self.consultas_total}")
+            metrica("db_duracion_consultas_segundos_total", "counter", "Tiempo total en consultas SQL.")
+            lineas.append(f"db_duracion_consultas_segundos_total {self.db_total_s:.6f}")
+            metrica("db_consultas_lentas_total", "counter", "Consultas por encima de CONSULTAS_LENTAS_MS.")
+            lineas.append(f"db_consultas_lentas_total {self.consultas_lentas}")
+
+        for campo, tipo, ayuda in _CAMPOS_POOL:
+            valores = [(nombre, datos[campo]) for nombre, datos in (pools or {}).items() if campo in datos]
+            if not valores:
+                continue
+            metrica(f"db_pool_{campo}", tipo, ayuda)
+            for nombre, valor in valores:
+                lineas.append(f"db_pool_{campo}{_etiquetas(engine=nombre)} {valor}")
+
+        return "\n".join(lineas) + "\n"
+
+
+# (campo de metricas.resumen, tipo, ayuda)
+_CAMPOS_POOL = (
+    ("tamano", "gauge", "Conexiones fijas del pool."),
+    ("en_uso", "gauge", "Conexiones prestadas ahora mismo."),
+    ("libres", "gauge", "Conexiones libres en el pool."),
+    ("overflow", "gauge", "Conexiones abiertas por encima de pool_size."),
+    ("checkouts", "counter", "Conexiones entregadas por el pool."),
+    ("timeouts", "counter", "Esperas de conexión que agotaron pool_timeout."),
+    ("invalidaciones", "counter", "Conexiones invalidadas."),
+    ("espera_total_ms", "counter", "Milisegundos esperando una conexión libre."),
+)
+
+
+def _etiquetas(**valores) -> str:
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+registro = Registro()
+
+
+# ==========================================================
+#  EVENTOS DE SQLALCHEMY
+# ==========================================================
+def _antes(conexion, cursor, sentencia, parametros, contexto, executemany):
+    if contexto is not None:
+        contexto._inicio_instrumentacion = time.perf_counter()
+
+
+def _despues(conexion, cursor, sentencia, parametros, contexto, executemany):
+    inicio = getattr(contexto, "_inicio_instrumentacion", None)
+    if inicio is None:
+        return
+    duracion = time.perf_counter() - inicio
+
+    medicion = _actual.get()
+    if medicion is not None:
+        medicion.consultas += 1
+        medicion.db_s += duracion
+
+    lenta = CONSULTAS_LENTAS_MS > 0 and duracion * 1000 >= CONSULTAS_LENTAS_MS
+    registro.observar_consulta(duracion, lenta)
+    if lenta:
+        logger.warning(
+            "Consulta lenta (%.1f ms) en %s: %s | parámetros: %.*s",
+            duracion * 1000,
+            _ruta(medicion.scope) if medicion is not None else "(fuera de una petición)",
+            " ".join(sentencia.split()),
+            MAX_PARAMETROS_LOG, repr(parametros)
+        )
+
+
+def registrar(engine):
+    """
+    Engancha la medición de consultas a `engine` (para AsyncEngine, su
+    sync_engine).
+    """
+    if not ACTIVO:
+        return
+    event.listen(engine, "before_cursor_execute", _antes)
+    event.listen(engine, "after_cursor_execute", _despues)
+
+
+# ==========================================================
+#  PERFILADOR
+# ==========================================================
+class _Perfilador:
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            self._pyinstrument = None
+            self._cprofile = cProfile.Profile()
+        else:
+            self._pyinstrument = Profiler(async_mode="disabled")
+            self._cprofile = None
+
+    def iniciar(self):
+        if self._pyinstrument is not None:
+            self._pyinstrument.start()
+        else:
+            self._cprofile.enable()
+
+    def terminar(self):
+        """
+        (media_type, texto) con el resultado.
+        """
+        if self._pyinstrument is not None:
+            self._pyinstrument.stop()
+            return "text/html", self._pyinstrument.output_html()
+
+        self._cprofile.disable()
+        salida = io.StringIO()
+        pstats.Stats(self._cprofile, stream=salida).sort_stats("cumulative").print_stats(FILAS_PERFIL)
+        return "text/plain", salida.getvalue()
+
+
+def _perfilable(endpoint):
+    """
+    Envuelve el endpoint para perfilarlo cuando la petición lo pide. El
+    perfilador se arranca dentro de la llamada, es decir, en el hilo del
+    threadpool en los endpoints síncronos.
+    """
+    if getattr(endpoint, "_perfilable", False):
+        return endpoint
+
+    def medicion_perfilada():
+        medicion = _actual.get()
+        return medicion if medicion is not None and medicion.perfilar else None
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def envoltura(*args, **kwargs):
+            medicion = medicion_perfilada()
+            if medicion is None:
+                return await endpoint(*args, **kwargs)
+            perfilador = _Perfilador()
+            perfilador.iniciar()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                medicion.perfil = perfilador.terminar()
+    else:
+        @functools.wraps(endpoint)
+        def envoltura(*args, **kwargs):
+            medicion = medicion_perfilada()
+            if medicion is None:
+                return endpoint(*args, **kwargs)
+            perfilador = _Perfilador()
+            perfilador.iniciar()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                medicion.perfil = perfilador.terminar()
+
+    envoltura._perfilable = True
+    return envoltura
+
+
+class RutaMedida(APIRoute):
+    """
+    route_class de los routers: permite perfilar sus endpoints.
+    """
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        if PERFILADOR:
+            endpoint = _perfilable(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+# ==========================================================
+#  MIDDLEWARE
+# ==========================================================
+def _cabecera(scope, nombre: bytes):
+    for clave, valor in scope.get("headers", ()):
+        if clave == nombre:
+            return valor
+    return None
+
+
+class MiddlewareInstrumentacion:
+    """
+    Middleware ASGI puro (sin BaseHTTPMiddleware, que añade una tarea y
+    una cola por petición).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        perfilar = PERFILADOR and _cabecera(scope, CABECERA_PERFIL) == b"1"
+        medicion = MedicionPeticion(scope, perfilar)
+        token = _actual.set(medicion)
+        inicio = time.perf_counter()
+        codigo = 500
+        retenidos = []
+
+        async def enviar(mensaje):
+            nonlocal codigo
+            if mensaje["type"] == "http.response.start":
+                codigo = mensaje["status"]
+                cabeceras = MutableHeaders(scope=mensaje)
+                cabeceras.append("Server-Timing", medicion.server_timing(time.perf_counter() - inicio))
+            if perfilar:
+                # Se retiene: si hay perfil, la respuesta es el perfil
+                retenidos.append(mensaje)
+            else:
+                await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+            if perfilar:
+                await self._responder_perfil(medicion, codigo, retenidos, send)
+        finally:
+            _actual.reset(token)
+            registro.observar_peticion(scope["method"], _ruta(scope), codigo, time.perf_counter() - inicio, medicion)
+
+    @staticmethod
+    async def _responder_perfil(medicion: MedicionPeticion, codigo: int, retenidos, send):
+        if medicion.perfil is None:
+            # La ruta no se perfiló (404, estáticos...): respuesta original
+            for mensaje in retenidos:
+                await send(mensaje)
+            return
+
+        media_type, texto = medicion.perfil
+        cuerpo = texto.encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", f"{media_type}; charset=utf-8".encode()),
+                (b"content-length", str(len(cuerpo)).encode()),
+                (b"x-perfil-codigo-original", str(codigo).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": cuerpo})
@@ -1,26 +1,153 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
 
-from app.database import engine, Base
-from app import models
-from app.routers import usuarios, microrretos, progreso, gamificacion, comunidad, reportes
+from app.database import SessionLocal, DB_MODO
+from app import contadores, acumulador_puntos, ranking, recomendador, trabajos_reportes, instrumentacion, plantillas, estaticos, avatares, eventos, en_vivo
+from app.routers import usuarios, microrretos, progreso, gamificacion, comunidad, reportes, lecturas_async, metricas, busqueda
+from app.routers import eventos as eventos_router
+
+# El esquema lo gestiona Alembic: `alembic upgrade head` (ver Procfile)
+
+logger = logging.getLogger(__name__)
+
+RECONCILIACION_SEGUNDOS = int(os.getenv("RECONCILIACION_SEGUNDOS", "3600"))
+
+
+def _reconciliar_totales():
+    db = SessionLocal()
+    try:
+        contadores.reconciliar_totales(db)
+    finally:
+        db.close()
+
+
+def _subir_versiones():
+    db = SessionLocal()
+    try:
+        subidas = contadores.subir_pendientes(db)
+    finally:
+        db.close()
+    if contadores.VERSION_RANKING in subidas:
+        trabajos_reportes.regenerar_ranking()
+
+
+async def _subida_versiones():
+    """
+    Sube cada VERSIONES_INTERVALO_MS las versiones apuntadas con
+    contadores.subir_despues. Al cancelarse hace una última subida.
+    """
+    try:
+        while True:
+            await asyncio.sleep(contadores.VERSIONES_INTERVALO_S)
+            try:
+                await asyncio.to_thread(_subir_versiones)
+            except Exception:
+                logger.exception("Falló la subida de versiones")
+    finally:
+        _subir_versiones()
+
+
+async def _reconciliacion_periodica():
+    """
+    Inicializa los totales del dashboard al arrancar y después corrige su
+    desvío cada RECONCILIACION_SEGUNDOS.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(_reconciliar_totales)
+        except Exception:
+            logger.exception("Falló la reconciliación de contadores")
+        await asyncio.sleep(RECONCILIACION_SEGUNDOS)
+
+
+def _reconstruir_ranking():
+    db = SessionLocal()
+    try:
+        ranking.ranking.reconstruir(db)
+    finally:
+        db.close()
+
+
+async def _resincronizacion_ranking():
+    """
+    Carga la clasificación en memoria al arrancar y la vuelve a leer cada
+    RANKING_RESINCRONIZAR_S para recoger lo que escribieron otros workers.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(_reconstruir_ranking)
+        except Exception:
+            logger.exception("Falló la reconstrucción del ranking")
+        await asyncio.sleep(ranking.RESINCRONIZAR_S)
+
+
+def _reconstruir_recomendador():
+    db = SessionLocal()
+    try:
+        recomendador.recomendador.reconstruir(db)
+    finally:
+        db.close()
+
+
+async def _resincronizacion_recomendador():
+    """
+    Carga los candidatos del recomendador al arrancar y los vuelve a leer
+    cada RECOMENDADOR_RESINCRONIZAR_S.
+    """
+    while True:
+        try:
+            await asyncio.to_thread(_reconstruir_recomendador)
+        except Exception:
+            logger.exception("Falló la reconstrucción del recomendador")
+        await asyncio.sleep(recomendador.RESINCRONIZAR_S)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compiladas antes de la primera petición (y su bytecode, en disco para los demás workers)
+    await asyncio.to_thread(plantillas.precompilar)
+    tareas = [
+        asyncio.create_task(_reconciliacion_periodica()),
+        asyncio.create_task(_subida_versiones()),
+        asyncio.create_task(_resincronizacion_ranking()),
+        asyncio.create_task(_resincronizacion_recomendador()),
+        asyncio.create_task(trabajos_reportes.limpieza_periodica()),
+        asyncio.create_task(eventos.vigia.ejecutar()),
+        asyncio.create_task(eventos.purga_periodica()),
+        asyncio.create_task(en_vivo.hub.ejecutar()),
+    ]
+    if acumulador_puntos.ACTIVO:
+        tareas.append(asyncio.create_task(acumulador_puntos.volcado_periodico()))
+    yield
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+    avatares.procesador.cerrar()
 
-Base.metadata.create_all(bind=engine)
 
 app = FastAPI(
     title="Plataforma Digital de Micro Hábitos de Conocimiento",
     version="1.0.0",
-    description="API educativa desarrollada por Duván Guerrero"
+    description="API educativa desarrollada por Duván Guerrero",
+    lifespan=lifespan
 )
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+if instrumentacion.ACTIVO:
+    app.add_middleware(instrumentacion.MiddlewareInstrumentacion)
 
-templates = Jinja2Templates(directory="app/templates")
+app.mount("/static", estaticos.Estaticos(), name="static")
 
 @app.get("/")
 def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return plantillas.pagina(request, "index.html")
+
+# Con DB_MODO=async las lecturas las atienden primero los handlers asíncronos
+if DB_MODO == "async":
+    app.include_router(lecturas_async.router)
 
 app.include_router(usuarios.router)
 app.include_router(microrretos.router)
@@ -28,3 +155,7 @@ app.include_router(progreso.router)
 app.include_router(gamificacion.router)
 app.include_router(comunidad.router)
 app.include_router(reportes.router)
+app.include_router(metricas.router)
+app.include_router(metricas.prometheus)
+app.include_router(busqueda.router)
+app.include_router(eventos_router.router)
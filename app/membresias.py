@@ -0,0 +1,100 @@
+"""
+Archivo: membresias.py
+Descripción: Altas y bajas de participantes en comunidades con una sola
+sentencia por lote sobre `usuarios_comunidad` (INSERT ... ON CONFLICT DO
+NOTHING / DELETE ... = ANY), sin cargar la lista de participantes. El
+commit lo hace el router.
+"""
+from sqlalchemy import Integer, bindparam, func, literal, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app import models
+
+_tabla = models.usuarios_comunidad
+
+
+def _es_postgres(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _en(db: Session, columna, ids):
+    # En PostgreSQL, un único parámetro array: el plan no depende del tamaño de la lista
+    if _es_postgres(db):
+        return columna == func.any(bindparam(None, list(ids), type_=postgresql.ARRAY(Integer)))
+    return columna.in_(ids)
+
+
+def _insert(db: Session):
+    if _es_postgres(db):
+        return postgresql.insert(_tabla)
+    return sqlite.insert(_tabla)
+
+
+def sin_repetidos(ids):
+    return list(dict.fromkeys(ids))
+
+
+def comunidad_existe(db: Session, comunidad_id: int) -> bool:
+    return db.execute(
+        select(models.Comunidad.id).where(models.Comunidad.id == comunidad_id)
+    ).first() is not None
+
+
+def usuarios_existentes(db: Session, usuario_ids) -> set:
+    return set(db.execute(
+        select(models.Usuario.id).where(_en(db, models.Usuario.id, usuario_ids))
+    ).scalars())
+
+
+def agregar(db: Session, comunidad_id: int, usuario_ids) -> set:
+    """
+    Da de alta a los usuarios existentes de `usuario_ids`. Devuelve los IDs
+    que se añadieron (los que ya eran miembros no cuentan).
+    """
+    consulta = (
+        _insert(db)
+        .from_select(
+            ["usuario_id", "comunidad_id"],
+            select(models.Usuario.id, literal(comunidad_id, Integer))
+            .where(_en(db, models.Usuario.id, usuario_ids))
+        )
+        .on_conflict_do_nothing(index_elements=[_tabla.c.usuario_id, _tabla.c.comunidad_id])
+        .returning(_tabla.c.usuario_id)
+    )
+    return set(db.execute(consulta).scalars())
+
+
+def quitar(db: Session, comunidad_id: int, usuario_ids) -> set:
+    """
+    Da de baja a `usuario_ids`. Devuelve los IDs que eran miembros.
+    """
+    consulta = (
+        _tabla.delete()
+        .where(_tabla.c.comunidad_id == comunidad_id, _en(db, _tabla.c.usuario_id, usuario_ids))
+        .returning(_tabla.c.usuario_id)
+    )
+    return set(db.execute(consulta).scalars())
+
+
+def vaciar(db: Session, comunidad_id: int):
+    db.execute(_tabla.delete().where(_tabla.c.comunidad_id == comunidad_id))
+
+
+def contar(db: Session, comunidad_id: int) -> int:
+    return db.execute(
+        select(func.count()).select_from(_tabla).where(_tabla.c.comunidad_id == comunidad_id)
+    ).scalar_one()
+
+
+def participantes(consulta, comunidad_id: int):
+    """
+    Restringe `consulta` (sobre Usuario) a los miembros de la comunidad.
+    Se pagina por usuarios_comunidad.usuario_id, que recorre el índice
+    (comunidad_id, usuario_id).
+    """
+    return (
+        consulta
+        .join(_tabla, _tabla.c.usuario_id == models.Usuario.id)
+        .filter(_tabla.c.comunidad_id == comunidad_id)
+    )
@@ -0,0 +1,110 @@
+"""
+Archivo: metricas.py
+Descripción: Métricas del pool de conexiones de SQLAlchemy (conexiones en
+uso, overflow, tiempo de espera al pedir una conexión e invalidaciones),
+recogidas con eventos del pool. Los valores son por proceso (worker).
+"""
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+
+class EstadisticasPool:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.conexiones_abiertas = 0
+        self.invalidaciones = 0
+        self.invalidaciones_suaves = 0
+        self.espera_total_s = 0.0
+        self.espera_max_s = 0.0
+        self.timeouts = 0
+
+    def registrar_espera(self, segundos: float, agotado: bool = False):
+        with self._lock:
+            if agotado:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.espera_total_s += segundos
+            if segundos > self.espera_max_s:
+                self.espera_max_s = segundos
+
+    def sumar(self, campo: str):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+
+
+class _EsperaMedida:
+    """
+    Mide cuánto tarda el pool en entregar una conexión (incluye la espera
+    cuando todas están ocupadas).
+    """
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            conexion = super()._do_get()
+        except Exception:
+            self._estadisticas.registrar_espera(0.0, agotado=True)
+            raise
+        self._estadisticas.registrar_espera(time.perf_counter() - inicio)
+        return conexion
+
+
+class PoolMedido(_EsperaMedida, QueuePool):
+    _estadisticas = EstadisticasPool()
+
+
+class PoolAsyncMedido(_EsperaMedida, AsyncAdaptedQueuePool):
+    _estadisticas = EstadisticasPool()
+
+
+def registrar(engine):
+    """
+    Engancha los eventos de invalidación y apertura de conexiones al pool de `engine`.
+    """
+    pool = engine.pool
+    estadisticas = getattr(pool, "_estadisticas", None)
+    if estadisticas is None:
+        return
+
+    event.listen(pool, "connect", lambda *args: estadisticas.sumar("conexiones_abiertas"))
+    event.listen(pool, "invalidate", lambda *args: estadisticas.sumar("invalidaciones"))
+    event.listen(pool, "soft_invalidate", lambda *args: estadisticas.sumar("invalidaciones_suaves"))
+
+
+def resumen(engine) -> dict:
+    """
+    Estado actual del pool de `engine` más los contadores acumulados.
+    """
+    pool = engine.pool
+    datos = {"pool": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        datos.update({
+            "tamano": pool.size(),
+            "en_uso": pool.checkedout(),
+            "libres": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+        })
+
+    estadisticas = getattr(pool, "_estadisticas", None)
+    if estadisticas is not None:
+        with estadisticas._lock:
+            datos.update({
+                "checkouts": estadisticas.checkouts,
+                "conexiones_abiertas": estadisticas.conexiones_abiertas,
+                "invalidaciones": estadisticas.invalidaciones,
+                "invalidaciones_suaves": estadisticas.invalidaciones_suaves,
+                "timeouts": estadisticas.timeouts,
+                "espera_total_ms": round(estadisticas.espera_total_s * 1000, 3),
+                "espera_media_ms": round(estadisticas.espera_total_s * 1000 / estadisticas.checkouts, 3)
+                if estadisticas.checkouts else 0.0,
+                "espera_max_ms": round(estadisticas.espera_max_s * 1000, 3),
+            })
+
+    return datos
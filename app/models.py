@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Table
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, Date, Table, Index, JSON
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -7,13 +7,15 @@ class Usuario(Base):
     __tablename__ = "usuarios"
 
     id = Column(Integer, primary_key=True, index=True)
-    nombre = Column(String, nullable=False)
+    nombre = Column(String, nullable=False, index=True)
     edad = Column(Integer)
     categoria = Column(String)
     nivel = Column(Integer, default=1)
     racha_dias = Column(Integer, default=0)
     puntos = Column(Integer, default=0)
-    activo = Column(Boolean, default=True)
+    activo = Column(Boolean, default=True, index=True)
+    ultima_actividad = Column(Date)  # Último día con un reto completado (base de la racha)
+    foto = Column(String(32))  # Hash de la imagen de perfil (ver app/avatares.py)
 
     progreso = relationship("Progreso", back_populates="usuario")
     gamificacion = relationship("Gamificacion", back_populates="usuario", uselist=False)
@@ -37,21 +39,26 @@ class Progreso(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     usuario_id = Column(Integer, ForeignKey("usuarios.id"))
-    reto_id = Column(Integer, ForeignKey("microrretos.id"))
+    reto_id = Column(Integer, ForeignKey("microrretos.id"), index=True)
     completado = Column(Boolean, default=False)
-    fecha = Column(DateTime, default=datetime.utcnow)
+    fecha = Column(DateTime, default=datetime.utcnow, index=True)
 
     usuario = relationship("Usuario", back_populates="progreso")
     reto = relationship("MicroReto", back_populates="progreso")
 
+    __table_args__ = (
+        # Sirve tanto para filtrar por usuario como para recorrer su historial en orden
+        Index("ix_progreso_usuario_id_fecha", "usuario_id", "fecha"),
+    )
+
 
 class Gamificacion(Base):
     __tablename__ = "gamificacion"
 
     id = Column(Integer, primary_key=True, index=True)
-    usuario_id = Column(Integer, ForeignKey("usuarios.id"))
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), unique=True, index=True)
     badge = Column(String, default="Ninguno")
-    puntos = Column(Integer, default=0)
+    puntos = Column(Integer, default=0, index=True)
 
     usuario = relationship("Usuario", back_populates="gamificacion")
 
@@ -70,6 +77,28 @@ class Comunidad(Base):
 usuarios_comunidad = Table(
     "usuarios_comunidad",
     Base.metadata,
-    Column("usuario_id", Integer, ForeignKey("usuarios.id")),
-    Column("comunidad_id", Integer, ForeignKey("comunidades.id"))
+    Column("usuario_id", Integer, ForeignKey("usuarios.id"), primary_key=True),
+    Column("comunidad_id", Integer, ForeignKey("comunidades.id"), primary_key=True),
+    # Participantes de una comunidad ordenados por usuario (paginación por cursor)
+    Index("ix_usuarios_comunidad_comunidad_id_usuario_id", "comunidad_id", "usuario_id")
 )
+
+
+class Contador(Base):
+    __tablename__ = "contadores"
+
+    nombre = Column(String, primary_key=True)
+    valor = Column(Integer, nullable=False, default=0)
+
+
+class Evento(Base):
+    """
+    Outbox de cambios (ver app/eventos.py). El id es la posición en el feed.
+    """
+    __tablename__ = "eventos"
+
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)  # "progreso.creado", "usuario.eliminado", ...
+    entidad_id = Column(Integer)
+    datos = Column(JSON)
+    creado = Column(DateTime, nullable=False, default=datetime.utcnow)
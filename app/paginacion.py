@@ -0,0 +1,82 @@
+"""
+Archivo: paginacion.py
+Descripción: Paginación por cursor (keyset sobre `id`) compartida por los
+listados. Cada página cuesta O(limit) sin importar lo profunda que sea.
+"""
+from typing import Optional
+from fastapi import Query, Response
+
+LIMITE_POR_DEFECTO = 50
+LIMITE_MAXIMO = 500
+
+# Cabecera con el cursor de la página siguiente (ausente en la última página)
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+
+
+class Pagina:
+    """
+    Dependencia con los parámetros `cursor` y `limit` de un listado.
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[int] = Query(None, ge=0, description="ID del último elemento de la página anterior"),
+        limit: int = Query(LIMITE_POR_DEFECTO, ge=1, le=LIMITE_MAXIMO, description="Elementos por página")
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+def paginar(consulta, columna_id, pagina: Pagina, response: Optional[Response] = None):
+    """
+    Aplica el cursor y el límite a `consulta` (ordenada por `columna_id`).
+    Devuelve (elementos, siguiente_cursor) y, si se pasa `response`,
+    publica el siguiente cursor en la cabecera X-Siguiente-Cursor.
+    """
+    if pagina.cursor is not None:
+        consulta = consulta.filter(columna_id > pagina.cursor)
+
+    # Se pide un elemento de más para saber si hay otra página
+    elementos = consulta.order_by(columna_id).limit(pagina.limit + 1).all()
+    return _recortar(elementos, pagina, response)
+
+
+def _recortar(elementos, pagina: Pagina, response: Optional[Response]):
+    siguiente = None
+    if len(elementos) > pagina.limit:
+        elementos = elementos[:pagina.limit]
+        siguiente = elementos[-1].id
+
+    if response is not None and siguiente is not None:
+        response.headers[CABECERA_CURSOR] = str(siguiente)
+
+    return elementos, siguiente
+
+
+def _seleccion_de_pagina(consulta, columna_id, pagina: Pagina):
+    if pagina.cursor is not None:
+        consulta = consulta.where(columna_id > pagina.cursor)
+    return consulta.order_by(columna_id).limit(pagina.limit + 1)
+
+
+def paginar_seleccion(
+    db, consulta, columna_id, pagina: Pagina, response: Optional[Response] = None, escalares: bool = True
+):
+    """
+    Igual que `paginar`, para un `select()` ejecutado con Session.
+    Con `escalares=False` devuelve filas (tuplas) en vez de objetos.
+    """
+    resultado = db.execute(_seleccion_de_pagina(consulta, columna_id, pagina))
+    elementos = resultado.scalars().all() if escalares else resultado.all()
+    return _recortar(elementos, pagina, response)
+
+
+async def paginar_async(
+    db, consulta, columna_id, pagina: Pagina, response: Optional[Response] = None, escalares: bool = True
+):
+    """
+    Igual que `paginar_seleccion`, con AsyncSession.
+    """
+    resultado = await db.execute(_seleccion_de_pagina(consulta, columna_id, pagina))
+    elementos = resultado.scalars().all() if escalares else resultado.all()
+    return _recortar(elementos, pagina, response)
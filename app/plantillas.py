@@ -0,0 +1,132 @@
+"""
+Archivo: plantillas.py
+Descripción: Entorno Jinja2 único para todas las vistas HTML.
+
+- Las plantillas se compilan una vez al arrancar (`precompilar`) y el
+  bytecode se guarda en PLANTILLAS_CACHE_DIR, así los demás workers y los
+  reinicios no vuelven a compilarlas.
+- Las páginas que no muestran datos se renderizan una sola vez por proceso
+  (`pagina`).
+- Los fragmentos con datos se guardan ya renderizados junto con la versión
+  de los datos que contienen (`fragmento`): mientras la versión no cambie no
+  se consulta ni se renderiza nada.
+
+PLANTILLAS_RECARGAR=1 (desarrollo) vuelve a leer las plantillas modificadas
+y desactiva las cachés de HTML.
+"""
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.responses import HTMLResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
+
+from app import avatares, estaticos
+
+DIRECTORIO = "app/templates"
+CACHE_DIR = os.getenv("PLANTILLAS_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "microhabitos-jinja")
+RECARGAR = os.getenv("PLANTILLAS_RECARGAR", "0") == "1"
+MAX_ENTRADAS = int(os.getenv("PLANTILLAS_CACHE_ENTRADAS", "256"))
+
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+entorno = Environment(
+    loader=FileSystemLoader(DIRECTORIO),
+    autoescape=True,
+    bytecode_cache=FileSystemBytecodeCache(CACHE_DIR),
+    # Sin recarga, Jinja no comprueba la fecha del archivo en cada render
+    auto_reload=RECARGAR,
+    cache_size=-1,
+)
+
+# {{ estatico("css/styles.css") }} -> URL versionada del manifiesto
+entorno.globals["estatico"] = estaticos.url
+# {{ avatar(usuario.foto, 48) }} -> URL de la miniatura (None sin foto)
+entorno.globals["avatar"] = avatares.url
+
+templates = Jinja2Templates(env=entorno)
+
+
+def precompilar() -> int:
+    """
+    Carga (y compila) todas las plantillas. Devuelve cuántas hay.
+    """
+    nombres = entorno.list_templates(extensions=["html"])
+    for nombre in nombres:
+        entorno.get_template(nombre)
+    return len(nombres)
+
+
+# ==========================================================
+#  HTML YA RENDERIZADO
+# ==========================================================
+class CacheHtml:
+
+    def __init__(self, max_entradas: int):
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener_o_generar(self, clave, generar, version=None) -> str:
+        """
+        HTML guardado para `clave` si es de `version`; si no, lo genera y
+        reemplaza al anterior (de cada clave solo se guarda una versión).
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] == version:
+                self._entradas.move_to_end(clave)
+                return entrada[1]
+
+        # Dos peticiones a la vez pueden renderizar lo mismo; da igual cuál gane
+        html = generar()
+
+        with self._lock:
+            self._entradas[clave] = (version, html)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return html
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+cache = CacheHtml(MAX_ENTRADAS)
+
+
+def _renderizar(nombre: str, contexto: dict) -> str:
+    return entorno.get_template(nombre).render(contexto)
+
+
+def pagina(request: Request, nombre: str) -> HTMLResponse:
+    """
+    Página que no depende de los datos ni de la petición.
+    """
+    if RECARGAR:
+        return HTMLResponse(_renderizar(nombre, {"request": request}))
+    return HTMLResponse(cache.obtener_o_generar(
+        ("pagina", nombre),
+        lambda: _renderizar(nombre, {"request": request})
+    ))
+
+
+def fragmento(nombre: str, version, contexto) -> Markup:
+    """
+    HTML de la plantilla parcial `nombre` para `version` de los datos.
+    `contexto` es una función que hace las consultas; solo se llama si el
+    fragmento no está en caché. La versión debe leerse antes que los datos:
+    así lo guardado nunca es más viejo que la versión con la que se guarda.
+    """
+    if RECARGAR:
+        return Markup(_renderizar(nombre, contexto()))
+    return Markup(cache.obtener_o_generar(
+        ("fragmento", nombre),
+        lambda: _renderizar(nombre, contexto()),
+        version
+    ))
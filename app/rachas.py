@@ -0,0 +1,173 @@
+"""
+Archivo: rachas.py
+Descripción: Racha, nivel y puntos del usuario calculados a partir de su
+progreso.
+
+- registrar_actividad: se llama con cada progreso completado y actualiza al
+  usuario en O(1) (una sola sentencia UPDATE) usando `ultima_actividad`.
+- recalcular_todos: reconstruye los valores de todos los usuarios en una
+  única pasada sobre `progreso` ordenado por (usuario_id, fecha).
+  Uso:  python -m app.rachas
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, select, case, func, bindparam
+from sqlalchemy.orm import Session
+
+from app import models, contadores
+
+PUNTOS_POR_RETO = 10
+PUNTOS_POR_NIVEL = 100
+FILAS_POR_LOTE = 5000
+
+_usuarios = models.Usuario.__table__
+
+
+def nivel_para(puntos: int) -> int:
+    return puntos // PUNTOS_POR_NIVEL + 1
+
+
+def _actualizacion_incremental():
+    dia = bindparam("dia")
+    ayer = bindparam("ayer")
+    ultima = _usuarios.c.ultima_actividad
+    racha = func.coalesce(_usuarios.c.racha_dias, 0)
+    puntos = func.coalesce(_usuarios.c.puntos, 0) + PUNTOS_POR_RETO
+
+    return (
+        update(_usuarios)
+        .where(_usuarios.c.id == bindparam("usuario"))
+        .values(
+            racha_dias=case(
+                (ultima >= dia, racha),          # mismo día (o evento atrasado): sin cambios
+                (ultima == ayer, racha + 1),     # día siguiente: la racha continúa
+                else_=1                          # primera actividad o racha rota
+            ),
+            ultima_actividad=case((ultima >= dia, ultima), else_=dia),
+            puntos=puntos,
+            nivel=puntos // PUNTOS_POR_NIVEL + 1,
+        )
+    )
+
+
+_ACTUALIZAR = _actualizacion_incremental()
+
+
+def _parametros(usuario_id: int, fecha: datetime):
+    dia = fecha.date() if isinstance(fecha, datetime) else fecha
+    return {"usuario": usuario_id, "dia": dia, "ayer": dia - timedelta(days=1)}
+
+
+def registrar_actividad(db: Session, usuario_id: int, fecha: datetime):
+    """
+    Aplica un reto completado en `fecha` a la racha, los puntos y el nivel del
+    usuario. No hace commit: va en la misma transacción que el progreso.
+    """
+    # Sin subir VERSION_USUARIOS: la tabla de /usuarios/vista caduca sola (USUARIOS_VISTA_TTL_S)
+    db.execute(_ACTUALIZAR, _parametros(usuario_id, fecha))
+
+
+def registrar_actividades(db: Session, actividades):
+    """
+    Igual que registrar_actividad para varios (usuario_id, fecha), en un solo
+    executemany. Se aplican en orden de fecha para que las rachas salgan bien.
+    """
+    filas = [_parametros(usuario_id, fecha) for usuario_id, fecha in sorted(actividades, key=lambda a: (a[1], a[0]))]
+    if filas:
+        db.execute(_ACTUALIZAR, filas)
+
+
+# ==========================================================
+#  RECÁLCULO COMPLETO
+# ==========================================================
+def _racha_final(dias):
+    """
+    Racha que termina en el último de `dias` (fechas distintas y ordenadas).
+    """
+    racha = 0
+    anterior = None
+    for dia in dias:
+        racha = racha + 1 if anterior is not None and dia - anterior == timedelta(days=1) else 1
+        anterior = dia
+    return racha
+
+
+def recalcular_todos(db: Session) -> int:
+    """
+    Recalcula racha, puntos, nivel y última actividad de todos los usuarios.
+    Los usuarios sin retos completados quedan en racha 0, 0 puntos y nivel 1.
+    Devuelve cuántos usuarios tienen actividad. Hace commit.
+    """
+    db.execute(update(_usuarios).values(racha_dias=0, puntos=0, nivel=1, ultima_actividad=None))
+
+    guardar = (
+        update(_usuarios)
+        .where(_usuarios.c.id == bindparam("usuario"))
+        .values(
+            racha_dias=bindparam("racha"),
+            puntos=bindparam("puntos_totales"),
+            nivel=bindparam("nivel_total"),
+            ultima_actividad=bindparam("ultima"),
+        )
+    )
+
+    filas = db.execute(
+        select(models.Progreso.usuario_id, models.Progreso.fecha)
+        .where(
+            models.Progreso.completado == True,
+            models.Progreso.usuario_id.isnot(None),
+            models.Progreso.fecha.isnot(None)
+        )
+        .order_by(models.Progreso.usuario_id, models.Progreso.fecha)
+        .execution_options(yield_per=FILAS_POR_LOTE)
+    )
+
+    lote = []
+    usuarios = 0
+    actual, completados, dias = None, 0, []
+
+    def cerrar_usuario():
+        puntos = completados * PUNTOS_POR_RETO
+        lote.append({
+            "usuario": actual,
+            "racha": _racha_final(dias),
+            "puntos_totales": puntos,
+            "nivel_total": nivel_para(puntos),
+            "ultima": dias[-1],
+        })
+
+    for usuario_id, fecha in filas:
+        if usuario_id != actual:
+            if actual is not None:
+                cerrar_usuario()
+                usuarios += 1
+            actual, completados, dias = usuario_id, 0, []
+        completados += 1
+        dia = fecha.date()
+        if not dias or dias[-1] != dia:
+            dias.append(dia)
+
+        if len(lote) >= FILAS_POR_LOTE:
+            db.execute(guardar, lote)
+            lote = []
+
+    if actual is not None:
+        cerrar_usuario()
+        usuarios += 1
+    if lote:
+        db.execute(guardar, lote)
+
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    db.commit()
+    return usuarios
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        total = recalcular_todos(db)
+    finally:
+        db.close()
+    print(f"✅ Rachas, puntos y niveles recalculados ({total} usuarios con actividad)")
@@ -0,0 +1,297 @@
+"""
+Archivo: ranking.py
+Descripción: Clasificación en memoria de los usuarios por puntos.
+Un índice ordenado (SortedList) permite obtener el top-N, la posición de un
+usuario y sus vecinos en O(log n) sin ordenar la tabla `gamificacion` en
+cada consulta. Hay una clasificación global, una por categoría de usuario y,
+bajo demanda, una por comunidad.
+
+Cada worker tiene su propia copia: se reconstruye desde la base de datos al
+arrancar y cada RANKING_RESINCRONIZAR_S segundos, y entre medias se actualiza
+con las escrituras que atiende el propio worker.
+"""
+import os
+import threading
+from contextlib import contextmanager
+
+from sortedcontainers import SortedList
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.acumulador_puntos import acumulador
+
+RESINCRONIZAR_S = int(os.getenv("RANKING_RESINCRONIZAR_S", "60"))
+FILAS_POR_LOTE = 5000
+
+
+class Clasificacion:
+    """
+    Usuarios ordenados por puntos (descendente) y, a igualdad, por ID.
+    """
+
+    def __init__(self):
+        self._orden = SortedList()
+        self._puntos = {}
+
+    def __len__(self):
+        return len(self._puntos)
+
+    def __contains__(self, usuario_id):
+        return usuario_id in self._puntos
+
+    def fijar(self, usuario_id: int, puntos: int):
+        anterior = self._puntos.get(usuario_id)
+        if anterior is not None:
+            self._orden.remove((-anterior, usuario_id))
+        self._puntos[usuario_id] = puntos
+        self._orden.add((-puntos, usuario_id))
+
+    def quitar(self, usuario_id: int):
+        puntos = self._puntos.pop(usuario_id, None)
+        if puntos is not None:
+            self._orden.remove((-puntos, usuario_id))
+
+    def puntos(self, usuario_id: int):
+        return self._puntos.get(usuario_id)
+
+    def posicion(self, usuario_id: int):
+        """
+        Posición (empezando en 1) o None si el usuario no está clasificado.
+        """
+        puntos = self._puntos.get(usuario_id)
+        if puntos is None:
+            return None
+        return self._orden.index((-puntos, usuario_id)) + 1
+
+    def tramo(self, inicio: int, fin: int):
+        """
+        [(posición, usuario_id, puntos)] de las posiciones inicio..fin-1 (base 0).
+        """
+        inicio = max(inicio, 0)
+        return [
+            (inicio + i + 1, usuario_id, -negativo)
+            for i, (negativo, usuario_id) in enumerate(self._orden.islice(inicio, fin))
+        ]
+
+
+class Ranking:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._carga = threading.RLock()   # Una reconstrucción cada vez; las consultas no lo toman
+        self._global = Clasificacion()
+        self._por_categoria = {}
+        self._categoria_de = {}
+        self._por_comunidad = {}      # comunidad_id -> Clasificacion (cargadas bajo demanda)
+        self._comunidades_de = {}     # usuario_id -> {comunidad_id} de las comunidades cargadas
+        self._listo = False
+        self._cambios = None          # lo que hay que repetir tras una reconstrucción en curso
+        self._generacion = 0          # Sube al reconstruir o invalidar una comunidad
+
+    # ------------------------------------------------------------------
+    # Carga desde la base de datos
+    # ------------------------------------------------------------------
+    def reconstruir(self, db: Session):
+        """
+        Vuelve a leer toda la clasificación. Las actualizaciones que llegan
+        mientras tanto se repiten sobre el resultado con valores absolutos
+        (la lectura puede incluirlas o no). Los puntos aún en el acumulador
+        de escritura diferida se suman a lo leído.
+        """
+        # Sin volcados durante la lectura: si no, unos puntos podrían no estar
+        # ni en lo leído ni en el acumulador
+        with self._carga, acumulador.sin_volcar():
+            self._reconstruir(db)
+
+    def _reconstruir(self, db: Session):
+        with self._lock:
+            self._cambios = []
+
+        try:
+            clasificacion = Clasificacion()
+            por_categoria = {}
+            categoria_de = {}
+            filas = db.execute(
+                select(models.Gamificacion.usuario_id, models.Gamificacion.puntos, models.Usuario.categoria)
+                .join(models.Usuario, models.Usuario.id == models.Gamificacion.usuario_id)
+                .execution_options(yield_per=FILAS_POR_LOTE)
+            )
+            for usuario_id, puntos, categoria in filas:
+                clasificacion.fijar(usuario_id, puntos or 0)
+                categoria_de[usuario_id] = categoria
+                por_categoria.setdefault(categoria, Clasificacion()).fijar(usuario_id, puntos or 0)
+        except Exception:
+            with self._lock:
+                self._cambios = None
+            raise
+
+        with self._lock:
+            # Bajo el lock: ver sumar_puntos (routers/gamificacion.py) en modo diferido
+            for usuario_id, puntos in acumulador.pendientes().items():
+                actuales = clasificacion.puntos(usuario_id)
+                if actuales is not None and puntos:
+                    clasificacion.fijar(usuario_id, actuales + puntos)
+                    por_categoria[categoria_de[usuario_id]].fijar(usuario_id, actuales + puntos)
+
+            cambios, self._cambios = self._cambios, None
+            self._global = clasificacion
+            self._por_categoria = por_categoria
+            self._categoria_de = categoria_de
+            self._por_comunidad = {}
+            self._comunidades_de = {}
+            self._generacion += 1
+            self._listo = True
+            for repeticion in cambios:
+                repeticion()
+
+    def asegurar(self, db: Session):
+        if not self._listo:
+            with self._carga:
+                if not self._listo:
+                    self.reconstruir(db)
+
+    def _cargar_comunidad(self, db: Session, comunidad_id: int):
+        """
+        La consulta va sin el lock; el resultado se descarta si mientras
+        tanto hubo una reconstrucción o un cambio de miembros.
+        """
+        with self._lock:
+            generacion = self._generacion
+        uc = models.usuarios_comunidad
+        miembros = db.execute(select(uc.c.usuario_id).where(uc.c.comunidad_id == comunidad_id)).scalars().all()
+
+        with self._lock:
+            if self._generacion != generacion or comunidad_id in self._por_comunidad:
+                return
+            clasificacion = Clasificacion()
+            for usuario_id in miembros:
+                # Los puntos se toman de la clasificación global, que puede ir por
+                # delante de la base de datos (escritura diferida).
+                puntos = self._global.puntos(usuario_id)
+                if puntos is not None:
+                    clasificacion.fijar(usuario_id, puntos)
+            self._por_comunidad[comunidad_id] = clasificacion
+            for usuario_id in clasificacion._puntos:
+                self._comunidades_de.setdefault(usuario_id, set()).add(comunidad_id)
+
+    # ------------------------------------------------------------------
+    # Actualizaciones (desde los endpoints de escritura)
+    # ------------------------------------------------------------------
+    def _fijar(self, usuario_id: int, puntos: int):
+        self._global.fijar(usuario_id, puntos)
+        categoria = self._categoria_de.get(usuario_id)
+        self._por_categoria.setdefault(categoria, Clasificacion()).fijar(usuario_id, puntos)
+        for comunidad_id in self._comunidades_de.get(usuario_id, ()):
+            self._por_comunidad[comunidad_id].fijar(usuario_id, puntos)
+
+    def _registrar(self, cambio, repeticion=None):
+        """
+        Aplica `cambio` y, si hay una reconstrucción en curso, apunta
+        `repeticion` (por defecto el mismo cambio) para después. La
+        repetición tiene que dar lo mismo se haya leído ya el cambio o no.
+        """
+        with self._lock:
+            if self._cambios is not None and repeticion is not False:
+                self._cambios.append(repeticion or cambio)
+            cambio()
+
+    def actualizar(self, usuario_id: int, puntos: int, categoria=None):
+        """
+        Fija los puntos de un usuario. `categoria` solo hace falta para
+        usuarios que aún no están clasificados.
+        """
+        def cambio():
+            if categoria is not None:
+                self._categoria_de.setdefault(usuario_id, categoria)
+            self._fijar(usuario_id, puntos)
+        self._registrar(cambio)
+
+    def sumar(self, usuario_id: int, puntos: int, total=None):
+        """
+        Suma puntos a un usuario ya clasificado. Al ser un incremento, el
+        resultado no depende del orden en que terminen peticiones concurrentes.
+        `total` son los puntos que quedaron en la base de datos (RETURNING):
+        es lo que se repite tras una reconstrucción. Sin `total` (escritura
+        diferida) no se repite nada: la reconstrucción ya suma el acumulador.
+        """
+        def cambio():
+            actuales = self._global.puntos(usuario_id)
+            if actuales is not None:
+                self._fijar(usuario_id, actuales + puntos)
+
+        def repeticion():
+            if usuario_id in self._global:
+                self._fijar(usuario_id, total)
+        self._registrar(cambio, repeticion if total is not None else False)
+
+    def quitar(self, usuario_id: int):
+        def cambio():
+            self._global.quitar(usuario_id)
+            categoria = self._categoria_de.pop(usuario_id, None)
+            if categoria in self._por_categoria:
+                self._por_categoria[categoria].quitar(usuario_id)
+            for comunidad_id in self._comunidades_de.pop(usuario_id, ()):
+                self._por_comunidad[comunidad_id].quitar(usuario_id)
+        self._registrar(cambio)
+
+    def cambiar_categoria(self, usuario_id: int, categoria):
+        def cambio():
+            anterior = self._categoria_de.get(usuario_id)
+            puntos = self._global.puntos(usuario_id)
+            if puntos is None or anterior == categoria:
+                return
+            if anterior in self._por_categoria:
+                self._por_categoria[anterior].quitar(usuario_id)
+            self._categoria_de[usuario_id] = categoria
+            self._por_categoria.setdefault(categoria, Clasificacion()).fijar(usuario_id, puntos)
+        self._registrar(cambio)
+
+    def invalidar_comunidad(self, comunidad_id: int):
+        """
+        Descarta la clasificación de una comunidad tras un cambio de miembros;
+        se vuelve a cargar en la siguiente consulta.
+        """
+        def cambio():
+            self._generacion += 1
+            clasificacion = self._por_comunidad.pop(comunidad_id, None)
+            if clasificacion is None:
+                return
+            for usuario_id in clasificacion._puntos:
+                comunidades = self._comunidades_de.get(usuario_id)
+                if comunidades:
+                    comunidades.discard(comunidad_id)
+        self._registrar(cambio)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    @contextmanager
+    def consultar(self, db: Session, comunidad_id=None, categoria=None):
+        """
+        Context manager con la clasificación global, de una categoría o de
+        una comunidad, con `lock` tomado. Lo que haya que cargar de la base
+        de datos se carga antes, sin el lock.
+        """
+        while True:
+            self.asegurar(db)
+            if comunidad_id is not None and comunidad_id not in self._por_comunidad:
+                self._cargar_comunidad(db, comunidad_id)
+            with self._lock:
+                if comunidad_id is not None:
+                    clasificacion = self._por_comunidad.get(comunidad_id)
+                    if clasificacion is None:
+                        continue  # Invalidada mientras se cargaba
+                elif categoria is not None:
+                    clasificacion = self._por_categoria.get(categoria) or Clasificacion()
+                else:
+                    clasificacion = self._global
+                yield clasificacion
+                return
+
+    @property
+    def lock(self):
+        return self._lock
+
+
+ranking = Ranking()
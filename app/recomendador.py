@@ -0,0 +1,277 @@
+"""
+Archivo: recomendador.py
+Descripción: Siguiente microrreto para un usuario. Elige un reto de su
+categoría que no haya intentado, con la dificultad que corresponde a su tasa
+de acierto reciente.
+
+En memoria se guardan:
+  - los candidatos de cada (categoría, dificultad): arreglo ordenado de IDs;
+  - por usuario, un mapa de bits con los retos ya intentados y sus últimos
+    resultados (se cargan al pedir su primera recomendación, LRU).
+Elegir un reto es entonces recorrer el arreglo de candidatos por bloques y
+mirar bits, sin consultar la base de datos.
+
+Igual que el ranking, cada worker tiene su copia: se reconstruye cada
+RECOMENDADOR_RESINCRONIZAR_S y entre medias la actualizan las escrituras que
+atiende el propio worker.
+"""
+import os
+import random
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+RESINCRONIZAR_S = int(os.getenv("RECOMENDADOR_RESINCRONIZAR_S", "300"))
+MAX_USUARIOS = int(os.getenv("RECOMENDADOR_MAX_USUARIOS", "5000"))
+FILAS_POR_LOTE = 5000
+
+DIFICULTADES = ("Baja", "Media", "Alta")
+RECIENTES = 20          # intentos que cuentan para la tasa de acierto
+TASA_MEDIA = 0.5        # a partir de esta tasa se sube a Media
+TASA_ALTA = 0.8         # y a partir de esta, a Alta
+BLOQUE = 1024           # candidatos que se comprueban de una vez
+
+
+def dificultad_para(resultados) -> str:
+    """
+    Dificultad según los últimos resultados (True = completado).
+    Sin historial se empieza por Baja.
+    """
+    if not resultados:
+        return "Baja"
+    tasa = sum(resultados) / len(resultados)
+    if tasa >= TASA_ALTA:
+        return "Alta"
+    if tasa >= TASA_MEDIA:
+        return "Media"
+    return "Baja"
+
+
+def _orden_dificultades(preferida: str):
+    # Si no quedan retos de la dificultad elegida, se prueba la más cercana
+    i = DIFICULTADES.index(preferida)
+    return sorted(DIFICULTADES, key=lambda d: abs(DIFICULTADES.index(d) - i))
+
+
+class EstadoUsuario:
+    """
+    Retos intentados (un bit por ID de reto) y últimos resultados.
+    """
+
+    def __init__(self):
+        self.bits = bytearray()
+        self.recientes = deque(maxlen=RECIENTES)
+
+    def registrar(self, reto_id: int, completado: bool):
+        byte = reto_id >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte + 1 - len(self.bits)))
+        self.bits[byte] |= 1 << (reto_id & 7)
+        self.recientes.append(bool(completado))
+
+    def mapa(self) -> np.ndarray:
+        """
+        Mapa de bits desempaquetado: un uint8 (0/1) por ID de reto.
+        """
+        return np.unpackbits(np.frombuffer(bytes(self.bits), dtype=np.uint8), bitorder="little")
+
+
+def _libres(mapa: np.ndarray, candidatos: np.ndarray) -> np.ndarray:
+    """
+    Máscara de los `candidatos` (ordenados) que no están marcados en `mapa`.
+    Los IDs que quedan fuera del mapa nunca se han intentado.
+    """
+    dentro = np.searchsorted(candidatos, len(mapa))
+    libres = np.ones(len(candidatos), dtype=bool)
+    libres[:dentro] = mapa[candidatos[:dentro]] == 0
+    return libres
+
+
+class Recomendador:
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._carga = threading.RLock()   # Una reconstrucción cada vez; las consultas no lo toman
+        self._candidatos = {}      # (categoria, dificultad) -> np.ndarray ordenado de IDs
+        self._clave_de = {}        # reto_id -> (categoria, dificultad)
+        self._usuarios = OrderedDict()
+        self._cargando = {}        # usuario_id -> [(reto_id, completado)] llegados durante la carga
+        self._listo = False
+        self._cambios = None
+
+    # ------------------------------------------------------------------
+    # Catálogo
+    # ------------------------------------------------------------------
+    def reconstruir(self, db: Session):
+        """
+        Vuelve a leer el catálogo y olvida los estados de usuario (se
+        recargan bajo demanda). Los cambios que llegan mientras tanto se
+        aplican de nuevo sobre el resultado.
+        """
+        with self._carga:
+            self._reconstruir(db)
+
+    def _reconstruir(self, db: Session):
+        with self._lock:
+            self._cambios = []
+
+        try:
+            por_clave = {}
+            clave_de = {}
+            filas = db.execute(
+                select(models.MicroReto.id, models.MicroReto.categoria, models.MicroReto.dificultad)
+                .execution_options(yield_per=FILAS_POR_LOTE)
+            )
+            for reto_id, categoria, dificultad in filas:
+                por_clave.setdefault((categoria, dificultad), []).append(reto_id)
+                clave_de[reto_id] = (categoria, dificultad)
+            candidatos = {
+                clave: np.array(sorted(ids), dtype=np.int64) for clave, ids in por_clave.items()
+            }
+        except Exception:
+            with self._lock:
+                self._cambios = None
+            raise
+
+        with self._lock:
+            cambios, self._cambios = self._cambios, None
+            self._candidatos = candidatos
+            self._clave_de = clave_de
+            self._usuarios.clear()
+            self._listo = True
+            for cambio in cambios:
+                cambio()
+
+    def asegurar(self, db: Session):
+        if not self._listo:
+            with self._carga:
+                if not self._listo:
+                    self.reconstruir(db)
+
+    def _registrar_cambio(self, cambio):
+        with self._lock:
+            if self._cambios is not None:
+                self._cambios.append(cambio)
+            cambio()
+
+    def _sacar(self, reto_id: int):
+        clave = self._clave_de.pop(reto_id, None)
+        if clave is None:
+            return
+        ids = self._candidatos[clave]
+        self._candidatos[clave] = np.delete(ids, np.searchsorted(ids, reto_id))
+
+    def agregar_reto(self, reto_id: int, categoria, dificultad):
+        """
+        Alta o cambio de categoría/dificultad de un reto.
+        """
+        def cambio():
+            self._sacar(reto_id)
+            clave = (categoria, dificultad)
+            ids = self._candidatos.get(clave, np.empty(0, dtype=np.int64))
+            self._candidatos[clave] = np.insert(ids, np.searchsorted(ids, reto_id), reto_id)
+            self._clave_de[reto_id] = clave
+        self._registrar_cambio(cambio)
+
+    def quitar_reto(self, reto_id: int):
+        self._registrar_cambio(lambda: self._sacar(reto_id))
+
+    def invalidar(self):
+        """
+        Tras una carga masiva: el catálogo se vuelve a leer en la próxima
+        recomendación.
+        """
+        with self._lock:
+            self._listo = False
+
+    # ------------------------------------------------------------------
+    # Estado de cada usuario
+    # ------------------------------------------------------------------
+    def _estado(self, db: Session, usuario_id: int) -> EstadoUsuario:
+        with self._lock:
+            estado = self._usuarios.get(usuario_id)
+            if estado is not None:
+                self._usuarios.move_to_end(usuario_id)
+                return estado
+            self._cargando[usuario_id] = []
+
+        estado = EstadoUsuario()
+        try:
+            filas = db.execute(
+                select(models.Progreso.reto_id, models.Progreso.completado)
+                .where(models.Progreso.usuario_id == usuario_id)
+                .order_by(models.Progreso.fecha, models.Progreso.id)
+            )
+            for reto_id, completado in filas:
+                if reto_id is not None:
+                    estado.registrar(reto_id, completado)
+        except Exception:
+            with self._lock:
+                self._cargando.pop(usuario_id, None)
+            raise
+
+        with self._lock:
+            for reto_id, completado in self._cargando.pop(usuario_id, []):
+                estado.registrar(reto_id, completado)
+            self._usuarios[usuario_id] = estado
+            while len(self._usuarios) > MAX_USUARIOS:
+                self._usuarios.popitem(last=False)
+        return estado
+
+    def registrar(self, usuario_id: int, reto_id: int, completado: bool):
+        """
+        Llamar tras guardar un progreso. Solo afecta a usuarios ya cargados
+        (o cargándose).
+        """
+        with self._lock:
+            if usuario_id in self._cargando:
+                self._cargando[usuario_id].append((reto_id, completado))
+            estado = self._usuarios.get(usuario_id)
+            if estado is not None:
+                estado.registrar(reto_id, completado)
+
+    # ------------------------------------------------------------------
+    # Recomendación
+    # ------------------------------------------------------------------
+    def siguiente(self, db: Session, usuario_id: int, categoria):
+        """
+        ID del siguiente reto para el usuario, o None si no le queda ninguno
+        sin intentar en su categoría.
+        """
+        self.asegurar(db)
+        estado = self._estado(db, usuario_id)
+
+        with self._lock:
+            mapa = estado.mapa()
+            for dificultad in _orden_dificultades(dificultad_para(estado.recientes)):
+                candidatos = self._candidatos.get((categoria, dificultad))
+                if candidatos is None or not len(candidatos):
+                    continue
+                reto_id = self._primero_libre(mapa, candidatos)
+                if reto_id is not None:
+                    return reto_id
+        return None
+
+    @staticmethod
+    def _primero_libre(mapa: np.ndarray, candidatos: np.ndarray):
+        # Empezar en una posición al azar reparte los retos entre usuarios
+        # con el mismo historial. Casi siempre hay uno libre en el primer
+        # bloque; si no, se comprueba el arreglo entero de una vez.
+        inicio = random.randrange(len(candidatos))
+        bloque = candidatos[inicio:inicio + BLOQUE]
+        libres = np.flatnonzero(_libres(mapa, bloque))
+        if len(libres):
+            return int(bloque[libres[0]])
+
+        libres = np.flatnonzero(_libres(mapa, candidatos))
+        if not len(libres):
+            return None
+        siguiente = np.searchsorted(libres, inicio)
+        return int(candidatos[libres[siguiente % len(libres)]])
+
+recomendador = Recomendador()
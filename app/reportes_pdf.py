@@ -0,0 +1,96 @@
+"""
+Archivo: reportes_pdf.py
+Descripción: Generación de reportes PDF. Se ejecuta en los procesos de
+trabajos_reportes, nunca dentro de una petición.
+"""
+from itertools import chain
+from typing import Optional
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import letter
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models, contadores
+
+FILAS_POR_LOTE = 1000
+
+
+# ==========================================================
+#  RANKING DE USUARIOS
+# ==========================================================
+def consultar_ranking(db: Session, limite: Optional[int] = None):
+    """
+    Una sola consulta (JOIN) con cursor del lado del servidor:
+    las filas llegan por lotes de FILAS_POR_LOTE en vez de cargarse todas.
+    Con `limite`, solo los primeros puestos.
+    """
+    consulta = (
+        select(models.Usuario.nombre, models.Gamificacion.puntos, models.Gamificacion.badge)
+        .join(models.Usuario, models.Usuario.id == models.Gamificacion.usuario_id)
+        .order_by(models.Gamificacion.puntos.desc(), models.Gamificacion.id)
+        .execution_options(yield_per=FILAS_POR_LOTE)
+    )
+    if limite is not None:
+        consulta = consulta.limit(limite)
+    return db.execute(consulta)
+
+
+def escribir_ranking_pdf(filas, destino):
+    """
+    Dibuja el ranking en `destino` (ruta o archivo binario) página por página.
+    """
+    pdf = canvas.Canvas(destino, pagesize=letter)
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawString(150, 750, "Ranking de Usuarios por Puntos")
+
+    pdf.setFont("Helvetica", 12)
+    y = 700
+
+    pdf.drawString(50, y, "Puesto")
+    pdf.drawString(120, y, "Usuario")
+    pdf.drawString(300, y, "Puntos")
+    pdf.drawString(400, y, "Badge")
+
+    y -= 30
+
+    for puesto, (nombre, puntos, badge) in enumerate(filas, start=1):
+        pdf.drawString(50, y, str(puesto))
+        pdf.drawString(120, y, nombre)
+        pdf.drawString(300, y, str(puntos))
+        pdf.drawString(400, y, badge or "")
+
+        y -= 25
+
+        if y < 50:
+            pdf.showPage()
+            pdf.setFont("Helvetica", 12)
+            y = 750
+
+    pdf.save()
+
+
+def renderizar_ranking(db: Session, destino, limite: Optional[int] = None) -> bool:
+    """
+    Escribe el PDF del ranking en `destino`. Devuelve False si no hay datos.
+    """
+    resultado = consultar_ranking(db, limite)
+    try:
+        primera = resultado.fetchone()
+        if primera is None:
+            return False
+        escribir_ranking_pdf(chain([primera], resultado), destino)
+        return True
+    finally:
+        resultado.close()
+
+
+# ==========================================================
+#  VERSIÓN DE LOS DATOS
+# ==========================================================
+def version_ranking(db: Session) -> int:
+    """
+    Cambia con cada escritura en gamificación: un PDF generado para una
+    versión sigue siendo válido mientras no cambie.
+    """
+    return contadores.leer(db, contadores.VERSION_RANKING) or 0
@@ -0,0 +1,66 @@
+"""
+Archivo: respuestas_rapidas.py
+Descripción: Listados sin pasar cada fila por Pydantic. Se seleccionan solo
+las columnas del esquema de salida (tuplas, no objetos ORM) y se serializan
+directamente a bytes con orjson, con los campos en el mismo orden que usaría
+Pydantic. El `response_model` de cada ruta se mantiene, así que el esquema
+OpenAPI no cambia.
+
+RESPUESTAS_RAPIDAS=0 vuelve al camino ORM + Pydantic.
+"""
+import os
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from sqlalchemy import select
+
+from app.paginacion import CABECERA_CURSOR
+
+ACTIVO = os.getenv("RESPUESTAS_RAPIDAS", "1") == "1"
+
+
+def columnas(modelo, esquema):
+    """
+    Columnas de `modelo` en el orden de los campos de `esquema`.
+    """
+    return [getattr(modelo, campo) for campo in esquema.model_fields]
+
+
+def seleccion(modelo, esquema):
+    """
+    select() del listado: tuplas con las columnas del esquema en modo
+    rápido, objetos ORM si no.
+    """
+    if ACTIVO:
+        return select(*columnas(modelo, esquema))
+    return select(modelo)
+
+
+def serializar(esquema, filas) -> bytes:
+    nombres = tuple(esquema.model_fields)
+    return orjson.dumps([dict(zip(nombres, fila)) for fila in filas])
+
+
+def cuerpo(esquema, elementos):
+    """
+    Bytes JSON de `elementos` en modo rápido; si no, los elementos tal cual
+    para que los serialice FastAPI (o la caché de respuestas).
+    """
+    if ACTIVO:
+        return serializar(esquema, elementos)
+    return elementos
+
+
+def responder(esquema, elementos, response: Optional[Response] = None):
+    """
+    Respuesta final del listado. Copia la cabecera del cursor desde
+    `response`, porque FastAPI no la añade a una Response devuelta a mano.
+    """
+    if not ACTIVO:
+        return elementos
+
+    cabeceras = {}
+    if response is not None and CABECERA_CURSOR in response.headers:
+        cabeceras[CABECERA_CURSOR] = response.headers[CABECERA_CURSOR]
+    return Response(serializar(esquema, elementos), media_type="application/json", headers=cabeceras)
@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, Query, Request, Response
+from sqlalchemy.orm import Session
+from app import models, schemas, busqueda, plantillas
+from app.database import get_db
+from app.paginacion import CABECERA_CURSOR
+from app.instrumentacion import RutaMedida
+
+router = APIRouter(
+    prefix="/buscar",
+    tags=["Búsqueda"],
+    route_class=RutaMedida
+)
+
+
+def _retos_con_relevancia(db: Session, resultados):
+    """
+    Carga los microrretos de [(reto_id, relevancia)] en una sola consulta,
+    conservando el orden por relevancia.
+    """
+    if not resultados:
+        return []
+    retos = {
+        reto.id: reto
+        for reto in db.query(models.MicroReto).filter(models.MicroReto.id.in_([r for r, _ in resultados]))
+    }
+    return [
+        {**schemas.MicroReto.model_validate(retos[reto_id]).model_dump(), "relevancia": relevancia}
+        for reto_id, relevancia in resultados if reto_id in retos
+    ]
+
+
+# ==========================================================
+#  VISTA HTML (formulario de búsqueda del menú)
+# ==========================================================
+@router.get("")
+def vista_busqueda(request: Request, q: str = "", db: Session = Depends(get_db)):
+    retos, usuarios = [], []
+    if q.strip():
+        retos = _retos_con_relevancia(db, busqueda.buscar_retos(db, q, 0, 20))
+        usuarios = busqueda.sugerir_usuarios(db, q.strip(), 10)
+    return plantillas.templates.TemplateResponse(
+        "buscar.html",
+        {"request": request, "q": q, "retos": retos, "usuarios": usuarios}
+    )
+
+
+# ==========================================================
+#  MICRORRETOS POR PALABRAS CLAVE (ordenados por relevancia)
+# ==========================================================
+@router.get("/retos", response_model=list[schemas.ResultadoReto])
+def buscar_retos(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Palabras a buscar en contenido y respuesta"),
+    cursor: int = Query(0, ge=0, description="Resultados ya vistos (valor de X-Siguiente-Cursor)"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    # Se pide uno de más para saber si hay otra página
+    resultados = busqueda.buscar_retos(db, q, cursor, limit + 1)
+    if len(resultados) > limit:
+        resultados = resultados[:limit]
+        response.headers[CABECERA_CURSOR] = str(cursor + limit)
+    return _retos_con_relevancia(db, resultados)
+
+
+# ==========================================================
+#  USUARIOS POR PREFIJO DEL NOMBRE (autocompletado)
+# ==========================================================
+@router.get("/usuarios", response_model=list[schemas.SugerenciaUsuario])
+def sugerir_usuarios(
+    q: str = Query(..., min_length=1, max_length=100, description="Comienzo del nombre"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db)
+):
+    return [
+        {"id": usuario_id, "nombre": nombre}
+        for usuario_id, nombre in busqueda.sugerir_usuarios(db, q, limit)
+    ]
@@ -1,11 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
 from sqlalchemy.orm import Session
-from app import models, schemas
+from app import consultas, models, schemas, cache_respuestas, respuestas_rapidas, membresias, eventos
 from app.database import get_db
+from app.ranking import ranking
+from app.paginacion import Pagina, paginar, paginar_seleccion
+from app.instrumentacion import RutaMedida
 
 router = APIRouter(
     prefix="/comunidad",
-    tags=["Comunidad"]
+    tags=["Comunidad"],
+    route_class=RutaMedida
 )
 
 # --------------------------------------------------------------
@@ -20,8 +25,14 @@ def crear_comunidad(data: schemas.ComunidadCreate, db: Session = Depends(get_db)
     )
 
     db.add(nueva_comunidad)
+    db.flush()
+    eventos.registrar(
+        db, "comunidad.creada", nueva_comunidad.id,
+        nombre_reto=data.nombre_reto, categoria=data.categoria, duracion=data.duracion
+    )
     db.commit()
     db.refresh(nueva_comunidad)
+    cache_respuestas.invalidar(cache_respuestas.COMUNIDADES)
     return nueva_comunidad
 
 
@@ -29,19 +40,34 @@ def crear_comunidad(data: schemas.ComunidadCreate, db: Session = Depends(get_db)
 # Listar comunidades (GET)
 # --------------------------------------------------------------
 @router.get("/", response_model=list[schemas.Comunidad])
-def listar_comunidades(db: Session = Depends(get_db)):
-    return db.query(models.Comunidad).all()
+def listar_comunidades(
+    request: Request,
+    categoria: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    def consultar(response: Response):
+        comunidades, _ = paginar_seleccion(
+            db, consultas.comunidades(categoria), models.Comunidad.id, pagina, response,
+            escalares=consultas.ESCALARES
+        )
+        return respuestas_rapidas.cuerpo(schemas.Comunidad, comunidades)
+
+    return cache_respuestas.responder(request, cache_respuestas.COMUNIDADES, list[schemas.Comunidad], consultar)
 
 
 # --------------------------------------------------------------
 # Obtener comunidad por ID (GET)
 # --------------------------------------------------------------
 @router.get("/{comunidad_id}", response_model=schemas.Comunidad)
-def obtener_comunidad(comunidad_id: int, db: Session = Depends(get_db)):
-    comunidad = db.query(models.Comunidad).filter(models.Comunidad.id == comunidad_id).first()
-    if not comunidad:
-        raise HTTPException(status_code=404, detail="Comunidad no encontrada")
-    return comunidad
+def obtener_comunidad(comunidad_id: int, request: Request, db: Session = Depends(get_db)):
+    def consultar(response: Response):
+        comunidad = db.execute(consultas.comunidad(comunidad_id)).scalars().first()
+        if not comunidad:
+            raise HTTPException(status_code=404, detail="Comunidad no encontrada")
+        return comunidad
+
+    return cache_respuestas.responder(request, cache_respuestas.COMUNIDADES, schemas.Comunidad, consultar)
 
 
 # --------------------------------------------------------------
@@ -55,49 +81,121 @@ def obtener_participantes(comunidad_id: int, db: Session = Depends(get_db)):
     return comunidad.participantes
 
 
+# --------------------------------------------------------------
+# Participantes paginados, con el total (GET)
+# --------------------------------------------------------------
+@router.get("/{comunidad_id}/miembros", response_model=schemas.ParticipantesComunidad)
+def obtener_participantes_paginados(
+    comunidad_id: int,
+    response: Response,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Página de participantes ordenada por ID de usuario (cursor en
+    X-Siguiente-Cursor) y número total de miembros.
+    """
+    if not membresias.comunidad_existe(db, comunidad_id):
+        raise HTTPException(status_code=404, detail="Comunidad no encontrada")
+
+    consulta = membresias.participantes(db.query(models.Usuario), comunidad_id)
+    participantes, _ = paginar(consulta, models.usuarios_comunidad.c.usuario_id, pagina, response)
+    return {"total": membresias.contar(db, comunidad_id), "participantes": participantes}
+
+
 # --------------------------------------------------------------
 # Agregar usuario a comunidad (POST)
 # --------------------------------------------------------------
 @router.post("/{comunidad_id}/agregar/{usuario_id}", status_code=status.HTTP_200_OK)
 def agregar_usuario(comunidad_id: int, usuario_id: int, db: Session = Depends(get_db)):
-    comunidad = db.query(models.Comunidad).filter(models.Comunidad.id == comunidad_id).first()
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-
-    if not comunidad:
+    if not membresias.comunidad_existe(db, comunidad_id):
         raise HTTPException(status_code=404, detail="Comunidad no encontrada")
-    if not usuario:
+    if not membresias.usuarios_existentes(db, [usuario_id]):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    # Evitar duplicados
-    if usuario in comunidad.participantes:
+    # Evitar duplicados: el INSERT no hace nada si ya es miembro
+    if not membresias.agregar(db, comunidad_id, [usuario_id]):
         raise HTTPException(status_code=400, detail="El usuario ya está en esta comunidad")
 
-    comunidad.participantes.append(usuario)
+    eventos.registrar(db, "comunidad.miembros_agregados", comunidad_id, usuario_ids=[usuario_id])
     db.commit()
+    ranking.invalidar_comunidad(comunidad_id)
     return {"mensaje": f"Usuario {usuario_id} agregado a la comunidad {comunidad_id}."}
 
 
+# --------------------------------------------------------------
+# Agregar varios usuarios a una comunidad (POST)
+# --------------------------------------------------------------
+@router.post("/{comunidad_id}/agregar", response_model=schemas.AltasComunidad)
+def agregar_usuarios(comunidad_id: int, data: schemas.MiembrosComunidad, db: Session = Depends(get_db)):
+    """
+    Alta en lote. Los que ya eran miembros o no existen se informan, no
+    son un error.
+    """
+    if not membresias.comunidad_existe(db, comunidad_id):
+        raise HTTPException(status_code=404, detail="Comunidad no encontrada")
+
+    usuario_ids = membresias.sin_repetidos(data.usuario_ids)
+    existentes = membresias.usuarios_existentes(db, usuario_ids)
+    agregados = membresias.agregar(db, comunidad_id, usuario_ids)
+    lista_agregados = [u for u in usuario_ids if u in agregados]
+    if lista_agregados:
+        eventos.registrar(db, "comunidad.miembros_agregados", comunidad_id, usuario_ids=lista_agregados)
+    db.commit()
+    if agregados:
+        ranking.invalidar_comunidad(comunidad_id)
+
+    return {
+        "comunidad_id": comunidad_id,
+        "agregados": lista_agregados,
+        "ya_eran_miembros": [u for u in usuario_ids if u in existentes and u not in agregados],
+        "no_encontrados": [u for u in usuario_ids if u not in existentes],
+    }
+
+
 # --------------------------------------------------------------
 # Remover usuario de comunidad (DELETE)
 # --------------------------------------------------------------
 @router.delete("/{comunidad_id}/remover/{usuario_id}", status_code=status.HTTP_200_OK)
 def eliminar_usuario(comunidad_id: int, usuario_id: int, db: Session = Depends(get_db)):
-    comunidad = db.query(models.Comunidad).filter(models.Comunidad.id == comunidad_id).first()
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
-
-    if not comunidad:
+    if not membresias.comunidad_existe(db, comunidad_id):
         raise HTTPException(status_code=404, detail="Comunidad no encontrada")
-    if not usuario:
+    if not membresias.usuarios_existentes(db, [usuario_id]):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
-    if usuario not in comunidad.participantes:
+    if not membresias.quitar(db, comunidad_id, [usuario_id]):
         raise HTTPException(status_code=400, detail="El usuario no está en esta comunidad")
 
-    comunidad.participantes.remove(usuario)
+    eventos.registrar(db, "comunidad.miembros_quitados", comunidad_id, usuario_ids=[usuario_id])
     db.commit()
+    ranking.invalidar_comunidad(comunidad_id)
     return {"mensaje": f"Usuario {usuario_id} eliminado de la comunidad {comunidad_id}."}
 
 
+# --------------------------------------------------------------
+# Remover varios usuarios de una comunidad (POST)
+# --------------------------------------------------------------
+@router.post("/{comunidad_id}/remover", response_model=schemas.BajasComunidad)
+def eliminar_usuarios(comunidad_id: int, data: schemas.MiembrosComunidad, db: Session = Depends(get_db)):
+    if not membresias.comunidad_existe(db, comunidad_id):
+        raise HTTPException(status_code=404, detail="Comunidad no encontrada")
+
+    usuario_ids = membresias.sin_repetidos(data.usuario_ids)
+    eliminados = membresias.quitar(db, comunidad_id, usuario_ids)
+    lista_eliminados = [u for u in usuario_ids if u in eliminados]
+    if lista_eliminados:
+        eventos.registrar(db, "comunidad.miembros_quitados", comunidad_id, usuario_ids=lista_eliminados)
+    db.commit()
+    if eliminados:
+        ranking.invalidar_comunidad(comunidad_id)
+
+    return {
+        "comunidad_id": comunidad_id,
+        "eliminados": lista_eliminados,
+        "no_eran_miembros": [u for u in usuario_ids if u not in eliminados],
+    }
+
+
 # --------------------------------------------------------------
 # Eliminar comunidad por completo (DELETE)
 # --------------------------------------------------------------
@@ -107,6 +205,11 @@ def eliminar_comunidad(comunidad_id: int, db: Session = Depends(get_db)):
     if not comunidad:
         raise HTTPException(status_code=404, detail="Comunidad no encontrada")
 
+    # Las membresías se borran con una sentencia; así el ORM no carga la lista de participantes
+    membresias.vaciar(db, comunidad_id)
     db.delete(comunidad)
+    eventos.registrar(db, "comunidad.eliminada", comunidad_id)
     db.commit()
+    ranking.invalidar_comunidad(comunidad_id)
+    cache_respuestas.invalidar(cache_respuestas.COMUNIDADES)
     return {"mensaje": f"Comunidad {comunidad_id} eliminada correctamente."}
@@ -0,0 +1,94 @@
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app import eventos, schemas
+from app.database import SessionLocal, get_db
+from app.paginacion import CABECERA_CURSOR, LIMITE_MAXIMO
+from app.instrumentacion import RutaMedida
+
+router = APIRouter(
+    prefix="/eventos",
+    tags=["Eventos"],
+    route_class=RutaMedida
+)
+
+
+def _comprobar_desde(db: Session, desde: int):
+    # Si ya se purgaron eventos posteriores a `desde`, el consumidor perdería cambios sin saberlo
+    primero = eventos.primero(db)
+    if desde and primero is not None and desde < primero - 1:
+        raise HTTPException(
+            status_code=410,
+            detail=f"Los eventos anteriores a {primero} ya se purgaron; vuelve a sincronizar desde las tablas"
+        )
+
+
+def _serializar(fila) -> str:
+    id_, tipo, entidad_id, datos, creado = fila
+    return json.dumps(
+        {"id": id_, "tipo": tipo, "entidad_id": entidad_id, "datos": datos, "creado": creado.isoformat()},
+        ensure_ascii=False, separators=(",", ":")
+    )
+
+
+# ==========================================================
+#  FEED POR CURSOR
+# ==========================================================
+@router.get("", response_model=list[schemas.Evento])
+def listar_eventos(
+    response: Response,
+    desde: int = Query(0, ge=0, description="Último id ya procesado (valor de X-Siguiente-Cursor)"),
+    limit: int = Query(100, ge=1, le=LIMITE_MAXIMO),
+    tipo: Optional[str] = Query(None, description="Prefijo del tipo, p. ej. 'progreso.'"),
+    db: Session = Depends(get_db)
+):
+    """
+    Eventos con id mayor que `desde`, en orden. X-Siguiente-Cursor va siempre
+    y es el `desde` de la siguiente llamada; si es igual al actual, no hay
+    nada nuevo. Con `tipo`, una página puede venir vacía y aun así avanzar
+    el cursor. Los eventos de transacciones que aún no han terminado se
+    devuelven en una llamada posterior, nunca se saltan.
+    """
+    _comprobar_desde(db, desde)
+    filas, cursor, _ = eventos.leer(db, desde, limit, tipo)
+    response.headers[CABECERA_CURSOR] = str(cursor)
+    return filas
+
+
+# ==========================================================
+#  FLUJO SSE
+# ==========================================================
+def _comprobar_desde_en_sesion(desde: int):
+    db = SessionLocal()
+    try:
+        _comprobar_desde(db, desde)
+    finally:
+        db.close()
+
+
+@router.get("/stream")
+async def flujo_eventos(
+    desde: int = Query(0, ge=0, description="Último id ya procesado"),
+    tipo: Optional[str] = Query(None, description="Prefijo del tipo, p. ej. 'gamificacion.'"),
+    last_event_id: Optional[int] = Header(None, ge=0, description="Lo envía el navegador al reconectar")
+):
+    """
+    Server-Sent Events: cada evento llega como `id`, `event` (el tipo) y
+    `data` (JSON). Al reconectar, EventSource manda Last-Event-ID y el
+    flujo sigue donde se quedó.
+    """
+    if last_event_id is not None:
+        desde = last_event_id
+    # Sin get_db: su plaza del semáforo quedaría ocupada mientras dure el
+    # flujo. Cada lectura abre y cierra su propia sesión.
+    await asyncio.to_thread(_comprobar_desde_en_sesion, desde)
+    return StreamingResponse(
+        eventos.flujo(desde, tipo, _serializar),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,18 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Response, Query, WebSocket
+from sqlalchemy import update, select
 from sqlalchemy.orm import Session
-from app import models, schemas
-from app.database import get_db
+from app import consultas, models, schemas, contadores, trabajos_reportes, acumulador_puntos, respuestas_rapidas, eventos, en_vivo
+from app.ranking import ranking
+from app.database import SessionLocal, get_db
+from app.paginacion import Pagina, paginar_seleccion
+from app.instrumentacion import RutaMedida
 
 router = APIRouter(
     prefix="/gamificacion",
-    tags=["Gamificación"]
+    tags=["Gamificación"],
+    route_class=RutaMedida
 )
 
 # --------------------------------------------------------------
 # Crear registro de gamificación para un usuario (POST)
 # --------------------------------------------------------------
 @router.post("/", response_model=schemas.Gamificacion, status_code=status.HTTP_201_CREATED)
-def crear_gamificacion(data: schemas.GamificacionCreate, db: Session = Depends(get_db)):
+def crear_gamificacion(data: schemas.GamificacionCreate, tareas: BackgroundTasks, db: Session = Depends(get_db)):
     """
     Crea o asigna un sistema de puntos y logros a un usuario.
     """
@@ -34,7 +41,11 @@ def crear_gamificacion(data: schemas.GamificacionCreate, db: Session = Depends(g
     )
 
     db.add(nuevo)
+    contadores.incrementar(db, contadores.VERSION_RANKING)
+    eventos.registrar(db, "gamificacion.creada", data.usuario_id, badge=data.badge, puntos=data.puntos)
     db.commit()
+    ranking.actualizar(nuevo.usuario_id, nuevo.puntos or 0, categoria=usuario.categoria)
+    tareas.add_task(trabajos_reportes.regenerar_ranking)
     db.refresh(nuevo)
     return nuevo
 
@@ -43,8 +54,133 @@ def crear_gamificacion(data: schemas.GamificacionCreate, db: Session = Depends(g
 # Ver gamificación de todos los usuarios (GET)
 # --------------------------------------------------------------
 @router.get("/", response_model=list[schemas.Gamificacion])
-def obtener_gamificaciones(db: Session = Depends(get_db)):
-    return db.query(models.Gamificacion).all()
+def obtener_gamificaciones(
+    response: Response,
+    badge: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    gamificaciones, _ = paginar_seleccion(
+        db, consultas.gamificaciones(badge), models.Gamificacion.id, pagina, response,
+        escalares=consultas.ESCALARES
+    )
+    return respuestas_rapidas.responder(schemas.Gamificacion, gamificaciones, response)
+
+
+# --------------------------------------------------------------
+# Ranking en tiempo real (GET)
+# --------------------------------------------------------------
+def _con_nombres(db: Session, filas):
+    ids = [usuario_id for _, usuario_id, _ in filas]
+    nombres = dict(db.execute(
+        select(models.Usuario.id, models.Usuario.nombre).where(models.Usuario.id.in_(ids))
+    ).all()) if ids else {}
+    return [
+        schemas.PosicionRanking(posicion=posicion, usuario_id=usuario_id, nombre=nombres.get(usuario_id, ""), puntos=puntos)
+        for posicion, usuario_id, puntos in filas
+    ]
+
+
+def _validar_comunidad(db: Session, comunidad_id: Optional[int]):
+    if comunidad_id is not None and db.get(models.Comunidad, comunidad_id) is None:
+        raise HTTPException(status_code=404, detail="Comunidad no encontrada")
+
+
+@router.get("/ranking", response_model=list[schemas.PosicionRanking])
+def obtener_ranking(
+    n: int = Query(10, ge=1, le=100, description="Cuántas posiciones devolver"),
+    desde: int = Query(0, ge=0, description="Posiciones a saltar (0 = desde el primero)"),
+    comunidad_id: Optional[int] = None,
+    categoria: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Top-N actual, global o limitado a una comunidad o a una categoría de usuario.
+    """
+    _validar_comunidad(db, comunidad_id)
+    with ranking.consultar(db, comunidad_id, categoria) as clasificacion:
+        filas = clasificacion.tramo(desde, desde + n)
+    return _con_nombres(db, filas)
+
+
+@router.get("/ranking/{usuario_id}", response_model=schemas.RankingUsuario)
+def posicion_en_ranking(
+    usuario_id: int,
+    vecinos: int = Query(2, ge=0, le=50, description="Usuarios a mostrar por encima y por debajo"),
+    comunidad_id: Optional[int] = None,
+    categoria: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Posición de un usuario y los usuarios que tiene alrededor.
+    """
+    _validar_comunidad(db, comunidad_id)
+    with ranking.consultar(db, comunidad_id, categoria) as clasificacion:
+        posicion = clasificacion.posicion(usuario_id)
+        if posicion is None:
+            raise HTTPException(status_code=404, detail="El usuario no aparece en este ranking")
+        puntos = clasificacion.puntos(usuario_id)
+        total = len(clasificacion)
+        filas = clasificacion.tramo(posicion - 1 - vecinos, posicion + vecinos)
+
+    return schemas.RankingUsuario(
+        usuario_id=usuario_id,
+        posicion=posicion,
+        puntos=puntos,
+        total=total,
+        vecinos=_con_nombres(db, filas)
+    )
+
+
+# --------------------------------------------------------------
+# Ranking en directo (WebSocket)
+# --------------------------------------------------------------
+def _top_inicial(comunidad_id: Optional[int], n: int):
+    """
+    (primer mensaje de /en-vivo, cursor del outbox tomado antes de leerlo),
+    o (None, None) si la comunidad no existe.
+    """
+    db = SessionLocal()
+    try:
+        if comunidad_id is not None and db.get(models.Comunidad, comunidad_id) is None:
+            return None, None
+        # Antes del top: lo que se confirme entre medias llega después como cambio
+        cursor = eventos.horizonte(db)
+        with ranking.consultar(db, comunidad_id) as clasificacion:
+            filas = clasificacion.tramo(0, n)
+        return {"tipo": "ranking", "top": [posicion.model_dump() for posicion in _con_nombres(db, filas)]}, cursor
+    finally:
+        db.close()
+
+
+@router.websocket("/en-vivo")
+async def ranking_en_vivo(
+    websocket: WebSocket,
+    comunidad_id: Optional[int] = None,
+    n: int = Query(10, ge=1, le=100, description="Posiciones del primer mensaje")
+):
+    """
+    Primero manda el top-N (`{"tipo": "ranking", "top": [...]}`) y después,
+    como mucho una vez por tick, `{"tipo": "cambios", "puntos": [...],
+    "progreso": [...]}` con los usuarios del canal que cambiaron (ver
+    app/en_vivo.py).
+    """
+    try:
+        cliente = en_vivo.hub.suscribir(comunidad_id)
+    except en_vivo.HubLleno:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    try:
+        # Suscrito antes de leer el top: lo que cambie mientras tanto queda en su cola
+        inicial, cursor = await asyncio.to_thread(_top_inicial, comunidad_id, n)
+        if inicial is None:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Comunidad no encontrada")
+            return
+        en_vivo.hub.partir_de(cursor)
+        await websocket.accept()
+        await en_vivo.atender(websocket, cliente, inicial)
+    finally:
+        en_vivo.hub.desuscribir(cliente)
 
 
 # --------------------------------------------------------------
@@ -52,7 +188,7 @@ def obtener_gamificaciones(db: Session = Depends(get_db)):
 # --------------------------------------------------------------
 @router.get("/{usuario_id}", response_model=schemas.Gamificacion)
 def obtener_gamificacion(usuario_id: int, db: Session = Depends(get_db)):
-    gamificacion = db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).first()
+    gamificacion = db.execute(consultas.gamificacion(usuario_id)).scalars().first()
     if not gamificacion:
         raise HTTPException(status_code=404, detail="Este usuario no tiene gamificación registrada")
     return gamificacion
@@ -63,27 +199,56 @@ def obtener_gamificacion(usuario_id: int, db: Session = Depends(get_db)):
 # --------------------------------------------------------------
 @router.patch("/{usuario_id}/sumar-puntos", response_model=schemas.Gamificacion)
 def sumar_puntos(usuario_id: int, puntos: int, db: Session = Depends(get_db)):
-    gamificacion = db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).first()
+    if acumulador_puntos.ACTIVO:
+        # Escritura diferida: el incremento se vuelca en el próximo lote
+        gamificacion = db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).first()
+        if not gamificacion:
+            raise HTTPException(status_code=404, detail="Gamificación no encontrada")
+
+        # Con el lock del ranking: una reconstrucción ve estos puntos en el
+        # acumulador o como cambio posterior, nunca en los dos ni en ninguno
+        with ranking.lock:
+            acumulador_puntos.acumulador.sumar(usuario_id, puntos)
+            ranking.sumar(usuario_id, puntos)
+        respuesta = schemas.Gamificacion.model_validate(gamificacion)
+        respuesta.puntos += acumulador_puntos.acumulador.pendiente(usuario_id)
+        return respuesta
+
+    # Incremento atómico en la base de datos: sin carreras entre peticiones
+    # concurrentes y sin leer la fila antes ni refrescarla después.
+    gamificacion = db.execute(
+        update(models.Gamificacion)
+        .where(models.Gamificacion.usuario_id == usuario_id)
+        .values(puntos=models.Gamificacion.puntos + puntos)
+        .returning(models.Gamificacion)
+    ).scalar_one_or_none()
     if not gamificacion:
         raise HTTPException(status_code=404, detail="Gamificación no encontrada")
 
-    gamificacion.puntos += puntos
+    respuesta = schemas.Gamificacion.model_validate(gamificacion)
+    eventos.registrar(db, "gamificacion.puntos", usuario_id, sumados=puntos)
     db.commit()
-    db.refresh(gamificacion)
-    return gamificacion
+    ranking.sumar(usuario_id, puntos, total=respuesta.puntos)
+    # La versión del PDF se sube en segundo plano, una vez por muchas sumas
+    # (la tarea también encola el PDF nuevo)
+    contadores.subir_despues(contadores.VERSION_RANKING)
+    return respuesta
 
 
 # --------------------------------------------------------------
 # Cambiar badge (PATCH)
 # --------------------------------------------------------------
 @router.patch("/{usuario_id}/cambiar-badge", response_model=schemas.Gamificacion)
-def cambiar_badge(usuario_id: int, badge: str, db: Session = Depends(get_db)):
+def cambiar_badge(usuario_id: int, badge: str, tareas: BackgroundTasks, db: Session = Depends(get_db)):
     gamificacion = db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).first()
     if not gamificacion:
         raise HTTPException(status_code=404, detail="Gamificación no encontrada")
 
     gamificacion.badge = badge
+    contadores.incrementar(db, contadores.VERSION_RANKING)
+    eventos.registrar(db, "gamificacion.badge", usuario_id, badge=badge)
     db.commit()
+    tareas.add_task(trabajos_reportes.regenerar_ranking)
     db.refresh(gamificacion)
     return gamificacion
 
@@ -92,11 +257,15 @@ def cambiar_badge(usuario_id: int, badge: str, db: Session = Depends(get_db)):
 # Eliminar registro de gamificación (DELETE)
 # --------------------------------------------------------------
 @router.delete("/{usuario_id}", status_code=status.HTTP_200_OK)
-def eliminar_gamificacion(usuario_id: int, db: Session = Depends(get_db)):
+def eliminar_gamificacion(usuario_id: int, tareas: BackgroundTasks, db: Session = Depends(get_db)):
     gamificacion = db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).first()
     if not gamificacion:
         raise HTTPException(status_code=404, detail="Gamificación no encontrada")
 
     db.delete(gamificacion)
+    contadores.incrementar(db, contadores.VERSION_RANKING)
+    eventos.registrar(db, "gamificacion.eliminada", usuario_id)
     db.commit()
+    ranking.quitar(usuario_id)
+    tareas.add_task(trabajos_reportes.regenerar_ranking)
     return {"mensaje": f"Registro de gamificación del usuario {usuario_id} eliminado correctamente."}
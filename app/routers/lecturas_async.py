@@ -0,0 +1,138 @@
+"""
+Archivo: lecturas_async.py
+Descripción: Versiones asíncronas (AsyncSession) de los endpoints de lectura.
+Solo se registran con DB_MODO=async; en ese caso se incluyen antes que los
+routers síncronos y atienden las mismas rutas.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import consultas, models, schemas, cache_respuestas, respuestas_rapidas
+from app.database import get_async_db
+from app.paginacion import Pagina, paginar_async
+from app.instrumentacion import RutaMedida
+
+# Las rutas ya aparecen en la documentación a través de los routers síncronos.
+# Los IDs usan el convertidor `:int` para no tapar rutas como /usuarios/vista.
+router = APIRouter(include_in_schema=False, route_class=RutaMedida)
+
+
+async def _obtener(db: AsyncSession, consulta, detalle: str):
+    objeto = (await db.execute(consulta)).scalars().first()
+    if not objeto:
+        raise HTTPException(status_code=404, detail=detalle)
+    return objeto
+
+
+# ==========================================================
+#  USUARIOS
+# ==========================================================
+@router.get("/usuarios/", response_model=list[schemas.Usuario])
+async def obtener_usuarios(
+    response: Response,
+    categoria: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    usuarios, _ = await paginar_async(
+        db, consultas.usuarios(categoria=categoria), models.Usuario.id, pagina, response,
+        escalares=consultas.ESCALARES
+    )
+    return respuestas_rapidas.responder(schemas.Usuario, usuarios, response)
+
+
+@router.get("/usuarios/{usuario_id:int}", response_model=schemas.Usuario)
+async def obtener_usuario(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _obtener(db, consultas.usuario(usuario_id), "Usuario no encontrado")
+
+
+@router.get("/usuarios/buscar/{nombre}", response_model=schemas.Usuario)
+async def buscar_usuario_por_nombre(nombre: str, db: AsyncSession = Depends(get_async_db)):
+    return await _obtener(
+        db, consultas.usuario_activo_por_nombre(nombre), "No existe un usuario activo con ese nombre"
+    )
+
+
+# ==========================================================
+#  MICRORRETOS
+# ==========================================================
+@router.get("/microrretos/", response_model=list[schemas.MicroReto])
+async def listar_microrretos(
+    request: Request,
+    categoria: Optional[str] = None,
+    dificultad: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def consultar(response: Response):
+        retos, _ = await paginar_async(
+            db, consultas.microrretos(categoria, dificultad), models.MicroReto.id, pagina, response,
+            escalares=consultas.ESCALARES
+        )
+        return respuestas_rapidas.cuerpo(schemas.MicroReto, retos)
+
+    return await cache_respuestas.responder_async(
+        request, cache_respuestas.MICRORRETOS, list[schemas.MicroReto], consultar
+    )
+
+
+@router.get("/microrretos/{microrreto_id:int}", response_model=schemas.MicroReto)
+async def obtener_microrreto(microrreto_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def consultar(response: Response):
+        return await _obtener(db, consultas.microrreto(microrreto_id), "MicroReto no encontrado")
+
+    return await cache_respuestas.responder_async(request, cache_respuestas.MICRORRETOS, schemas.MicroReto, consultar)
+
+
+# ==========================================================
+#  GAMIFICACIÓN
+# ==========================================================
+@router.get("/gamificacion/", response_model=list[schemas.Gamificacion])
+async def obtener_gamificaciones(
+    response: Response,
+    badge: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    gamificaciones, _ = await paginar_async(
+        db, consultas.gamificaciones(badge), models.Gamificacion.id, pagina, response,
+        escalares=consultas.ESCALARES
+    )
+    return respuestas_rapidas.responder(schemas.Gamificacion, gamificaciones, response)
+
+
+@router.get("/gamificacion/{usuario_id:int}", response_model=schemas.Gamificacion)
+async def obtener_gamificacion(usuario_id: int, db: AsyncSession = Depends(get_async_db)):
+    return await _obtener(
+        db, consultas.gamificacion(usuario_id), "Este usuario no tiene gamificación registrada"
+    )
+
+
+# ==========================================================
+#  COMUNIDADES
+# ==========================================================
+@router.get("/comunidad/", response_model=list[schemas.Comunidad])
+async def listar_comunidades(
+    request: Request,
+    categoria: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: AsyncSession = Depends(get_async_db)
+):
+    async def consultar(response: Response):
+        comunidades, _ = await paginar_async(
+            db, consultas.comunidades(categoria), models.Comunidad.id, pagina, response,
+            escalares=consultas.ESCALARES
+        )
+        return respuestas_rapidas.cuerpo(schemas.Comunidad, comunidades)
+
+    return await cache_respuestas.responder_async(
+        request, cache_respuestas.COMUNIDADES, list[schemas.Comunidad], consultar
+    )
+
+
+@router.get("/comunidad/{comunidad_id:int}", response_model=schemas.Comunidad)
+async def obtener_comunidad(comunidad_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    async def consultar(response: Response):
+        return await _obtener(db, consultas.comunidad(comunidad_id), "Comunidad no encontrada")
+
+    return await cache_respuestas.responder_async(request, cache_respuestas.COMUNIDADES, schemas.Comunidad, consultar)
@@ -0,0 +1,47 @@
+import os
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app import metricas, instrumentacion
+from app.database import engine, async_engine
+from app.instrumentacion import RutaMedida
+
+router = APIRouter(
+    prefix="/metricas",
+    tags=["Métricas"],
+    route_class=RutaMedida
+)
+
+# Prometheus busca /metrics en la raíz
+prometheus = APIRouter(tags=["Métricas"], route_class=RutaMedida)
+
+# --------------------------------------------------------------
+# Estado del pool de conexiones de este worker (GET)
+# --------------------------------------------------------------
+@router.get("/pool")
+def metricas_pool():
+    """
+    Conexiones en uso y libres, overflow, tiempo de espera por conexión e
+    invalidaciones. Cada worker de gunicorn tiene su propio pool.
+    """
+    datos = {"pid": os.getpid(), "sync": metricas.resumen(engine)}
+    if async_engine is not None:
+        datos["async"] = metricas.resumen(async_engine.sync_engine)
+    return datos
+
+
+# --------------------------------------------------------------
+# Métricas de este worker en formato Prometheus (GET)
+# --------------------------------------------------------------
+@prometheus.get("/metrics", response_class=PlainTextResponse)
+def metricas_prometheus():
+    """
+    Latencia por ruta, consultas y tiempo en base de datos por ruta,
+    consultas lentas y estado del pool. Cada worker expone las suyas.
+    """
+    pools = {"sync": metricas.resumen(engine)}
+    if async_engine is not None:
+        pools["async"] = metricas.resumen(async_engine.sync_engine)
+    return PlainTextResponse(
+        instrumentacion.registro.texto(pools),
+        media_type="text/plain; version=0.0.4"
+    )
@@ -1,11 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Request
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app import models, schemas
+from app import consultas, models, schemas, contadores, importacion, cache_respuestas, respuestas_rapidas, busqueda
 from app.database import get_db
+from app.paginacion import Pagina, paginar_seleccion
+from app.recomendador import recomendador
+from app.instrumentacion import RutaMedida
 
 router = APIRouter(
     prefix="/microrretos",
-    tags=["MicroRetos"]
+    tags=["MicroRetos"],
+    route_class=RutaMedida
 )
 
 # --------------------------------------------------------------
@@ -24,34 +30,98 @@ def crear_microrreto(reto: schemas.MicroRetoCreate, db: Session = Depends(get_db
     )
 
     db.add(nuevo_reto)
+    contadores.incrementar(db, contadores.TOTAL_RETOS)
     db.commit()
     db.refresh(nuevo_reto)
+    cache_respuestas.invalidar(cache_respuestas.MICRORRETOS)
+    busqueda.invalidar_retos()
+    recomendador.agregar_reto(nuevo_reto.id, nuevo_reto.categoria, nuevo_reto.dificultad)
     return nuevo_reto
 
 
+# --------------------------------------------------------------
+# Carga masiva de Microrretos (POST)
+# --------------------------------------------------------------
+@router.post("/importar", summary="Carga masiva de microrretos (arreglo JSON, NDJSON o CSV)")
+async def importar_microrretos(request: Request, db: Session = Depends(get_db)):
+    """
+    Inserta los Microrretos válidos en lotes y devuelve los errores por fila.
+    """
+    def insertar_lote(db: Session, lote, resultado):
+        filas = [reto.model_dump() for _, reto in lote]
+        db.execute(insert(models.MicroReto), filas)
+        contadores.incrementar(db, contadores.TOTAL_RETOS, len(filas))
+        db.commit()
+        resultado.insertados += len(filas)
+
+    try:
+        return await importacion.importar(request, db, schemas.MicroRetoCreate, insertar_lote)
+    finally:
+        # También si falla a medias: los lotes anteriores ya están confirmados
+        cache_respuestas.invalidar(cache_respuestas.MICRORRETOS)
+        busqueda.invalidar_retos()
+        recomendador.invalidar()
+
+
 # --------------------------------------------------------------
 # Listar Microrretos (GET)
 # --------------------------------------------------------------
 @router.get("/", response_model=list[schemas.MicroReto])
-def listar_microrretos(db: Session = Depends(get_db)):
+def listar_microrretos(
+    request: Request,
+    categoria: Optional[str] = None,
+    dificultad: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    """
+    Devuelve los Microrretos página por página, con filtros opcionales
+    por categoría y dificultad. La respuesta se sirve desde la caché.
+    """
+    def consultar(response: Response):
+        retos, _ = paginar_seleccion(
+            db, consultas.microrretos(categoria, dificultad), models.MicroReto.id, pagina, response,
+            escalares=consultas.ESCALARES
+        )
+        return respuestas_rapidas.cuerpo(schemas.MicroReto, retos)
+
+    return cache_respuestas.responder(request, cache_respuestas.MICRORRETOS, list[schemas.MicroReto], consultar)
+
+
+# --------------------------------------------------------------
+# Siguiente Microrreto recomendado para un usuario (GET)
+# --------------------------------------------------------------
+@router.get("/siguiente/{usuario_id}", response_model=schemas.MicroReto)
+def siguiente_microrreto(usuario_id: int, db: Session = Depends(get_db)):
     """
-    Devuelve la lista de todos los Microrretos.
+    Un reto de la categoría del usuario que aún no ha intentado, con la
+    dificultad que corresponde a su tasa de acierto reciente.
     """
-    return db.query(models.MicroReto).all()
+    usuario = db.get(models.Usuario, usuario_id)
+    if not usuario or not usuario.activo:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    reto_id = recomendador.siguiente(db, usuario_id, usuario.categoria)
+    if reto_id is None:
+        raise HTTPException(status_code=404, detail="No quedan retos pendientes para este usuario")
+    return db.get(models.MicroReto, reto_id)
 
 
 # --------------------------------------------------------------
 # Obtener Microrreto por ID (GET)
 # --------------------------------------------------------------
 @router.get("/{microrreto_id}", response_model=schemas.MicroReto)
-def obtener_microrreto(microrreto_id: int, db: Session = Depends(get_db)):
+def obtener_microrreto(microrreto_id: int, request: Request, db: Session = Depends(get_db)):
     """
-    Devuelve un Microrreto específico.
+    Devuelve un Microrreto específico (desde la caché si está).
     """
-    reto = db.query(models.MicroReto).filter(models.MicroReto.id == microrreto_id).first()
-    if not reto:
-        raise HTTPException(status_code=404, detail="MicroReto no encontrado")
-    return reto
+    def consultar(response: Response):
+        reto = db.execute(consultas.microrreto(microrreto_id)).scalars().first()
+        if not reto:
+            raise HTTPException(status_code=404, detail="MicroReto no encontrado")
+        return reto
+
+    return cache_respuestas.responder(request, cache_respuestas.MICRORRETOS, schemas.MicroReto, consultar)
 
 
 # --------------------------------------------------------------
@@ -73,6 +143,9 @@ def actualizar_microrreto(microrreto_id: int, datos: schemas.MicroRetoCreate, db
 
     db.commit()
     db.refresh(reto)
+    cache_respuestas.invalidar(cache_respuestas.MICRORRETOS)
+    busqueda.invalidar_retos()
+    recomendador.agregar_reto(reto.id, reto.categoria, reto.dificultad)
     return reto
 
 
@@ -89,5 +162,9 @@ def eliminar_microrreto(microrreto_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="MicroReto no encontrado")
 
     db.delete(reto)
+    contadores.incrementar(db, contadores.TOTAL_RETOS, -1)
     db.commit()
+    cache_respuestas.invalidar(cache_respuestas.MICRORRETOS)
+    busqueda.invalidar_retos()
+    recomendador.quitar_reto(microrreto_id)
     return {"mensaje": f"MicroReto con ID {microrreto_id} eliminado correctamente."}
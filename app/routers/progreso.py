@@ -1,40 +1,73 @@
-from fastapi import APIRouter, Request, Depends, Form
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app import models
+from typing import Optional
+from fastapi import APIRouter, Request, Depends, Form, Response
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload, load_only, raiseload
+from app import models, schemas, contadores, importacion, rachas, plantillas, eventos
 from app.database import get_db
+from app.paginacion import Pagina, paginar
+from app.recomendador import recomendador
+from app.instrumentacion import RutaMedida
 from datetime import datetime
 
-router = APIRouter(prefix="/progreso", tags=["Progreso"])
-templates = Jinja2Templates(directory="app/templates")
+router = APIRouter(prefix="/progreso", tags=["Progreso"], route_class=RutaMedida)
 
 # ==========================================================
 #  Vista HTML del progreso
 # ==========================================================
 @router.get("/vista")
-def ver_progreso(request: Request, db: Session = Depends(get_db)):
-    datos = db.query(models.Progreso).all()
-    return templates.TemplateResponse(
+def ver_progreso(request: Request, pagina: Pagina = Depends(), db: Session = Depends(get_db)):
+    # Usuario y reto llegan en la misma consulta (JOIN) y solo con las columnas
+    # que pinta la plantilla; raiseload hace fallar cualquier carga perezosa
+    # que se cuele en la plantilla en vez de lanzar una consulta por fila.
+    consulta = db.query(models.Progreso).options(
+        load_only(models.Progreso.completado, models.Progreso.fecha),
+        joinedload(models.Progreso.usuario).load_only(models.Usuario.nombre),
+        joinedload(models.Progreso.reto).load_only(models.MicroReto.contenido),
+        raiseload("*")
+    )
+    datos, siguiente = paginar(consulta, models.Progreso.id, pagina)
+    return plantillas.templates.TemplateResponse(
         "progreso.html",
-        {"request": request, "progresos": datos}
+        {"request": request, "progresos": datos, "siguiente": siguiente, "limit": pagina.limit}
     )
 
 # ==========================================================
 #  Formulario HTML
 # ==========================================================
 @router.get("/nuevo")
-def nuevo_progreso(request: Request, db: Session = Depends(get_db)):
-    usuarios = db.query(models.Usuario).all()
-    retos = db.query(models.MicroReto).all()
-
-    return templates.TemplateResponse(
-        "crear_progreso.html",
-        {
-            "request": request,
-            "usuarios": usuarios,
-            "retos": retos
-        }
-    )
+def nuevo_progreso(request: Request):
+    # Las opciones de usuario y reto se cargan bajo demanda desde /progreso/opciones/*
+    return plantillas.pagina(request, "crear_progreso.html")
+
+# ==========================================================
+#  Búsqueda incremental para los selectores del formulario
+# ==========================================================
+@router.get("/opciones/usuarios")
+def opciones_usuarios(
+    response: Response,
+    q: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    consulta = db.query(models.Usuario.id, models.Usuario.nombre).filter(models.Usuario.activo == True)
+    if q:
+        consulta = consulta.filter(models.Usuario.nombre.ilike(f"{q}%"))
+    filas, _ = paginar(consulta, models.Usuario.id, pagina, response)
+    return [{"id": fila.id, "texto": fila.nombre} for fila in filas]
+
+
+@router.get("/opciones/retos")
+def opciones_retos(
+    response: Response,
+    q: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    consulta = db.query(models.MicroReto.id, models.MicroReto.contenido)
+    if q:
+        consulta = consulta.filter(models.MicroReto.contenido.ilike(f"%{q}%"))
+    filas, _ = paginar(consulta, models.MicroReto.id, pagina, response)
+    return [{"id": fila.id, "texto": fila.contenido} for fila in filas]
 
 # ==========================================================
 #  Guardar progreso desde HTML
@@ -54,6 +87,63 @@ def crear_progreso_html(
     )
 
     db.add(nuevo)
+    db.flush()
+    contadores.incrementar(db, contadores.TOTAL_PROGRESOS)
+    if completado:
+        rachas.registrar_actividad(db, usuario_id, nuevo.fecha)
+    eventos.registrar(
+        db, "progreso.creado", nuevo.id,
+        usuario_id=usuario_id, reto_id=reto_id, completado=completado, fecha=nuevo.fecha
+    )
     db.commit()
+    recomendador.registrar(usuario_id, reto_id, completado)
 
     return {"mensaje": "Progreso registrado correctamente"}
+
+
+# ==========================================================
+#  Carga masiva de progreso (JSON, NDJSON o CSV)
+# ==========================================================
+@router.post("/importar", summary="Carga masiva de progreso (arreglo JSON, NDJSON o CSV)")
+async def importar_progreso(request: Request, db: Session = Depends(get_db)):
+    """
+    Inserta los registros válidos en lotes. Se rechazan las filas cuyo
+    usuario o reto no existe; sin fecha se usa la de la importación.
+    """
+    ahora = datetime.utcnow()
+
+    def insertar_lote(db: Session, lote, resultado):
+        usuarios = importacion.valores_existentes(db, models.Usuario.id, {p.usuario_id for _, p in lote})
+        retos = importacion.valores_existentes(db, models.MicroReto.id, {p.reto_id for _, p in lote})
+
+        filas = []
+        for numero, progreso in lote:
+            if progreso.usuario_id not in usuarios:
+                resultado.error(numero, f"Usuario {progreso.usuario_id} no encontrado")
+                continue
+            if progreso.reto_id not in retos:
+                resultado.error(numero, f"MicroReto {progreso.reto_id} no encontrado")
+                continue
+            fila = progreso.model_dump(exclude_unset=True)
+            fila.setdefault("completado", False)
+            fila.setdefault("fecha", ahora)
+            filas.append(fila)
+
+        if filas:
+            ids = db.execute(
+                insert(models.Progreso).returning(models.Progreso.id, sort_by_parameter_order=True), filas
+            ).scalars().all()
+            contadores.incrementar(db, contadores.TOTAL_PROGRESOS, len(filas))
+            rachas.registrar_actividades(
+                db, [(fila["usuario_id"], fila["fecha"]) for fila in filas if fila["completado"]]
+            )
+            eventos.registrar_varios(db, "progreso.creado", [
+                (id_, {campo: fila[campo] for campo in ("usuario_id", "reto_id", "completado", "fecha")})
+                for id_, fila in zip(ids, filas)
+            ])
+            db.commit()
+            for fila in filas:
+                recomendador.registrar(fila["usuario_id"], fila["reto_id"], fila["completado"])
+            resultado.insertados += len(filas)
+
+    return await importacion.importar(request, db, schemas.ProgresoCreate, insertar_lote)
@@ -1,101 +1,222 @@
+import asyncio
+import os
+from datetime import date
+from typing import Optional
+import anyio
 from fastapi import APIRouter, Depends, Request, HTTPException
-from fastapi.templating import Jinja2Templates
+from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.database import get_db
-from app import models
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from fastapi.responses import FileResponse
-import os
+from app.database import SessionLocal, get_db
+from app import contadores, estadisticas, models, plantillas, schemas, trabajos_reportes
+from fastapi.responses import FileResponse, JSONResponse, Response
+from app.instrumentacion import RutaMedida
 
 router = APIRouter(
     prefix="/reportes",
-    tags=["Reportes"]
+    tags=["Reportes"],
+    route_class=RutaMedida
 )
 
-templates = Jinja2Templates(directory="app/templates")
-
 # ==========================================================
 #  DASHBOARD PRINCIPAL
 # ==========================================================
 @router.get("/")
 def dashboard(request: Request, db: Session = Depends(get_db)):
 
-    total_usuarios = db.query(func.count(models.Usuario.id)).scalar()
-    total_progresos = db.query(func.count(models.Progreso.id)).scalar()
-    total_retos = db.query(func.count(models.MicroReto.id)).scalar()
+    # Totales mantenidos por los endpoints de creación/eliminación
+    totales = contadores.leer_varios(db, contadores.TOTALES)
+    faltantes = [nombre for nombre in contadores.TOTALES if nombre not in totales]
+    if faltantes:
+        totales.update(contadores.reconciliar_totales(db, faltantes))
 
-    return templates.TemplateResponse(
+    return plantillas.templates.TemplateResponse(
         "dashboard.html",
         {
             "request": request,
-            "usuarios": total_usuarios,
-            "progresos": total_progresos,
-            "retos": total_retos
+            "usuarios": totales[contadores.TOTAL_USUARIOS],
+            "progresos": totales[contadores.TOTAL_PROGRESOS],
+            "retos": totales[contadores.TOTAL_RETOS]
         }
     )
 
 # ==========================================================
 #  GENERAR Y DESCARGAR PDF DE RANKING (MULTIMEDIA ✅)
 # ==========================================================
-@router.get("/ranking", summary="Genera un PDF con el ranking de usuarios por puntos")
-def generar_reporte_ranking(db: Session = Depends(get_db)):
+# Los PDF se generan en el pool de trabajos_reportes, nunca en el worker.
+ESPERA_S = float(os.getenv("REPORTES_ESPERA_S", "5"))
+
+
+def _encolar(db: Session, tipo: str, parametros: dict):
+    try:
+        return trabajos_reportes.cola.encolar(db, tipo, parametros)
+    except trabajos_reportes.ColaLlena:
+        raise HTTPException(
+            status_code=503,
+            detail="Hay demasiados reportes en cola, inténtalo más tarde",
+            headers={"Retry-After": "30"}
+        )
+
+
+def _en_sesion(funcion, *argumentos):
+    db = SessionLocal()
+    try:
+        return funcion(db, *argumentos)
+    finally:
+        db.close()
+
+
+def _datos_trabajo(trabajo):
+    terminado = trabajo.estado == trabajos_reportes.TERMINADO
+    return schemas.TrabajoReporte(
+        id=trabajo.id,
+        tipo=trabajo.tipo,
+        parametros=trabajo.parametros,
+        estado=trabajo.estado,
+        creado=trabajo.creado,
+        terminado=trabajo.terminado,
+        error=trabajo.error,
+        descarga=f"/reportes/trabajos/{trabajo.id}/pdf" if terminado else None
+    )
 
-    ranking = db.query(models.Gamificacion).order_by(
-        models.Gamificacion.puntos.desc()
-    ).all()
 
-    if not ranking:
-        raise HTTPException(status_code=404, detail="No hay datos para generar el ranking")
+def _en_espera(trabajo):
+    # 202 con el trabajo: el cliente consulta Location hasta que termine
+    return JSONResponse(
+        status_code=202,
+        content=jsonable_encoder(_datos_trabajo(trabajo)),
+        headers={"Location": f"/reportes/trabajos/{trabajo.id}"}
+    )
+
+
+def _descargar(trabajo, nombre: str):
+    estado = trabajo.estado
+    if estado in (trabajos_reportes.PENDIENTE, trabajos_reportes.EN_CURSO):
+        raise HTTPException(status_code=409, detail="El reporte todavía se está generando")
+    if estado == trabajos_reportes.SIN_DATOS:
+        raise HTTPException(status_code=404, detail="No hay datos para generar el reporte")
+    if estado == trabajos_reportes.ERROR:
+        raise HTTPException(status_code=500, detail="Falló la generación del reporte")
+    if not os.path.exists(trabajo.ruta):
+        raise HTTPException(status_code=404, detail="El reporte ya no está disponible")
+
+    # El ID incluye la versión de los datos: sirve como ETag
+    trabajos_reportes.cola.usado(trabajo.ruta)
+    return FileResponse(
+        path=trabajo.ruta,
+        filename=nombre,
+        media_type="application/pdf",
+        headers={"ETag": f'"{trabajo.id}"', "Cache-Control": "no-cache"}
+    )
 
-    carpeta = "app/static/reportes"
-    os.makedirs(carpeta, exist_ok=True)
 
-    archivo = "ranking_usuarios.pdf"
-    ruta = os.path.join(carpeta, archivo)
+@router.get("/ranking", summary="Genera un PDF con el ranking de usuarios por puntos")
+async def generar_reporte_ranking(request: Request):
+    """
+    Devuelve el PDF si se genera en menos de REPORTES_ESPERA_S; si no,
+    un 202 con el trabajo para descargarlo después.
+    """
+    # Sin get_db: su plaza del semáforo quedaría ocupada durante la espera.
+    # Cada consulta usa una sesión corta que se cierra antes de esperar.
+    trabajo_id = await anyio.to_thread.run_sync(_en_sesion, trabajos_reportes.cola.identificador, "ranking", {})
+    if request.headers.get("if-none-match") == f'"{trabajo_id}"':
+        return Response(status_code=304, headers={"ETag": f'"{trabajo_id}"'})
+
+    trabajo = await anyio.to_thread.run_sync(_en_sesion, _encolar, "ranking", {})
+    if trabajo.futuro is not None and not trabajo.futuro.done():
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(trabajo.futuro)), ESPERA_S)
+        except asyncio.TimeoutError:
+            return _en_espera(trabajo)
+        except Exception:
+            pass  # queda registrado en el trabajo
+    return _descargar(trabajo, "ranking_usuarios.pdf")
 
-    pdf = canvas.Canvas(ruta, pagesize=letter)
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawString(150, 750, "Ranking de Usuarios por Puntos")
 
-    pdf.setFont("Helvetica", 12)
-    y = 700
+# ==========================================================
+#  TRABAJOS DE REPORTES
+# ==========================================================
+@router.post("/trabajos", response_model=schemas.TrabajoReporte, status_code=202,
+             summary="Encola la generación de un reporte PDF")
+def crear_trabajo(data: schemas.TrabajoReporteCreate, response: Response, db: Session = Depends(get_db)):
+    """
+    Si ya hay un trabajo con los mismos parámetros y datos, devuelve ese.
+    """
+    parametros = data.model_dump(exclude={"tipo"}, exclude_none=True)
+    trabajo = _encolar(db, data.tipo, parametros)
+    response.headers["Location"] = f"/reportes/trabajos/{trabajo.id}"
+    return _datos_trabajo(trabajo)
+
+
+@router.get("/trabajos/{trabajo_id}", response_model=schemas.TrabajoReporte,
+            summary="Estado de un trabajo de reporte")
+def ver_trabajo(trabajo_id: str):
+    trabajo = trabajos_reportes.cola.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _datos_trabajo(trabajo)
+
+
+@router.get("/trabajos/{trabajo_id}/pdf", summary="Descarga el PDF de un trabajo terminado")
+def descargar_trabajo(trabajo_id: str):
+    trabajo = trabajos_reportes.cola.obtener(trabajo_id)
+    if trabajo is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return _descargar(trabajo, f"{trabajo.tipo}.pdf")
 
-    pdf.drawString(50, y, "Puesto")
-    pdf.drawString(120, y, "Usuario")
-    pdf.drawString(300, y, "Puntos")
-    pdf.drawString(400, y, "Badge")
+# ==========================================================
+#  ESTADÍSTICAS DE PROGRESO
+# ==========================================================
+class Ventana:
+    """
+    Parámetros ?desde=&hasta= (fechas ISO). Por defecto, los últimos
+    estadisticas.DIAS_POR_DEFECTO días.
+    """
+
+    def __init__(self, desde: Optional[date] = None, hasta: Optional[date] = None):
+        try:
+            self.desde, self.hasta = estadisticas.ventana(desde, hasta)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+
+@router.get("/estadisticas/categorias", summary="Tasa de finalización por categoría de reto")
+def estadisticas_categorias(ventana: Ventana = Depends(), db: Session = Depends(get_db)):
+    return estadisticas.en_cache(
+        db, "categorias", ventana.desde, ventana.hasta,
+        lambda: estadisticas.tasa_por(db, models.MicroReto.categoria, ventana.desde, ventana.hasta)
+    )
 
-    y -= 30
-    puesto = 1
 
-    for item in ranking:
-        usuario = db.query(models.Usuario).filter(
-            models.Usuario.id == item.usuario_id
-        ).first()
+@router.get("/estadisticas/dificultad", summary="Tasa de finalización por dificultad de reto")
+def estadisticas_dificultad(ventana: Ventana = Depends(), db: Session = Depends(get_db)):
+    return estadisticas.en_cache(
+        db, "dificultad", ventana.desde, ventana.hasta,
+        lambda: estadisticas.tasa_por(db, models.MicroReto.dificultad, ventana.desde, ventana.hasta)
+    )
 
-        if not usuario:
-            continue
 
-        pdf.drawString(50, y, str(puesto))
-        pdf.drawString(120, y, usuario.nombre)
-        pdf.drawString(300, y, str(item.puntos))
-        pdf.drawString(400, y, item.badge)
+@router.get("/estadisticas/activos-diarios", summary="Usuarios activos por día")
+def estadisticas_activos_diarios(ventana: Ventana = Depends(), db: Session = Depends(get_db)):
+    return estadisticas.en_cache(
+        db, "activos-diarios", ventana.desde, ventana.hasta,
+        lambda: estadisticas.activos_diarios(db, ventana.desde, ventana.hasta)
+    )
 
-        puesto += 1
-        y -= 25
 
-        if y < 50:
-            pdf.showPage()
-            y = 750
+@router.get("/estadisticas/usuarios", summary="Distribución de retos completados por usuario")
+def estadisticas_usuarios(ventana: Ventana = Depends(), db: Session = Depends(get_db)):
+    return estadisticas.en_cache(
+        db, "usuarios", ventana.desde, ventana.hasta,
+        lambda: estadisticas.distribucion_usuarios(db, ventana.desde, ventana.hasta)
+    )
 
-    pdf.save()
 
-    return FileResponse(
-        path=ruta,
-        filename="ranking_usuarios.pdf",
-        media_type="application/pdf"
+@router.get("/estadisticas/usuarios/{usuario_id}", summary="Curva de retos completados de un usuario")
+def estadisticas_curva_usuario(usuario_id: int, ventana: Ventana = Depends(), db: Session = Depends(get_db)):
+    return estadisticas.en_cache(
+        db, "curva", ventana.desde, ventana.hasta,
+        lambda: estadisticas.curva_usuario(db, usuario_id, ventana.desde, ventana.hasta),
+        usuario_id
     )
 
 # ==========================================================
@@ -103,7 +224,4 @@ def generar_reporte_ranking(db: Session = Depends(get_db)):
 # ==========================================================
 @router.get("/vista")
 def vista_reportes(request: Request):
-    return templates.TemplateResponse(
-        "reportes.html",
-        {"request": request}
-    )
+    return plantillas.pagina(request, "reportes.html")
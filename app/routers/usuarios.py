@@ -1,26 +1,41 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
-from fastapi.templating import Jinja2Templates
+import asyncio
+import os
+import time
+from typing import Optional, Union
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, status, Request, Form, Response, UploadFile
 from fastapi.responses import RedirectResponse
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from app import models, schemas
-from app.database import get_db
+from app import consultas, models, schemas, contadores, importacion, respuestas_rapidas, busqueda, plantillas, avatares, eventos
+from app.ranking import ranking
+from app.database import SessionLocal, get_db
+from app.paginacion import Pagina, paginar_seleccion
+from app.instrumentacion import RutaMedida
 
 router = APIRouter(
     prefix="/usuarios",
-    tags=["Usuarios"]
+    tags=["Usuarios"],
+    route_class=RutaMedida
 )
 
-templates = Jinja2Templates(directory="app/templates")
+VISTA_TTL_S = int(os.getenv("USUARIOS_VISTA_TTL_S", "30"))
 
 # ==========================================================
 #  VISTA HTML: LISTADO DE USUARIOS
 # ==========================================================
 @router.get("/vista")
 def vista_usuarios(request: Request, db: Session = Depends(get_db)):
-    usuarios = db.query(models.Usuario).filter(models.Usuario.activo == True).all()
-    return templates.TemplateResponse(
+    # La tabla solo se vuelve a consultar y renderizar si cambió VERSION_USUARIOS
+    # o pasaron VISTA_TTL_S: los puntos cambian con cada progreso y no suben la versión
+    version = contadores.leer(db, contadores.VERSION_USUARIOS) or 0
+    tabla = plantillas.fragmento(
+        "_tabla_usuarios.html",
+        (version, int(time.time() // VISTA_TTL_S)),
+        lambda: {"usuarios": db.query(models.Usuario).filter(models.Usuario.activo == True).all()}
+    )
+    return plantillas.templates.TemplateResponse(
         "usuarios.html",
-        {"request": request, "usuarios": usuarios}
+        {"request": request, "tabla": tabla}
     )
 
 # ==========================================================
@@ -28,25 +43,62 @@ def vista_usuarios(request: Request, db: Session = Depends(get_db)):
 # ==========================================================
 @router.get("/nuevo")
 def formulario_usuario(request: Request):
-    return templates.TemplateResponse(
-        "crear_usuario.html",
-        {"request": request}
-    )
+    return plantillas.pagina(request, "crear_usuario.html")
 
 # ==========================================================
-#  POST DESDE FORMULARIO HTML (SIN FOTO)
+#  POST DESDE FORMULARIO HTML (FOTO OPCIONAL)
 # ==========================================================
 @router.post("/crear-html")
-def crear_usuario_html(
+async def crear_usuario_html(
+    tareas: BackgroundTasks,
     nombre: str = Form(...),
     edad: int = Form(...),
     categoria: str = Form(...),
-    db: Session = Depends(get_db)
+    foto: Union[UploadFile, str, None] = File(None)
 ):
-    existe = db.query(models.Usuario).filter(models.Usuario.nombre == nombre).first()
-    if existe:
+    # Sin get_db: la plaza del semáforo quedaría ocupada mientras llega la
+    # foto. Las consultas van en el pool de hilos, cada una con su sesión.
+    if await asyncio.to_thread(_en_sesion, _nombre_ocupado, nombre):
         raise HTTPException(status_code=400, detail="El usuario ya existe")
 
+    # La foto se valida antes de crear el usuario. Sin archivo, el navegador
+    # manda la parte con nombre vacío y llega como cadena vacía.
+    subida = None
+    if getattr(foto, "filename", None):
+        subida = await _recibir_foto(avatares.recibir_archivo(foto))
+
+    try:
+        usuario_id = await asyncio.to_thread(_en_sesion, _crear_desde_formulario, nombre, edad, categoria)
+    except BaseException:
+        if subida is not None:
+            subida.descartar()
+        raise
+    busqueda.invalidar_usuarios()
+
+    if subida is not None:
+        try:
+            await asyncio.to_thread(_asignar_foto, usuario_id, subida, tareas)
+        except avatares.ColaLlena:
+            # El usuario ya está creado: un error aquí haría que al reenviar el
+            # formulario saliera "ya existe". Queda sin foto; puede subirla luego.
+            pass
+
+    return RedirectResponse("/usuarios/vista", status_code=303)
+
+
+def _en_sesion(funcion, *argumentos):
+    db = SessionLocal()
+    try:
+        return funcion(db, *argumentos)
+    finally:
+        db.close()
+
+
+def _nombre_ocupado(db: Session, nombre: str) -> bool:
+    return db.query(models.Usuario.id).filter(models.Usuario.nombre == nombre).first() is not None
+
+
+def _crear_desde_formulario(db: Session, nombre: str, edad: int, categoria: str) -> int:
     nuevo_usuario = models.Usuario(
         nombre=nombre,
         edad=edad,
@@ -55,9 +107,56 @@ def crear_usuario_html(
     )
 
     db.add(nuevo_usuario)
+    db.flush()
+    contadores.incrementar(db, contadores.TOTAL_USUARIOS)
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.creado", nuevo_usuario.id, nombre=nombre, edad=edad, categoria=categoria)
     db.commit()
+    return nuevo_usuario.id
 
-    return RedirectResponse("/usuarios/vista", status_code=303)
+# ==========================================================
+#  CARGA MASIVA (JSON, NDJSON o CSV)
+# ==========================================================
+@router.post("/importar", summary="Carga masiva de usuarios (arreglo JSON, NDJSON o CSV)")
+async def importar_usuarios(request: Request, db: Session = Depends(get_db)):
+    """
+    Inserta los usuarios válidos en lotes y devuelve los errores por fila.
+    Los nombres repetidos (en la base de datos o dentro del propio archivo)
+    se rechazan, como en la creación individual.
+    """
+    vistos = set()
+
+    def insertar_lote(db: Session, lote, resultado):
+        # Una sola consulta por lote para detectar nombres ya registrados
+        existentes = importacion.valores_existentes(
+            db, models.Usuario.nombre, {usuario.nombre for _, usuario in lote}
+        )
+
+        filas = []
+        for numero, usuario in lote:
+            if usuario.nombre in existentes or usuario.nombre in vistos:
+                resultado.error(numero, "El usuario ya existe")
+                continue
+            vistos.add(usuario.nombre)
+            filas.append({**usuario.model_dump(), "activo": True})
+
+        if filas:
+            ids = db.execute(
+                insert(models.Usuario).returning(models.Usuario.id, sort_by_parameter_order=True), filas
+            ).scalars().all()
+            contadores.incrementar(db, contadores.TOTAL_USUARIOS, len(filas))
+            contadores.incrementar(db, contadores.VERSION_USUARIOS)
+            eventos.registrar_varios(db, "usuario.creado", [
+                (id_, {"nombre": fila["nombre"], "edad": fila["edad"], "categoria": fila["categoria"]})
+                for id_, fila in zip(ids, filas)
+            ])
+            db.commit()
+            resultado.insertados += len(filas)
+
+    try:
+        return await importacion.importar(request, db, schemas.UsuarioCreate, insertar_lote)
+    finally:
+        busqueda.invalidar_usuarios()
 
 # ==========================================================
 #  API ORIGINAL
@@ -71,24 +170,41 @@ def crear_usuario(usuario: schemas.UsuarioCreate, db: Session = Depends(get_db))
 
     nuevo_usuario = models.Usuario(**usuario.model_dump())
     db.add(nuevo_usuario)
+    db.flush()
+    contadores.incrementar(db, contadores.TOTAL_USUARIOS)
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.creado", nuevo_usuario.id, nombre=usuario.nombre, edad=usuario.edad, categoria=usuario.categoria)
     db.commit()
+    busqueda.invalidar_usuarios()
     db.refresh(nuevo_usuario)
     return nuevo_usuario
 
 
 @router.get("/", response_model=list[schemas.Usuario])
-def obtener_usuarios(db: Session = Depends(get_db)):
-    return db.query(models.Usuario).filter(models.Usuario.activo == True).all()
+def obtener_usuarios(
+    response: Response,
+    categoria: Optional[str] = None,
+    pagina: Pagina = Depends(),
+    db: Session = Depends(get_db)
+):
+    usuarios, _ = paginar_seleccion(
+        db, consultas.usuarios(categoria=categoria), models.Usuario.id, pagina, response,
+        escalares=consultas.ESCALARES
+    )
+    return respuestas_rapidas.responder(schemas.Usuario, usuarios, response)
 
 
 @router.get("/eliminados", response_model=list[schemas.Usuario])
-def usuarios_eliminados(db: Session = Depends(get_db)):
-    return db.query(models.Usuario).filter(models.Usuario.activo == False).all()
+def usuarios_eliminados(response: Response, pagina: Pagina = Depends(), db: Session = Depends(get_db)):
+    usuarios, _ = paginar_seleccion(
+        db, consultas.usuarios(activo=False), models.Usuario.id, pagina, response, escalares=consultas.ESCALARES
+    )
+    return respuestas_rapidas.responder(schemas.Usuario, usuarios, response)
 
 
 @router.get("/{usuario_id}", response_model=schemas.Usuario)
 def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
-    usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
+    usuario = db.execute(consultas.usuario(usuario_id)).scalars().first()
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     return usuario
@@ -96,10 +212,7 @@ def obtener_usuario(usuario_id: int, db: Session = Depends(get_db)):
 
 @router.get("/buscar/{nombre}", response_model=schemas.Usuario)
 def buscar_usuario_por_nombre(nombre: str, db: Session = Depends(get_db)):
-    usuario = db.query(models.Usuario).filter(
-        models.Usuario.nombre == nombre,
-        models.Usuario.activo == True
-    ).first()
+    usuario = db.execute(consultas.usuario_activo_por_nombre(nombre)).scalars().first()
 
     if not usuario:
         raise HTTPException(status_code=404, detail="No existe un usuario activo con ese nombre")
@@ -108,7 +221,7 @@ def buscar_usuario_por_nombre(nombre: str, db: Session = Depends(get_db)):
 
 
 @router.put("/{usuario_id}", response_model=schemas.Usuario)
-def actualizar_usuario(usuario_id: int, datos: schemas.UsuarioCreate, db: Session = Depends(get_db)):
+def actualizar_usuario(usuario_id: int, datos: schemas.UsuarioUpdate, db: Session = Depends(get_db)):
     usuario = db.query(models.Usuario).filter(models.Usuario.id == usuario_id).first()
     if not usuario:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -116,7 +229,13 @@ def actualizar_usuario(usuario_id: int, datos: schemas.UsuarioCreate, db: Sessio
     for campo, valor in datos.model_dump().items():
         setattr(usuario, campo, valor)
 
+    # El nombre aparece en el PDF del ranking
+    contadores.incrementar(db, contadores.VERSION_RANKING)
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.actualizado", usuario_id, **datos.model_dump())
     db.commit()
+    ranking.cambiar_categoria(usuario_id, datos.categoria)
+    busqueda.invalidar_usuarios()
     db.refresh(usuario)
     return usuario
 
@@ -128,7 +247,10 @@ def eliminar_usuario(usuario_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     usuario.activo = False
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.eliminado", usuario_id)
     db.commit()
+    busqueda.invalidar_usuarios()
     return {"mensaje": "Usuario eliminado correctamente"}
 
 
@@ -139,6 +261,95 @@ def restaurar_usuario(usuario_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
 
     usuario.activo = True
+    contadores.incrementar(db, contadores.VERSION_USUARIOS)
+    eventos.registrar(db, "usuario.restaurado", usuario_id)
     db.commit()
+    busqueda.invalidar_usuarios()
     db.refresh(usuario)
     return usuario
+
+
+# ==========================================================
+#  FOTO DE PERFIL
+# ==========================================================
+async def _recibir_foto(recepcion) -> avatares.Subida:
+    try:
+        subida = await recepcion
+    except avatares.ImagenDemasiadoGrande:
+        raise HTTPException(status_code=413, detail=f"La imagen supera los {avatares.MAX_BYTES // 2**20} MB")
+    except avatares.ImagenInvalida as error:
+        raise HTTPException(status_code=415, detail=str(error))
+
+    try:
+        avatares.verificar(subida)
+    except avatares.ImagenInvalida as error:
+        subida.descartar()
+        raise HTTPException(status_code=415, detail=str(error))
+    return subida
+
+
+def _asignar_foto(usuario_id: int, subida: avatares.Subida, tareas: BackgroundTasks) -> bool:
+    """
+    Encola las miniaturas. Si ya existían (misma imagen subida antes) la foto
+    se asigna ahora y devuelve True; si no, se asigna en segundo plano
+    cuando terminen. Hace consultas: se llama desde el pool de hilos. Lanza
+    avatares.ColaLlena (la subida ya queda descartada).
+    """
+    futuro = avatares.procesador.procesar(subida)
+    if futuro is None:
+        avatares.asignar_en_sesion(usuario_id, subida.foto)
+        return True
+    tareas.add_task(avatares.asignar_al_terminar, futuro, usuario_id, subida.foto)
+    return False
+
+
+@router.put(
+    "/{usuario_id}/foto",
+    response_model=schemas.FotoUsuario,
+    responses={202: {"model": schemas.FotoUsuario, "description": "Miniaturas en proceso"}}
+)
+async def subir_foto(
+    usuario_id: int,
+    request: Request,
+    response: Response,
+    tareas: BackgroundTasks
+):
+    """
+    El cuerpo es la imagen tal cual (JPEG, PNG, WebP o GIF) con su
+    Content-Type; se lee por trozos. Responde 202 mientras se generan las
+    miniaturas; la foto queda asignada al terminar.
+    """
+    if not request.headers.get("content-type", "").startswith("image/"):
+        raise HTTPException(status_code=415, detail="El cuerpo debe ser una imagen (Content-Type image/*)")
+    if int(request.headers.get("content-length") or 0) > avatares.MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"La imagen supera los {avatares.MAX_BYTES // 2**20} MB")
+    # Sin get_db, como en crear_usuario_html: la subida puede tardar
+    if not await asyncio.to_thread(_en_sesion, _usuario_existe, usuario_id):
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+
+    subida = await _recibir_foto(avatares.recibir(request.stream()))
+    try:
+        lista = await asyncio.to_thread(_asignar_foto, usuario_id, subida, tareas)
+    except avatares.ColaLlena:
+        raise HTTPException(
+            status_code=503,
+            detail="Hay demasiadas fotos en proceso, inténtalo más tarde",
+            headers={"Retry-After": "5"}
+        )
+    if not lista:
+        response.status_code = status.HTTP_202_ACCEPTED
+    return schemas.FotoUsuario(foto=subida.foto, lista=lista, miniaturas=avatares.miniaturas(subida.foto))
+
+
+def _usuario_existe(db: Session, usuario_id: int) -> bool:
+    return db.query(models.Usuario.id).filter(models.Usuario.id == usuario_id).first() is not None
+
+
+@router.get("/{usuario_id}/foto", response_model=schemas.FotoUsuario)
+def obtener_foto(usuario_id: int, db: Session = Depends(get_db)):
+    foto = db.query(models.Usuario.foto).filter(models.Usuario.id == usuario_id).first()
+    if foto is None:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    if foto.foto is None:
+        return schemas.FotoUsuario(lista=False)
+    return schemas.FotoUsuario(foto=foto.foto, lista=True, miniaturas=avatares.miniaturas(foto.foto))
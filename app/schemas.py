@@ -3,25 +3,32 @@ Archivo: schemas.py
 Descripción: Modelos de validación de datos (entrada y salida)
 
 """
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
 from datetime import datetime
 
 # --------------------------------------------------------
 # Usuario
 # --------------------------------------------------------
 class UsuarioBase(BaseModel):
+    # Nivel, racha y puntos se calculan a partir del progreso (app/rachas.py):
+    # al crear o actualizar no se aceptan
     nombre: str
     edad: int
     categoria: str
-    nivel: int = 1
-    racha_dias: int = 0
-    puntos: int = 0
 
 class UsuarioCreate(UsuarioBase):
     pass
 
+class UsuarioUpdate(UsuarioBase):
+    pass
+
 class Usuario(UsuarioBase):
+    nivel: int = 1
+    racha_dias: int = 0
+    puntos: int = 0
     id: int
+    foto: Optional[str] = None  # Hash de la imagen; URL con /usuarios/{id}/foto
     class Config:
         from_attributes = True
 
@@ -95,3 +102,88 @@ class Comunidad(ComunidadBase):
     class Config:
         from_attributes = True
 
+class MiembrosComunidad(BaseModel):
+    usuario_ids: list[int] = Field(..., min_length=1, max_length=5000)
+
+class AltasComunidad(BaseModel):
+    comunidad_id: int
+    agregados: list[int]
+    ya_eran_miembros: list[int]
+    no_encontrados: list[int]
+
+class BajasComunidad(BaseModel):
+    comunidad_id: int
+    eliminados: list[int]
+    no_eran_miembros: list[int]
+
+class ParticipantesComunidad(BaseModel):
+    total: int  # Miembros de la comunidad (no solo los de esta página)
+    participantes: list[Usuario]
+
+
+# --------------------------------------------------------
+# Ranking
+# --------------------------------------------------------
+class PosicionRanking(BaseModel):
+    posicion: int
+    usuario_id: int
+    nombre: str
+    puntos: int
+
+class RankingUsuario(BaseModel):
+    usuario_id: int
+    posicion: int
+    puntos: int
+    total: int  # Usuarios en este ranking
+    vecinos: list[PosicionRanking]
+
+
+# --------------------------------------------------------
+# Búsqueda
+# --------------------------------------------------------
+class ResultadoReto(MicroReto):
+    relevancia: float
+
+class SugerenciaUsuario(BaseModel):
+    id: int
+    nombre: str
+
+
+# --------------------------------------------------------
+# Trabajos de reportes
+# --------------------------------------------------------
+class TrabajoReporteCreate(BaseModel):
+    tipo: Literal["ranking"] = "ranking"
+    limite: Optional[int] = Field(None, ge=1, description="Solo los primeros puestos")
+
+class TrabajoReporte(BaseModel):
+    id: str
+    tipo: str
+    parametros: Optional[dict] = None
+    estado: str  # pendiente, en_curso, terminado, sin_datos o error
+    creado: datetime
+    terminado: Optional[datetime] = None
+    error: Optional[str] = None
+    descarga: Optional[str] = None
+
+
+# --------------------------------------------------------
+# Fotos de perfil
+# --------------------------------------------------------
+class FotoUsuario(BaseModel):
+    foto: Optional[str] = None
+    lista: bool  # False mientras se generan las miniaturas
+    miniaturas: dict[int, str] = {}  # tamaño en px -> URL
+
+
+# --------------------------------------------------------
+# Eventos (feed de cambios)
+# --------------------------------------------------------
+class Evento(BaseModel):
+    id: int  # Posición en el feed: usar como `desde` o Last-Event-ID
+    tipo: str
+    entidad_id: Optional[int] = None
+    datos: Optional[dict] = None
+    creado: datetime
+    class Config:
+        from_attributes = True
@@ -0,0 +1,17 @@
+"""
+Archivo: servidor.py
+Descripción: Worker de gunicorn (ver Procfile). Es UvicornWorker con la
+implementación de WebSocket sans-I/O y sin compresión por mensaje: cada
+conexión abierta a /gamificacion/en-vivo ocupa unos 36 KB en vez de unos
+140 KB (scripts/bench_en_vivo.py), y los mensajes, JSON pequeños, apenas
+ganan comprimidos.
+"""
+from uvicorn.workers import UvicornWorker
+
+
+class WorkerUvicorn(UvicornWorker):
+    CONFIG_KWARGS = {
+        **UvicornWorker.CONFIG_KWARGS,
+        "ws": "websockets-sansio",
+        "ws_per_message_deflate": False,
+    }
@@ -0,0 +1,341 @@
+"""
+Archivo: trabajos_reportes.py
+Descripción: Cola de trabajos para generar los reportes PDF fuera de los
+workers de la API. Encolar un reporte devuelve enseguida el trabajo; un pool
+de REPORTES_PROCESOS procesos (con prioridad baja) lo renderiza y el PDF
+queda en REPORTES_CACHE_DIR hasta que cumple REPORTES_MAX_EDAD_S. Si la
+carpeta pasa de REPORTES_CACHE_MB, se borran antes los PDF descargados hace
+más tiempo.
+
+El ID del trabajo sale del tipo, los parámetros y la versión de los datos:
+pedir dos veces el mismo reporte devuelve el mismo trabajo, y un PDF ya
+generado (por este worker o por otro que comparta la carpeta) se reutiliza
+sin volver a renderizarlo. El estado de los trabajos sin terminar solo lo
+conoce el worker que los encoló.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from app import reportes_pdf
+from app.database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+CARPETA = os.getenv("REPORTES_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "microhabitos-reportes")
+PROCESOS = int(os.getenv("REPORTES_PROCESOS", "1"))
+MAX_PENDIENTES = int(os.getenv("REPORTES_MAX_PENDIENTES", "16"))
+MAX_EDAD_S = int(os.getenv("REPORTES_MAX_EDAD_S", "3600"))
+MAX_BYTES = int(os.getenv("REPORTES_CACHE_MB", "200")) * 1024 * 1024
+LIMPIAR_CADA_S = int(os.getenv("REPORTES_LIMPIAR_CADA_S", "300"))
+PRIORIDAD = 10  # os.nice() de los procesos del pool
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+TERMINADO = "terminado"
+SIN_DATOS = "sin_datos"
+ERROR = "error"
+
+# tipo -> (versión de los datos, renderizar(db, destino, **parametros))
+TIPOS = {
+    "ranking": (reportes_pdf.version_ranking, reportes_pdf.renderizar_ranking),
+}
+
+
+class ColaLlena(Exception):
+    pass
+
+
+# ==========================================================
+#  PROCESOS DEL POOL
+# ==========================================================
+def _iniciar_proceso():
+    # Que el render no le quite CPU a los workers de la API
+    if hasattr(os, "nice"):
+        os.nice(PRIORIDAD)
+
+
+def _renderizar(tipo: str, parametros: dict, ruta: str, version: int):
+    """
+    Se ejecuta dentro del pool, con su propia sesión. El PDF se escribe en
+    un temporal y se mueve a `ruta` al terminar, así nunca se sirve a medias.
+    Devuelve la versión de los datos que se renderizó (None si no había
+    datos): se lee antes que los datos y puede ser más nueva que `version`,
+    la del ID del trabajo, si hubo cambios mientras esperaba en la cola;
+    nunca más vieja.
+    """
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+    archivo = os.fdopen(descriptor, "wb")
+    db = SessionLocal()
+    try:
+        renderizada = TIPOS[tipo][0](db)
+        if renderizada < version:
+            raise RuntimeError(f"Los datos (versión {renderizada}) son anteriores al trabajo (versión {version})")
+        with archivo:
+            generado = TIPOS[tipo][1](db, archivo, **parametros)
+        if generado:
+            os.replace(temporal, ruta)
+        return renderizada if generado else None
+    finally:
+        archivo.close()
+        db.close()
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+
+# ==========================================================
+#  TRABAJOS
+# ==========================================================
+class Trabajo:
+
+    def __init__(self, trabajo_id: str, tipo: str, parametros, ruta: str):
+        self.id = trabajo_id
+        self.tipo = tipo
+        self.parametros = parametros  # None si se recuperó solo del disco
+        self.ruta = ruta
+        self.creado = datetime.utcnow()
+        self.terminado = None
+        self.error = None
+        self.version = None  # Versión de los datos renderizada (ver _renderizar)
+        self.fin = None  # time.time() al terminar, para la limpieza
+        self.futuro = None
+        self._final = None
+
+    @property
+    def estado(self) -> str:
+        if self._final is not None:
+            return self._final
+        if self.futuro is not None and self.futuro.running():
+            return EN_CURSO
+        return PENDIENTE
+
+    def terminar(self, estado: str, error: str = None):
+        self._final = estado
+        self.error = error
+        self.terminado = datetime.utcnow()
+        self.fin = time.time()
+
+
+def identificador(tipo: str, parametros: dict, version: int) -> str:
+    clave = json.dumps([tipo, parametros, version], sort_keys=True).encode()
+    return f"{tipo}-{hashlib.blake2b(clave, digest_size=10).hexdigest()}"
+
+
+class ColaReportes:
+
+    def __init__(self, carpeta: str, procesos: int, max_pendientes: int, max_edad_s: int, max_bytes: int):
+        self.carpeta = carpeta
+        self.procesos = procesos
+        self.max_pendientes = max_pendientes
+        self.max_edad_s = max_edad_s
+        self.max_bytes = max_bytes
+        self._trabajos = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        os.makedirs(carpeta, exist_ok=True)
+
+    def ruta(self, trabajo_id: str) -> str:
+        return os.path.join(self.carpeta, trabajo_id + ".pdf")
+
+    def _ejecutor(self) -> ProcessPoolExecutor:
+        # "spawn": los procesos no heredan las conexiones ni los hilos del worker
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_iniciar_proceso
+            )
+        return self._pool
+
+    def identificador(self, db: Session, tipo: str, parametros: dict) -> str:
+        return identificador(tipo, parametros, TIPOS[tipo][0](db))
+
+    def _pendientes(self, tipo: str = None) -> int:
+        return sum(
+            1 for trabajo in self._trabajos.values()
+            if trabajo.estado in (PENDIENTE, EN_CURSO) and tipo in (None, trabajo.tipo)
+        )
+
+    def hay_pendientes(self, tipo: str) -> bool:
+        with self._lock:
+            return self._pendientes(tipo) > 0
+
+    def encolar(self, db: Session, tipo: str, parametros: dict) -> Trabajo:
+        """
+        Devuelve el trabajo de este reporte con los datos actuales: el que
+        ya existe (pendiente o terminado) o uno nuevo. Lanza ColaLlena si
+        hay MAX_PENDIENTES esperando.
+        """
+        version = TIPOS[tipo][0](db)
+        trabajo_id = identificador(tipo, parametros, version)
+
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+            if trabajo is not None and trabajo.estado != ERROR:
+                # Salvo que otro worker ya haya borrado el PDF por antiguo
+                if trabajo.estado != TERMINADO or os.path.exists(trabajo.ruta):
+                    return trabajo
+
+            trabajo = Trabajo(trabajo_id, tipo, parametros, self.ruta(trabajo_id))
+            if os.path.exists(trabajo.ruta):
+                trabajo.terminar(TERMINADO)
+                self._trabajos[trabajo_id] = trabajo
+                return trabajo
+
+            if self._pendientes() >= self.max_pendientes:
+                raise ColaLlena()
+            trabajo.futuro = self._ejecutor().submit(_renderizar, tipo, parametros, trabajo.ruta, version)
+            self._trabajos[trabajo_id] = trabajo
+
+        # Fuera del lock: si ya terminó, el callback se ejecuta aquí mismo
+        trabajo.futuro.add_done_callback(lambda futuro: self._al_terminar(trabajo, futuro))
+        return trabajo
+
+    def _al_terminar(self, trabajo: Trabajo, futuro):
+        if futuro.cancelled():
+            trabajo.terminar(ERROR, "Cancelado")
+            return
+        error = futuro.exception()
+        if error is not None:
+            logger.error("Falló el reporte %s", trabajo.id, exc_info=error)
+            trabajo.terminar(ERROR, str(error) or error.__class__.__name__)
+        else:
+            trabajo.version = futuro.result()
+            trabajo.terminar(TERMINADO if trabajo.version is not None else SIN_DATOS)
+            if trabajo.version is not None:
+                self._recortar(conservar=trabajo.ruta)
+
+    def obtener(self, trabajo_id: str):
+        """
+        Trabajo por ID, o None. Un PDF que está en la carpeta pero no en
+        memoria (lo generó otro worker o un arranque anterior) se da por
+        terminado.
+        """
+        with self._lock:
+            trabajo = self._trabajos.get(trabajo_id)
+        if trabajo is not None:
+            return trabajo
+
+        tipo = trabajo_id.split("-", 1)[0]
+        ruta = self.ruta(trabajo_id)
+        if tipo not in TIPOS or os.path.basename(ruta) != trabajo_id + ".pdf" or not os.path.exists(ruta):
+            return None
+        trabajo = Trabajo(trabajo_id, tipo, None, ruta)
+        trabajo.terminar(TERMINADO)
+        return trabajo
+
+    def usado(self, ruta: str):
+        """
+        Marca el PDF como recién descargado. Se usa el atime (puesto a mano,
+        no depende de cómo se monte el disco): el mtime sigue siendo la
+        fecha de creación para la limpieza por edad.
+        """
+        try:
+            os.utime(ruta, (time.time(), os.stat(ruta).st_mtime))
+        except FileNotFoundError:
+            pass
+
+    def _recortar(self, conservar: str = None) -> int:
+        """
+        Si los PDF de la carpeta ocupan más de max_bytes, borra los de
+        descarga más antigua hasta quedar por debajo. Nunca borra `conservar`
+        (el que se acaba de generar). Devuelve cuántos borró.
+        """
+        pdfs = []
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_file() and entrada.name.endswith(".pdf"):
+                        datos = entrada.stat()
+                        pdfs.append((datos.st_atime, datos.st_size, entrada.path))
+                except FileNotFoundError:
+                    pass
+
+        total = sum(tamano for _, tamano, _ in pdfs)
+        borrados = 0
+        for _, tamano, ruta in sorted(pdfs):
+            if total <= self.max_bytes:
+                break
+            if ruta == conservar:
+                continue
+            try:
+                os.remove(ruta)
+                borrados += 1
+            except FileNotFoundError:
+                pass
+            total -= tamano
+        return borrados
+
+    def limpiar(self) -> int:
+        """
+        Olvida los trabajos terminados hace más de max_edad_s, borra de la
+        carpeta los PDF (y temporales abandonados) de esa edad y después los
+        que sobren de max_bytes. Devuelve cuántos archivos se borraron.
+        """
+        limite = time.time() - self.max_edad_s
+        with self._lock:
+            for trabajo_id, trabajo in list(self._trabajos.items()):
+                if trabajo.fin is not None and trabajo.fin < limite:
+                    del self._trabajos[trabajo_id]
+
+        borrados = 0
+        with os.scandir(self.carpeta) as entradas:
+            for entrada in entradas:
+                try:
+                    if entrada.is_file() and entrada.stat().st_mtime < limite:
+                        os.remove(entrada.path)
+                        borrados += 1
+                except FileNotFoundError:
+                    pass
+        return borrados + self._recortar()
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+cola = ColaReportes(CARPETA, PROCESOS, MAX_PENDIENTES, MAX_EDAD_S, MAX_BYTES)
+
+
+def regenerar_ranking():
+    """
+    Tarea en segundo plano tras una escritura en gamificación: encola el PDF
+    de la versión nueva. Si ya hay un ranking en cola no hace nada; la
+    siguiente descarga encolará la versión que falte.
+    """
+    if cola.hay_pendientes("ranking"):
+        return
+    db = SessionLocal()
+    try:
+        cola.encolar(db, "ranking", {})
+    except ColaLlena:
+        pass
+    finally:
+        db.close()
+
+
+async def limpieza_periodica():
+    """
+    Tarea de fondo que limpia los reportes viejos cada LIMPIAR_CADA_S. Al
+    cancelarse (apagado de la aplicación) cierra el pool de procesos.
+    """
+    try:
+        while True:
+            await asyncio.sleep(LIMPIAR_CADA_S)
+            try:
+                await asyncio.to_thread(cola.limpiar)
+            except Exception:
+                logger.exception("Falló la limpieza de reportes")
+    finally:
+        cola.cerrar()
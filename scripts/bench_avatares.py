@@ -0,0 +1,163 @@
+"""
+Archivo: bench_avatares.py
+Descripción: Benchmark de la subida de fotos de perfil (PUT /usuarios/{id}/foto).
+Levanta la aplicación con uvicorn, crea usuarios y sube a la vez fotos JPEG
+distintas de varios MB. Muestra:
+
+- subidas/s, MB/s y latencias p50/p99 de la subida (la respuesta no espera
+  a las miniaturas),
+- el tiempo hasta que todas las fotos quedan asignadas (miniaturas hechas),
+- la latencia de GET /usuarios/{id} mientras tanto, para comprobar que el
+  redimensionado no frena la API,
+- una segunda pasada con las mismas fotos (deduplicadas: sin procesar).
+
+Uso:  python scripts/bench_avatares.py --fotos 64 --concurrencia 16
+Requiere httpx (pip install httpx). Usar SOLO con una DATABASE_URL de
+pruebas ya migrada: crea usuarios bench-avatar-*.
+"""
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from PIL import Image
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def generar_fotos(cantidad, ancho, alto):
+    """
+    JPEG del tamaño de una foto de móvil (unos 4 MB). Se codifica uno solo y
+    cada copia lleva bytes distintos tras el final de la imagen: el hash
+    cambia (no se deduplican) y el trabajo de decodificarlas es el mismo.
+    """
+    salida = io.BytesIO()
+    Image.effect_noise((ancho, alto), 10).convert("RGB").save(salida, "JPEG", quality=90)
+    base = salida.getvalue()
+    return [base + uuid.uuid4().bytes for _ in range(cantidad)]
+
+
+def levantar_servidor(puerto):
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=dict(os.environ)
+    )
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{puerto}/usuarios/?limit=1", timeout=1)
+            return proceso
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError("El servidor no arrancó")
+
+
+async def subir_todas(cliente, usuarios, fotos, concurrencia):
+    semaforo = asyncio.Semaphore(concurrencia)
+    latencias, estados = [], []
+
+    async def subir(usuario_id, foto):
+        async with semaforo:
+            inicio = time.perf_counter()
+            respuesta = await cliente.put(
+                f"/usuarios/{usuario_id}/foto", content=foto, headers={"Content-Type": "image/jpeg"}
+            )
+            latencias.append(time.perf_counter() - inicio)
+            estados.append(respuesta.status_code)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(subir(u, f) for u, f in zip(usuarios, fotos)))
+    return time.perf_counter() - inicio, latencias, estados
+
+
+async def sondear_api(cliente, usuario_id, parar, latencias):
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await cliente.get(f"/usuarios/{usuario_id}")
+        latencias.append(time.perf_counter() - inicio)
+        await asyncio.sleep(0.02)
+
+
+async def esperar_asignadas(cliente, usuarios, limite_s=600):
+    inicio = time.perf_counter()
+    pendientes = set(usuarios)
+    while pendientes and time.perf_counter() - inicio < limite_s:
+        for usuario_id in list(pendientes):
+            if (await cliente.get(f"/usuarios/{usuario_id}/foto")).json()["foto"]:
+                pendientes.discard(usuario_id)
+        await asyncio.sleep(0.1)
+    return time.perf_counter() - inicio, len(pendientes)
+
+
+def resumen(nombre, segundos, latencias, estados, total_bytes):
+    print(
+        f"{nombre:<12}{len(estados) / segundos:>10.1f}{total_bytes / 2**20 / segundos:>10.1f}"
+        f"{percentil(latencias, 50) * 1000:>10.1f}{percentil(latencias, 99) * 1000:>10.1f}"
+        f"   {dict((e, estados.count(e)) for e in sorted(set(estados)))}"
+    )
+
+
+async def medir(base, fotos, concurrencia):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base, timeout=120) as cliente:
+        prefijo = f"bench-avatar-{uuid.uuid4().hex[:8]}"
+        usuarios = []
+        for n in range(len(fotos)):
+            respuesta = await cliente.post("/usuarios/", json={"nombre": f"{prefijo}-{n}", "edad": 20, "categoria": "Bench"})
+            usuarios.append(respuesta.json()["id"])
+        total_bytes = sum(len(f) for f in fotos)
+
+        parar, latencias_api = asyncio.Event(), []
+        sondeo = asyncio.create_task(sondear_api(cliente, usuarios[0], parar, latencias_api))
+
+        segundos, latencias, estados = await subir_todas(cliente, usuarios, fotos, concurrencia)
+        procesado_s, sin_asignar = await esperar_asignadas(cliente, usuarios)
+        parar.set()
+        await sondeo
+
+        repetidas_s, latencias_rep, estados_rep = await subir_todas(cliente, usuarios, fotos, concurrencia)
+
+    print(f"\n{len(fotos)} fotos de {total_bytes / len(fotos) / 2**20:.1f} MB de media, concurrencia {concurrencia}\n")
+    print(f"{'pasada':<12}{'subidas/s':>10}{'MB/s':>10}{'p50 ms':>10}{'p99 ms':>10}   estados")
+    resumen("nuevas", segundos, latencias, estados, total_bytes)
+    resumen("repetidas", repetidas_s, latencias_rep, estados_rep, total_bytes)
+    print(f"\nMiniaturas de todas las fotos listas a los {segundos + procesado_s:.1f} s "
+          f"({len(fotos) / (segundos + procesado_s):.1f} fotos/s; sin asignar: {sin_asignar})")
+    print(f"GET /usuarios/{{id}} durante el procesado: p50 {percentil(latencias_api, 50) * 1000:.1f} ms, "
+          f"p99 {percentil(latencias_api, 99) * 1000:.1f} ms ({len(latencias_api)} peticiones)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fotos", type=int, default=64)
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--ancho", type=int, default=4000)
+    parser.add_argument("--alto", type=int, default=3000)
+    parser.add_argument("--puerto", type=int, default=8766)
+    args = parser.parse_args()
+
+    fotos = generar_fotos(args.fotos, args.ancho, args.alto)
+    proceso = levantar_servidor(args.puerto)
+    try:
+        asyncio.run(medir(f"http://127.0.0.1:{args.puerto}", fotos, args.concurrencia))
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Archivo: bench_en_vivo.py
+Descripción: Prueba de carga de /gamificacion/en-vivo. Levanta un worker con
+uvicorn, abre N conexiones WebSocket que solo escuchan y muestra:
+
+- memoria del worker antes y después (KB por conexión),
+- tiempo en abrir todas las conexiones,
+- latencia de difusión: desde que se suman puntos a un usuario hasta que
+  cada conexión recibe el cambio (p50, p99 y la más lenta).
+
+Uso:  python scripts/bench_en_vivo.py --conexiones 10000
+Por defecto el worker usa la misma configuración de WebSocket que
+app/servidor.py; --ws y --deflate permiten compararla con otras.
+Requiere httpx y websockets (pip install httpx websockets), un límite de
+descriptores mayor que --conexiones (ulimit -n) y una DATABASE_URL de
+pruebas ya migrada: crea un usuario bench-en-vivo-*.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    valores = sorted(valores)
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+def memoria_kb(pid):
+    """
+    RSS del proceso en KB (solo Linux; None si no se puede leer).
+    """
+    try:
+        with open(f"/proc/{pid}/status") as archivo:
+            for linea in archivo:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def levantar_servidor(puerto, ws, deflate):
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning",
+         "--ws", ws, "--ws-per-message-deflate", str(deflate).lower(), "--backlog", "4096"],
+        cwd=RAIZ, env=dict(os.environ)
+    )
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{puerto}/gamificacion/?limit=1", timeout=1)
+            return proceso
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError("El servidor no arrancó")
+
+
+class Oyente:
+    """
+    Conexión que solo escucha y apunta cuándo llega cada mensaje de cambios.
+    """
+
+    def __init__(self):
+        self.llegadas = []
+        self.conexion = None
+
+    async def abrir(self, url):
+        from websockets.asyncio.client import connect
+        # Sin pings propios: el servidor ya hace los suyos
+        self.conexion = await connect(url, ping_interval=None, open_timeout=120)
+        await self.conexion.recv()  # Top inicial
+
+    async def escuchar(self):
+        try:
+            async for _ in self.conexion:
+                self.llegadas.append(time.perf_counter())
+        except Exception:
+            pass
+
+
+async def medir(base_http, base_ws, proceso, conexiones, en_paralelo, actualizaciones):
+    import httpx
+
+    async with httpx.AsyncClient(base_url=base_http, timeout=60) as cliente:
+        respuesta = await cliente.post(
+            "/usuarios/", json={"nombre": f"bench-en-vivo-{uuid.uuid4().hex[:8]}", "edad": 20, "categoria": "Bench"}
+        )
+        usuario_id = respuesta.json()["id"]
+        await cliente.post("/gamificacion/", json={"usuario_id": usuario_id, "puntos": 0})
+
+        memoria_inicial = memoria_kb(proceso.pid)
+        oyentes = [Oyente() for _ in range(conexiones)]
+        semaforo = asyncio.Semaphore(en_paralelo)
+        fallidas = []
+
+        async def abrir(oyente):
+            async with semaforo:
+                try:
+                    await oyente.abrir(f"{base_ws}/gamificacion/en-vivo?n=1")
+                except Exception as error:
+                    fallidas.append(type(error).__name__)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(abrir(o) for o in oyentes))
+        apertura_s = time.perf_counter() - inicio
+        abiertos = [o for o in oyentes if o.conexion is not None]
+        escuchas = [asyncio.create_task(o.escuchar()) for o in abiertos]
+
+        await asyncio.sleep(2)
+        memoria_final = memoria_kb(proceso.pid)
+
+        latencias, perdidas = [], 0
+        for n in range(actualizaciones):
+            enviado = time.perf_counter()
+            await cliente.patch(f"/gamificacion/{usuario_id}/sumar-puntos", params={"puntos": 1})
+            limite = enviado + 10
+            while time.perf_counter() < limite and any(len(o.llegadas) <= n for o in abiertos):
+                await asyncio.sleep(0.05)
+            for oyente in abiertos:
+                if len(oyente.llegadas) > n:
+                    latencias.append(oyente.llegadas[n] - enviado)
+                else:
+                    perdidas += 1
+                    oyente.llegadas.append(float("nan"))
+            await asyncio.sleep(0.5)
+
+        for oyente in abiertos:
+            await oyente.conexion.close()
+        for escucha in escuchas:
+            escucha.cancel()
+
+    print(f"\nConexiones abiertas: {len(abiertos)} de {conexiones} en {apertura_s:.1f} s"
+          f"{' (fallos: ' + str({e: fallidas.count(e) for e in set(fallidas)}) + ')' if fallidas else ''}")
+    if memoria_inicial and memoria_final and abiertos:
+        print(f"Memoria del worker: {memoria_inicial / 1024:.0f} MB -> {memoria_final / 1024:.0f} MB "
+              f"({(memoria_final - memoria_inicial) / len(abiertos):.1f} KB por conexión)")
+    print(f"Difusión de {actualizaciones} cambios a {len(abiertos)} conexiones: "
+          f"p50 {percentil(latencias, 50) * 1000:.0f} ms, p99 {percentil(latencias, 99) * 1000:.0f} ms, "
+          f"máx {max(latencias, default=0) * 1000:.0f} ms, sin recibir {perdidas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conexiones", type=int, default=10000)
+    parser.add_argument("--en-paralelo", type=int, default=200, help="Conexiones abriéndose a la vez")
+    parser.add_argument("--actualizaciones", type=int, default=5)
+    parser.add_argument("--ws", default="websockets-sansio", help="Implementación de WebSocket de uvicorn")
+    parser.add_argument("--deflate", action="store_true", help="Activa la compresión por mensaje")
+    parser.add_argument("--puerto", type=int, default=8767)
+    args = parser.parse_args()
+
+    proceso = levantar_servidor(args.puerto, args.ws, args.deflate)
+    try:
+        asyncio.run(medir(
+            f"http://127.0.0.1:{args.puerto}", f"ws://127.0.0.1:{args.puerto}", proceso,
+            args.conexiones, args.en_paralelo, args.actualizaciones
+        ))
+    finally:
+        proceso.terminate()
+        proceso.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Archivo: bench_estadisticas.py
+Descripción: Benchmark de app/estadisticas.py. Genera una tabla de progreso
+sintética (por defecto 5 millones de filas repartidas en un año) con SQL,
+sin pasar por Python, y mide cada estadística en frío (sin caché) y en
+caliente (desde la caché por ventana).
+
+Uso:  python scripts/bench_estadisticas.py --filas 5000000 --usuarios 50000
+Usar SOLO con una DATABASE_URL de pruebas ya migrada (alembic upgrade head):
+con --generar vacía progreso, usuarios y microrretos antes de cargarlos.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from app import contadores, estadisticas, models
+from app.database import SessionLocal, engine
+
+CATEGORIAS = ["Matemáticas", "Lenguaje", "Ciencia", "Historia", "Lógica"]
+DIFICULTADES = ["Baja", "Media", "Alta"]
+DIAS = 365
+
+
+def generar(filas, usuarios, retos):
+    fin = date.today()
+    inicio = fin - timedelta(days=DIAS - 1)
+    postgres = engine.dialect.name == "postgresql"
+
+    with engine.begin() as conexion:
+        for tabla in ("progreso", "gamificacion", "usuarios_comunidad", "usuarios", "microrretos"):
+            conexion.execute(text(f"DELETE FROM {tabla}"))
+
+        if postgres:
+            serie = "generate_series(1, :n) AS s(i)"
+            azar = "floor(random() * {})::int"
+            columna = "s.i"
+        else:
+            serie = "(WITH RECURSIVE s(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM s WHERE i < :n) SELECT i FROM s) AS s"
+            azar = "(abs(random()) % {})"
+            columna = "s.i"
+
+        conexion.execute(text(
+            f"INSERT INTO usuarios (id, nombre, edad, categoria, nivel, racha_dias, puntos, activo) "
+            f"SELECT {columna}, 'Usuario ' || {columna}, 18, 'General', 1, 0, 0, true FROM {serie}"
+        ), {"n": usuarios})
+        conexion.execute(text(
+            f"INSERT INTO microrretos (id, categoria, dificultad, contenido, respuesta) "
+            f"SELECT {columna}, "
+            f"CASE {columna} % {len(CATEGORIAS)} "
+            + " ".join(f"WHEN {i} THEN '{c}'" for i, c in enumerate(CATEGORIAS)) + " END, "
+            f"CASE {columna} % {len(DIFICULTADES)} "
+            + " ".join(f"WHEN {i} THEN '{d}'" for i, d in enumerate(DIFICULTADES)) + " END, "
+            f"'contenido', 'respuesta' FROM {serie}"
+        ), {"n": retos})
+
+        if postgres:
+            fecha = f"(CAST(:inicio AS timestamp) + {azar.format(DIAS * 86400)} * interval '1 second')"
+        else:
+            fecha = f"datetime(:inicio, '+' || {azar.format(DIAS * 86400)} || ' seconds')"
+        conexion.execute(text(
+            f"INSERT INTO progreso (usuario_id, reto_id, completado, fecha) "
+            f"SELECT {azar.format(usuarios)} + 1, {azar.format(retos)} + 1, "
+            f"{azar.format(10)} < 7, {fecha} FROM {serie}"
+        ), {"n": filas, "inicio": inicio.isoformat()})
+
+        if postgres:
+            conexion.execute(text("ANALYZE"))
+
+    with SessionLocal() as db:
+        contadores.reconciliar_totales(db)
+
+
+def medir(nombre, funcion):
+    estadisticas.cache.limpiar()
+    inicio = time.perf_counter()
+    funcion()
+    frio = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(100):
+        funcion()
+    caliente = (time.perf_counter() - inicio) / 100
+
+    print(f"{nombre:<28}{frio * 1000:>12.1f}{caliente * 1000:>14.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=5_000_000)
+    parser.add_argument("--usuarios", type=int, default=50_000)
+    parser.add_argument("--retos", type=int, default=2_000)
+    parser.add_argument("--generar", action="store_true", help="Borra y genera los datos sintéticos")
+    args = parser.parse_args()
+
+    if args.generar:
+        inicio = time.perf_counter()
+        generar(args.filas, args.usuarios, args.retos)
+        print(f"Generadas {args.filas} filas de progreso en {time.perf_counter() - inicio:.1f} s")
+
+    hasta = date.today()
+    ventanas = {
+        "7 días": (hasta - timedelta(days=6), hasta),
+        "30 días": (hasta - timedelta(days=29), hasta),
+        "1 año": (hasta - timedelta(days=DIAS - 1), hasta),
+    }
+
+    with SessionLocal() as db:
+        for etiqueta, (desde, fin) in ventanas.items():
+            print(f"\nVentana {etiqueta} ({desde} a {fin})")
+            print(f"{'estadística':<28}{'frío ms':>12}{'caché ms':>14}")
+            consultas = {
+                "categorias": lambda: estadisticas.tasa_por(db, models.MicroReto.categoria, desde, fin),
+                "dificultad": lambda: estadisticas.tasa_por(db, models.MicroReto.dificultad, desde, fin),
+                "activos-diarios": lambda: estadisticas.activos_diarios(db, desde, fin),
+                "usuarios": lambda: estadisticas.distribucion_usuarios(db, desde, fin),
+                "curva usuario 1": lambda: estadisticas.curva_usuario(db, 1, desde, fin),
+            }
+            for nombre, calcular in consultas.items():
+                medir(nombre, lambda: estadisticas.en_cache(db, nombre, desde, fin, calcular))
+
+
+if __name__ == "__main__":
+    main()
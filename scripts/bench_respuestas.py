@@ -0,0 +1,91 @@
+"""
+Archivo: bench_respuestas.py
+Descripción: Micro-benchmark de los listados: camino ORM + Pydantic (lo que
+hace FastAPI con response_model) frente a columnas + orjson
+(app/respuestas_rapidas.py), para 1k, 10k y 100k filas de Usuario y
+MicroReto. Incluye la consulta y la serialización; usa una SQLite en
+memoria propia, así que no toca la base de datos configurada.
+
+Uso:  python scripts/bench_respuestas.py --repeticiones 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import models, schemas, respuestas_rapidas
+from app.database import Base
+
+TAMANOS = (1_000, 10_000, 100_000)
+
+
+def cargar(sesion, n):
+    sesion.execute(insert(models.Usuario), [
+        {"nombre": f"Usuario {i}", "edad": 20 + i % 50, "categoria": "General",
+         "nivel": 1 + i % 10, "racha_dias": i % 30, "puntos": i % 1000, "activo": True}
+        for i in range(n)
+    ])
+    sesion.execute(insert(models.MicroReto), [
+        {"categoria": "Lógica", "dificultad": "Media",
+         "contenido": f"¿Cuánto es {i} + {i}?", "respuesta": str(2 * i)}
+        for i in range(n)
+    ])
+    sesion.commit()
+
+
+def camino_pydantic(sesion, modelo, esquema, n):
+    campo = create_model_field(name="Response", type_=list[esquema], mode="serialization")
+    objetos = sesion.query(modelo).order_by(modelo.id).limit(n).all()
+    contenido = asyncio.run(serialize_response(field=campo, response_content=objetos))
+    return JSONResponse(contenido).body
+
+
+def camino_rapido(sesion, modelo, esquema, n):
+    filas = sesion.query(*respuestas_rapidas.columnas(modelo, esquema)).order_by(modelo.id).limit(n).all()
+    return respuestas_rapidas.serializar(esquema, filas)
+
+
+def medir(Sesion, camino, modelo, esquema, n, repeticiones):
+    mejor, cuerpo = None, None
+    for _ in range(repeticiones):
+        with Sesion() as sesion:
+            inicio = time.perf_counter()
+            cuerpo = camino(sesion, modelo, esquema, n)
+            duracion = time.perf_counter() - inicio
+        mejor = duracion if mejor is None else min(mejor, duracion)
+    return mejor, cuerpo
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Sesion = sessionmaker(bind=engine)
+    with Sesion() as sesion:
+        cargar(sesion, max(TAMANOS))
+
+    print(f"{'modelo':<12}{'filas':>9}{'pydantic ms':>14}{'orjson ms':>12}{'mejora':>9}")
+    for modelo, esquema in ((models.Usuario, schemas.Usuario), (models.MicroReto, schemas.MicroReto)):
+        for n in TAMANOS:
+            lento, esperado = medir(Sesion, camino_pydantic, modelo, esquema, n, args.repeticiones)
+            rapido, obtenido = medir(Sesion, camino_rapido, modelo, esquema, n, args.repeticiones)
+            if json.loads(esperado) != json.loads(obtenido):
+                raise SystemExit(f"Los dos caminos no devuelven lo mismo para {modelo.__name__}")
+            print(f"{modelo.__name__:<12}{n:>9}{lento * 1000:>14.1f}{rapido * 1000:>12.1f}{lento / rapido:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
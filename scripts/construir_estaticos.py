@@ -0,0 +1,131 @@
+"""
+Archivo: construir_estaticos.py
+Descripción: Construye los estáticos versionados que sirve app/estaticos.py.
+Por cada archivo de app/static (salvo las subidas de los usuarios) escribe en
+ESTATICOS_DIR una copia con el hash del contenido en el nombre, sus variantes
+.gz y .br (si es texto y comprimido ocupa menos) y al final manifest.json.
+
+Uso:  python scripts/construir_estaticos.py [--limpiar]
+Se ejecuta en cada despliegue antes de arrancar los workers (ver Procfile).
+Los archivos de construcciones anteriores se conservan para las páginas que
+ya tengan los clientes; --limpiar borra los que no estén en el manifiesto nuevo.
+La variante .br requiere `pip install brotli`; sin él solo se genera .gz.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import estaticos
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Carpetas (relativas a app/static) que no se versionan: contenido de los usuarios
+EXCLUIR = ("img/uploads",)
+COMPRIMIBLES = {".css", ".js", ".mjs", ".json", ".map", ".svg", ".html", ".txt", ".xml", ".ico"}
+TAMANO_MINIMO = 256  # Por debajo, comprimir no compensa
+
+
+def _versionada(ruta: str, contenido: bytes) -> str:
+    base, extension = os.path.splitext(ruta)
+    return f"{base}.{hashlib.blake2b(contenido, digest_size=6).hexdigest()}{extension}"
+
+
+def _escribir(destino: str, ruta: str, contenido: bytes):
+    completa = os.path.join(destino, ruta)
+    os.makedirs(os.path.dirname(completa), exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(completa), suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, completa)
+
+
+def _variantes(ruta: str, contenido: bytes):
+    """
+    {codificación: bytes} de las variantes comprimidas que merecen la pena.
+    """
+    if os.path.splitext(ruta)[1].lower() not in COMPRIMIBLES or len(contenido) < TAMANO_MINIMO:
+        return {}
+    variantes = {"gzip": gzip.compress(contenido, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variantes["br"] = brotli.compress(contenido, quality=11)
+    return {codificacion: datos for codificacion, datos in variantes.items() if len(datos) < len(contenido)}
+
+
+def _origenes(origen: str):
+    for carpeta, subcarpetas, archivos in os.walk(origen):
+        relativa = os.path.relpath(carpeta, origen).replace(os.sep, "/")
+        subcarpetas[:] = sorted(
+            s for s in subcarpetas
+            if (s if relativa == "." else f"{relativa}/{s}") not in EXCLUIR
+        )
+        for nombre in sorted(archivos):
+            ruta = nombre if relativa == "." else f"{relativa}/{nombre}"
+            if ruta not in EXCLUIR and not nombre.startswith("."):
+                yield ruta
+
+
+def construir(origen: str, destino: str) -> dict:
+    manifiesto = {"archivos": {}, "comprimidos": {}}
+    for ruta in _origenes(origen):
+        with open(os.path.join(origen, ruta), "rb") as archivo:
+            contenido = archivo.read()
+        versionada = _versionada(ruta, contenido)
+        _escribir(destino, versionada, contenido)
+
+        variantes = _variantes(ruta, contenido)
+        for codificacion, datos in variantes.items():
+            _escribir(destino, versionada + estaticos.CODIFICACIONES[codificacion], datos)
+
+        manifiesto["archivos"][ruta] = versionada
+        if variantes:
+            manifiesto["comprimidos"][versionada] = sorted(variantes)
+        tamanos = ", ".join(f"{c} {len(d)} B" for c, d in sorted(variantes.items()))
+        print(f"{ruta} -> {versionada} ({len(contenido)} B{', ' + tamanos if tamanos else ''})")
+
+    # El manifiesto, lo último: hasta aquí los workers siguen con el anterior
+    _escribir(destino, estaticos.MANIFIESTO, json.dumps(manifiesto, indent=2, sort_keys=True).encode())
+    return manifiesto
+
+
+def limpiar(destino: str, manifiesto: dict) -> int:
+    vigentes = {estaticos.MANIFIESTO}
+    for versionada in manifiesto["archivos"].values():
+        vigentes.add(versionada)
+        for codificacion in manifiesto["comprimidos"].get(versionada, ()):
+            vigentes.add(versionada + estaticos.CODIFICACIONES[codificacion])
+
+    borrados = 0
+    for carpeta, _, archivos in os.walk(destino):
+        for nombre in archivos:
+            completa = os.path.join(carpeta, nombre)
+            if os.path.relpath(completa, destino).replace(os.sep, "/") not in vigentes:
+                os.remove(completa)
+                borrados += 1
+    return borrados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--origen", default=estaticos.DIRECTORIO)
+    parser.add_argument("--destino", default=estaticos.COMPILADOS)
+    parser.add_argument("--limpiar", action="store_true", help="Borra los archivos de construcciones anteriores")
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli no está instalado: solo se generan variantes .gz")
+    manifiesto = construir(args.origen, args.destino)
+    print(f"{len(manifiesto['archivos'])} archivos en {args.destino}")
+    if args.limpiar:
+        print(f"{limpiar(args.destino, manifiesto)} archivos antiguos borrados")
+
+
+if __name__ == "__main__":
+    main()
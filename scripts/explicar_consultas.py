@@ -0,0 +1,92 @@
+"""
+Archivo: explicar_consultas.py
+Descripción: Ejecuta EXPLAIN sobre las consultas que usan los routers y
+comprueba que cada una se resuelve con un índice.
+
+Uso:  python scripts/explicar_consultas.py
+Sale con código 1 si alguna consulta no usa índice.
+"""
+import os
+import sys
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+
+from app.database import engine
+from app import models, contadores
+from app.models import Usuario, MicroReto, Progreso, Gamificacion, Comunidad, usuarios_comunidad
+
+# (descripción, consulta) — mismas condiciones que en app/routers
+CONSULTAS = [
+    ("usuarios: duplicado por nombre",
+     select(Usuario.id).where(Usuario.nombre == "Ana Torres").limit(1)),
+    ("usuarios: buscar activo por nombre",
+     select(Usuario).where(Usuario.nombre == "Ana Torres", Usuario.activo == True).limit(1)),
+    ("usuarios: listado de activos paginado",
+     select(Usuario).where(Usuario.activo == True, Usuario.id > 0).order_by(Usuario.id).limit(51)),
+    ("usuarios: por id",
+     select(Usuario).where(Usuario.id == 1)),
+    ("microrretos: listado paginado",
+     select(MicroReto).where(MicroReto.id > 0).order_by(MicroReto.id).limit(51)),
+    ("progreso: por usuario",
+     select(Progreso).where(Progreso.usuario_id == 1)),
+    ("progreso: por reto",
+     select(Progreso).where(Progreso.reto_id == 1)),
+    ("progreso: ventana de fechas (estadísticas)",
+     select(Progreso.usuario_id).where(Progreso.fecha >= datetime(2026, 1, 1), Progreso.fecha < datetime(2026, 2, 1))),
+    ("progreso: listado paginado",
+     select(Progreso).where(Progreso.id > 0).order_by(Progreso.id).limit(51)),
+    ("gamificacion: por usuario",
+     select(Gamificacion).where(Gamificacion.usuario_id == 1)),
+    ("gamificacion: ranking por puntos",
+     select(Gamificacion.usuario_id, Gamificacion.puntos).order_by(Gamificacion.puntos.desc()).limit(100)),
+    ("comunidades: por id",
+     select(Comunidad).where(Comunidad.id == 1)),
+    ("usuarios_comunidad: comunidades de un usuario",
+     select(usuarios_comunidad).where(usuarios_comunidad.c.usuario_id == 1)),
+    ("usuarios_comunidad: participantes de una comunidad",
+     select(usuarios_comunidad).where(usuarios_comunidad.c.comunidad_id == 1)),
+    ("usuarios_comunidad: participantes paginados",
+     select(usuarios_comunidad.c.usuario_id).where(usuarios_comunidad.c.comunidad_id == 1, usuarios_comunidad.c.usuario_id > 0)
+     .order_by(usuarios_comunidad.c.usuario_id).limit(51)),
+    ("usuarios_comunidad: pertenencia",
+     select(usuarios_comunidad).where(usuarios_comunidad.c.usuario_id == 1, usuarios_comunidad.c.comunidad_id == 1)),
+    ("contadores: leer",
+     select(models.Contador.valor).where(models.Contador.nombre == contadores.TOTAL_USUARIOS)),
+]
+
+
+def explicar(conexion, consulta):
+    sql = str(consulta.compile(dialect=conexion.dialect, compile_kwargs={"literal_binds": True}))
+    if conexion.dialect.name == "postgresql":
+        plan = [fila[0] for fila in conexion.execute(text("EXPLAIN " + sql))]
+        usa_indice = any("Index" in linea for linea in plan)
+    else:
+        plan = [fila[-1] for fila in conexion.execute(text("EXPLAIN QUERY PLAN " + sql))]
+        usa_indice = any("USING" in linea for linea in plan)
+    return usa_indice, plan
+
+
+def main():
+    fallos = 0
+    with engine.connect() as conexion:
+        if conexion.dialect.name == "postgresql":
+            # Con tablas pequeñas el planificador prefiere leer la tabla entera;
+            # así se comprueba que el índice existe y es utilizable.
+            conexion.execute(text("SET enable_seqscan = off"))
+
+        for descripcion, consulta in CONSULTAS:
+            usa_indice, plan = explicar(conexion, consulta)
+            print(("✅ " if usa_indice else "❌ ") + descripcion)
+            for linea in plan:
+                print("      " + linea)
+            if not usa_indice:
+                fallos += 1
+
+    print(f"\n{len(CONSULTAS) - fallos}/{len(CONSULTAS)} consultas usan índice")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Archivo: prueba_carga.py
+Descripción: Prueba de carga de los endpoints de lectura en modo síncrono
+y asíncrono (DB_MODO). Levanta la aplicación con uvicorn en cada modo,
+lanza peticiones concurrentes durante un tiempo fijo y muestra
+peticiones/segundo y latencias p50/p99.
+
+Uso:  python scripts/prueba_carga.py --concurrencia 200 --segundos 20
+Requiere httpx (pip install httpx) y una DATABASE_URL con datos
+(por ejemplo, cargados con app/seed.py).
+"""
+import argparse
+import asyncio
+import collections
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUTAS = [
+    "/usuarios/1",
+    "/usuarios/?limit=50",
+    "/microrretos/1",
+    "/microrretos/?limit=50",
+    "/gamificacion/1",
+    "/comunidad/?limit=50",
+]
+
+
+def percentil(valores, p):
+    if not valores:
+        return 0.0
+    indice = min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1))))
+    return valores[indice]
+
+
+async def _cliente(httpx, base, fin, latencias, errores, numero):
+    async with httpx.AsyncClient(base_url=base, timeout=30) as cliente:
+        i = numero
+        while time.perf_counter() < fin:
+            ruta = RUTAS[i % len(RUTAS)]
+            i += 1
+            inicio = time.perf_counter()
+            try:
+                respuesta = await cliente.get(ruta)
+                if respuesta.status_code >= 500:
+                    errores.append(respuesta.status_code)
+            except httpx.HTTPError as error:
+                errores.append(type(error).__name__)
+                continue
+            latencias.append(time.perf_counter() - inicio)
+
+
+async def medir(base, concurrencia, segundos):
+    import httpx
+
+    latencias, errores = [], []
+    fin = time.perf_counter() + segundos
+    await asyncio.gather(*(
+        _cliente(httpx, base, fin, latencias, errores, n) for n in range(concurrencia)
+    ))
+    latencias.sort()
+    return {
+        "peticiones": len(latencias),
+        "rps": len(latencias) / segundos,
+        "p50_ms": percentil(latencias, 50) * 1000,
+        "p99_ms": percentil(latencias, 99) * 1000,
+        "errores": len(errores),
+        "tipos_error": dict(collections.Counter(errores)),
+    }
+
+
+def levantar_servidor(modo, puerto):
+    entorno = dict(os.environ, DB_MODO=modo)
+    proceso = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(puerto), "--log-level", "warning"],
+        cwd=RAIZ, env=entorno
+    )
+    import httpx
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{puerto}/usuarios/?limit=1", timeout=1)
+            return proceso
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proceso.terminate()
+    raise RuntimeError(f"El servidor en modo {modo} no arrancó")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrencia", type=int, default=200)
+    parser.add_argument("--segundos", type=int, default=20)
+    parser.add_argument("--puerto", type=int, default=8765)
+    parser.add_argument("--modos", default="sync,async")
+    args = parser.parse_args()
+
+    resultados = {}
+    for modo in args.modos.split(","):
+        proceso = levantar_servidor(modo, args.puerto)
+        try:
+            resultados[modo] = asyncio.run(
+                medir(f"http://127.0.0.1:{args.puerto}", args.concurrencia, args.segundos)
+            )
+        finally:
+            proceso.terminate()
+            proceso.wait()
+
+    print(f"\nConcurrencia {args.concurrencia}, {args.segundos} s por modo\n")
+    print(f"{'modo':<8}{'peticiones':>12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errores':>10}")
+    for modo, r in resultados.items():
+        print(f"{modo:<8}{r['peticiones']:>12}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['errores']:>10}")
+        if r["tipos_error"]:
+            print(f"        errores: {r['tipos_error']}")
+
+
+if __name__ == "__main__":
+    main()
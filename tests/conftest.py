@@ -0,0 +1,56 @@
+"""
+Las pruebas usan una base SQLite temporal con el esquema de Alembic. Las
+variables de entorno se fijan antes de importar la aplicación, que lee
+DATABASE_URL al importarse.
+"""
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import event
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_carpeta = tempfile.mkdtemp(prefix="microhabitos-pruebas-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_carpeta, "pruebas.db")
+
+from alembic import command  # noqa: E402
+from alembic.config import Config  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def esquema():
+    command.upgrade(Config(os.path.join(RAIZ, "alembic.ini")), "head")
+
+
+@pytest.fixture
+def db():
+    sesion = SessionLocal()
+    try:
+        yield sesion
+    finally:
+        sesion.close()
+
+
+@pytest.fixture
+def cliente():
+    # Sin `with`: no arranca el lifespan, cuyas tareas de fondo también consultan
+    return TestClient(app)
+
+
+@pytest.fixture
+def sentencias():
+    """
+    Lista con cada sentencia SQL que se ejecuta mientras dura la prueba.
+    """
+    ejecutadas = []
+
+    def antes(conexion, cursor, sentencia, parametros, contexto, executemany):
+        ejecutadas.append(sentencia)
+
+    event.listen(engine, "before_cursor_execute", antes)
+    yield ejecutadas
+    event.remove(engine, "before_cursor_execute", antes)
@@ -0,0 +1,130 @@
+import uuid
+
+import pytest
+
+from app import acumulador_puntos, models
+from app.acumulador_puntos import AcumuladorPuntos, acumulador
+from app.ranking import Ranking
+
+
+@pytest.fixture
+def usuario(db):
+    nuevo = models.Usuario(nombre=f"diferido-{uuid.uuid4().hex[:8]}", edad=20, categoria="Diferido", activo=True)
+    db.add(nuevo)
+    db.flush()
+    db.add(models.Gamificacion(usuario_id=nuevo.id, puntos=10))
+    db.commit()
+    return nuevo.id
+
+
+@pytest.fixture
+def global_vacio():
+    # El acumulador del módulo es el que usan el router y el ranking
+    acumulador.volcar()
+    yield acumulador
+    acumulador.volcar()
+
+
+def _puntos_en_base(db, usuario_id):
+    db.expire_all()
+    return db.query(models.Gamificacion).filter(models.Gamificacion.usuario_id == usuario_id).one().puntos
+
+
+class SesionQueFalla:
+    """
+    Sesión cuyo UPDATE falla; `al_cerrar` se llama desde db.close(), que en
+    el volcado va después de devolver el lote al acumulador.
+    """
+
+    def __init__(self, al_cerrar):
+        self.al_cerrar = al_cerrar
+
+    def execute(self, *argumentos, **opciones):
+        raise RuntimeError("Conexión perdida")
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.al_cerrar()
+
+
+def test_volcado(db, usuario):
+    pendientes = AcumuladorPuntos()
+    pendientes.sumar(usuario, 3)
+    pendientes.sumar(usuario, 4)
+    assert pendientes.pendiente(usuario) == 7
+
+    assert pendientes.volcar() == 1
+
+    assert pendientes.pendiente(usuario) == 0
+    assert _puntos_en_base(db, usuario) == 17
+    assert pendientes.volcar() == 0
+
+
+def test_volcado_fallido_devuelve_el_lote_sin_contarlo_dos_veces(db, usuario, monkeypatch):
+    pendientes = AcumuladorPuntos()
+    pendientes.sumar(usuario, 5)
+    vistos = []
+    monkeypatch.setattr(acumulador_puntos, "SessionLocal", lambda: SesionQueFalla(
+        lambda: vistos.append(pendientes.pendiente(usuario))
+    ))
+
+    with pytest.raises(RuntimeError):
+        pendientes.volcar()
+
+    assert vistos == [5]
+    assert pendientes.pendiente(usuario) == 5
+    assert pendientes.pendientes() == {usuario: 5}
+
+    monkeypatch.undo()
+    pendientes.sumar(usuario, 1)
+    assert pendientes.volcar() == 1
+    assert _puntos_en_base(db, usuario) == 16
+
+
+def test_reconstruccion_suma_lo_pendiente_una_vez(db, usuario, global_vacio):
+    ranking = Ranking()
+    ranking.reconstruir(db)
+    with ranking.lock:
+        acumulador.sumar(usuario, 5)
+        ranking.sumar(usuario, 5)
+
+    ranking.reconstruir(db)
+    with ranking.consultar(db) as clasificacion:
+        assert clasificacion.puntos(usuario) == 15
+
+    acumulador.volcar()
+    ranking.reconstruir(db)
+    with ranking.consultar(db) as clasificacion:
+        assert clasificacion.puntos(usuario) == 15
+
+
+def test_suma_diferida_durante_la_reconstruccion(db, usuario, global_vacio):
+    ranking = Ranking()
+    ranking.reconstruir(db)
+
+    class LecturaConSuma:
+        def execute(self, consulta):
+            filas = db.execute(consulta).all()
+            # sumar_puntos en modo diferido entre la lectura y la publicación
+            with ranking.lock:
+                acumulador.sumar(usuario, 5)
+                ranking.sumar(usuario, 5)
+            return filas
+
+    ranking.reconstruir(LecturaConSuma())
+
+    with ranking.consultar(db) as clasificacion:
+        assert clasificacion.puntos(usuario) == 15
+
+
+def test_sumar_puntos_diferido(cliente, db, usuario, global_vacio, monkeypatch):
+    monkeypatch.setattr(acumulador_puntos, "ACTIVO", True)
+
+    respuesta = cliente.patch(f"/gamificacion/{usuario}/sumar-puntos", params={"puntos": 4})
+
+    assert respuesta.json()["puntos"] == 14
+    assert _puntos_en_base(db, usuario) == 10
+    acumulador.volcar()
+    assert _puntos_en_base(db, usuario) == 14
@@ -0,0 +1,85 @@
+import uuid
+
+from app import busqueda, models
+from app.paginacion import CABECERA_CURSOR
+
+
+def _marca():
+    # Palabra que solo aparece en los datos de esta prueba
+    return "zq" + uuid.uuid4().hex[:8]
+
+
+def _reto(db, contenido, respuesta="r"):
+    reto = models.MicroReto(categoria="Busqueda", dificultad="Baja", contenido=contenido, respuesta=respuesta)
+    db.add(reto)
+    db.commit()
+    busqueda.invalidar_retos()
+    return reto.id
+
+
+def _ids(respuesta):
+    return [reto["id"] for reto in respuesta.json()]
+
+
+def test_terminos_sin_tildes_ni_mayusculas_y_por_raiz():
+    assert busqueda.terminos("Meditación para RESPIRAR") == ["medit", "respir"]
+    assert busqueda.terminos("meditar respiraciones") == ["medit", "respir"]
+
+
+def test_busca_todos_los_terminos_y_ordena_por_relevancia(cliente, db):
+    marca = _marca()
+    en_respuesta = _reto(db, f"Respirar {marca}", "Meditar")
+    en_contenido = _reto(db, f"Meditación {marca}")
+    _reto(db, "Meditación")
+
+    respuesta = cliente.get("/buscar/retos", params={"q": f"MEDITACIÓN {marca}"})
+
+    assert _ids(respuesta) == [en_contenido, en_respuesta]
+    primero, segundo = respuesta.json()
+    assert primero["relevancia"] > segundo["relevancia"]
+    assert cliente.get("/buscar/retos", params={"q": "de la"}).json() == []
+
+
+def test_paginacion_con_cursor(cliente, db):
+    marca = _marca()
+    retos = [_reto(db, f"{marca} {n}") for n in range(3)]
+
+    primera = cliente.get("/buscar/retos", params={"q": marca, "limit": 2})
+    segunda = cliente.get("/buscar/retos", params={"q": marca, "limit": 2, "cursor": primera.headers[CABECERA_CURSOR]})
+
+    assert _ids(primera) + _ids(segunda) == retos
+    assert CABECERA_CURSOR not in segunda.headers
+
+
+def test_reto_nuevo_aparece_tras_crearlo(cliente, db):
+    marca = _marca()
+    _reto(db, f"Caminar {marca}")
+    assert len(cliente.get("/buscar/retos", params={"q": marca}).json()) == 1
+
+    creado = cliente.post("/microrretos/", json={
+        "categoria": "Busqueda", "dificultad": "Baja", "contenido": f"Correr {marca}", "respuesta": "r",
+    }).json()
+
+    assert creado["id"] in _ids(cliente.get("/buscar/retos", params={"q": f"corre {marca}"}))
+
+
+def test_sugerencias_por_prefijo(cliente, db):
+    marca = _marca()
+    usuarios = {
+        nombre: models.Usuario(nombre=f"{marca}{nombre}", edad=20, categoria="Busqueda", activo=True)
+        for nombre in ("Álvaro", "alba", "Beto", "Alicia")
+    }
+    db.add_all(usuarios.values())
+    db.commit()
+    busqueda.invalidar_usuarios()
+
+    def sugerencias(prefijo, **parametros):
+        respuesta = cliente.get("/buscar/usuarios", params={"q": marca + prefijo, **parametros})
+        return [sugerencia["nombre"] for sugerencia in respuesta.json()]
+
+    assert sugerencias("AL") == [f"{marca}alba", f"{marca}Alicia", f"{marca}Álvaro"]
+    assert sugerencias("al", limit=1) == [f"{marca}alba"]
+
+    # Un usuario eliminado deja de sugerirse
+    assert cliente.delete(f"/usuarios/{usuarios['alba'].id}").status_code == 200
+    assert sugerencias("alb") == []
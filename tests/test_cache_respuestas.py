@@ -0,0 +1,106 @@
+import uuid
+
+import pytest
+
+from app import cache_respuestas
+
+
+class RedisFalso:
+    """
+    Lo que RedisCache usa de un cliente de Redis: get/set/incr sobre bytes.
+    """
+
+    def __init__(self):
+        self.datos = {}
+
+    def get(self, clave):
+        return self.datos.get(clave)
+
+    def set(self, clave, valor, ex=None):
+        self.datos[clave] = valor
+
+    def incr(self, clave):
+        self.datos[clave] = str(int(self.datos.get(clave, 0)) + 1).encode()
+        return int(self.datos[clave])
+
+
+@pytest.fixture
+def redis():
+    anterior = cache_respuestas.backend
+    falso = RedisFalso()
+    cache_respuestas.usar_backend(cache_respuestas.RedisCache(falso, ttl_s=60))
+    yield falso
+    cache_respuestas.usar_backend(anterior)
+
+
+def _categoria():
+    return f"cache-{uuid.uuid4().hex[:8]}"
+
+
+def _reto(categoria, contenido="c"):
+    return {"categoria": categoria, "dificultad": "Fácil", "contenido": contenido, "respuesta": "r"}
+
+
+def test_acierto_servido_desde_los_bytes_guardados(cliente, redis, sentencias):
+    categoria = _categoria()
+    reto = cliente.post("/microrretos/", json=_reto(categoria)).json()
+    url = f"/microrretos/{reto['id']}"
+
+    primera = cliente.get(url)
+    assert primera.status_code == 200
+    (clave,) = [clave for clave in redis.datos if clave.endswith(url + "?")]
+
+    # Lo que se sirve sale de la entrada de Redis, sin consultar la base de datos
+    etag, cabeceras, cuerpo = cache_respuestas._desempaquetar(redis.datos[clave])
+    redis.datos[clave] = cache_respuestas._empaquetar(cuerpo.replace(b'"c"', b'"desde redis"'), cabeceras)
+    sentencias.clear()
+
+    segunda = cliente.get(url)
+
+    assert sentencias == []
+    assert segunda.json()["contenido"] == "desde redis"
+    assert primera.headers["etag"] == etag
+
+
+def test_304_con_if_none_match(cliente, redis):
+    categoria = _categoria()
+    cliente.post("/comunidad/", json={"nombre_reto": "r", "categoria": categoria, "duracion": 7})
+    url = f"/comunidad/?categoria={categoria}"
+
+    etag = cliente.get(url).headers["etag"]
+    respuesta = cliente.get(url, headers={"If-None-Match": etag})
+
+    assert respuesta.status_code == 304
+    assert respuesta.content == b""
+    assert respuesta.headers["etag"] == etag
+    assert cliente.get(url, headers={"If-None-Match": '"otro"'}).status_code == 200
+
+
+def test_escrituras_de_microrretos_invalidan(cliente, redis):
+    categoria = _categoria()
+    url = f"/microrretos/?categoria={categoria}"
+    assert cliente.get(url).json() == []
+
+    reto = cliente.post("/microrretos/", json=_reto(categoria)).json()
+    assert [r["id"] for r in cliente.get(url).json()] == [reto["id"]]
+
+    cliente.put(f"/microrretos/{reto['id']}", json=_reto(categoria, "editado"))
+    assert [r["contenido"] for r in cliente.get(url).json()] == ["editado"]
+
+    cliente.delete(f"/microrretos/{reto['id']}")
+    assert cliente.get(url).json() == []
+    assert int(redis.get("cache:version:" + cache_respuestas.MICRORRETOS)) == 3
+
+
+def test_escrituras_de_comunidades_invalidan(cliente, redis):
+    categoria = _categoria()
+    url = f"/comunidad/?categoria={categoria}"
+    assert cliente.get(url).json() == []
+
+    comunidad = cliente.post("/comunidad/", json={"nombre_reto": "r", "categoria": categoria, "duracion": 7}).json()
+    assert [c["id"] for c in cliente.get(url).json()] == [comunidad["id"]]
+    assert cliente.get(f"/comunidad/{comunidad['id']}").status_code == 200
+
+    cliente.delete(f"/comunidad/{comunidad['id']}")
+    assert cliente.get(url).json() == []
+    assert cliente.get(f"/comunidad/{comunidad['id']}").status_code == 404
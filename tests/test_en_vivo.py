@@ -0,0 +1,128 @@
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from starlette.websockets import WebSocketDisconnect
+
+from app import en_vivo, models
+from app.routers import gamificacion
+
+
+@pytest.fixture
+def vivo():
+    """
+    Cliente con un solo bucle de eventos para todas las conexiones y sin
+    lifespan: los ticks del hub se dan a mano con `tick()`.
+    """
+    aplicacion = FastAPI()
+    aplicacion.include_router(gamificacion.router)
+    with TestClient(aplicacion) as cliente:
+        cliente.tick = lambda: cliente.portal.call(en_vivo.hub.tick)
+        yield cliente
+        cliente.tick()  # Sin conexiones: el hub vuelve a esperar un cursor
+    assert en_vivo.hub.conexiones == 0
+
+
+def _usuarios(db, cantidad):
+    marca = uuid.uuid4().hex[:8]
+    usuarios = [models.Usuario(nombre=f"vivo-{marca}-{n}", edad=20, categoria="Vivo", activo=True) for n in range(cantidad)]
+    db.add_all(usuarios)
+    db.flush()
+    db.add_all([models.Gamificacion(usuario_id=usuario.id, puntos=0) for usuario in usuarios])
+    db.commit()
+    return [usuario.id for usuario in usuarios]
+
+
+def _sumar(cliente, usuario_id, puntos=1):
+    assert cliente.patch(f"/gamificacion/{usuario_id}/sumar-puntos", params={"puntos": puntos}).status_code == 200
+
+
+def _puntos(mensaje):
+    assert mensaje["tipo"] == "cambios"
+    return {cambio["usuario_id"]: cambio["puntos"] for cambio in mensaje["puntos"]}
+
+
+def test_un_mensaje_por_tick_con_el_total(vivo, db):
+    (usuario,) = _usuarios(db, 1)
+    with vivo.websocket_connect("/gamificacion/en-vivo?n=1") as ws:
+        assert ws.receive_json()["tipo"] == "ranking"
+
+        for _ in range(5):
+            _sumar(vivo, usuario)
+        vivo.tick()
+        assert _puntos(ws.receive_json()) == {usuario: 5}
+
+        # Un tick sin cambios no manda nada: lo siguiente es la suma posterior
+        vivo.tick()
+        _sumar(vivo, usuario, 2)
+        vivo.tick()
+        assert _puntos(ws.receive_json()) == {usuario: 7}
+
+
+def test_canal_de_comunidad_solo_recibe_a_sus_miembros(vivo, db):
+    miembro, ajeno = _usuarios(db, 2)
+    comunidad = models.Comunidad(nombre_reto="r", categoria="Vivo", duracion=7)
+    db.add(comunidad)
+    db.commit()
+    db.execute(insert(models.usuarios_comunidad), [{"comunidad_id": comunidad.id, "usuario_id": miembro}])
+    db.commit()
+
+    with vivo.websocket_connect("/gamificacion/en-vivo") as global_, \
+            vivo.websocket_connect(f"/gamificacion/en-vivo?comunidad_id={comunidad.id}") as de_comunidad:
+        global_.receive_json()
+        de_comunidad.receive_json()
+
+        _sumar(vivo, miembro, 3)
+        _sumar(vivo, ajeno, 4)
+        vivo.tick()
+
+        assert _puntos(global_.receive_json()) == {miembro: 3, ajeno: 4}
+        assert _puntos(de_comunidad.receive_json()) == {miembro: 3}
+
+        # Un cambio solo de fuera de la comunidad no le llega
+        _sumar(vivo, ajeno)
+        _sumar(vivo, miembro)
+        vivo.tick()
+        assert _puntos(de_comunidad.receive_json()) == {miembro: 4}
+
+
+def test_comunidad_inexistente(vivo):
+    with pytest.raises(WebSocketDisconnect) as cierre:
+        with vivo.websocket_connect("/gamificacion/en-vivo?comunidad_id=999999") as ws:
+            ws.receive_json()
+    assert cierre.value.code == 1008
+
+
+def test_cliente_con_la_cola_llena_se_desconecta(vivo, monkeypatch):
+    monkeypatch.setattr(en_vivo, "COLA", 2)
+
+    async def rafaga():
+        # Sin ceder el bucle: el cliente no tiene ocasión de leer
+        for n in range(3):
+            en_vivo.hub.publicar(en_vivo.GLOBAL, f'{{"n": {n}}}')
+
+    with vivo.websocket_connect("/gamificacion/en-vivo") as ws:
+        ws.receive_json()
+        assert en_vivo.hub.conexiones == 1
+
+        vivo.portal.call(rafaga)
+
+        assert en_vivo.hub.conexiones == 0
+        with pytest.raises(WebSocketDisconnect) as cierre:
+            ws.receive_json()
+        assert cierre.value.code == 1013
+
+
+def test_partir_de_toma_el_menor_cursor_hasta_la_primera_lectura():
+    hub = en_vivo.Hub()
+    hub.partir_de(10)
+    hub.partir_de(5)
+    hub.partir_de(8)
+    assert hub._desde == 5
+
+    # Ya leyendo: un cliente nuevo no hace retroceder al hub
+    hub._iniciado = True
+    hub.partir_de(2)
+    assert hub._desde == 5
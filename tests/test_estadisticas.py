@@ -0,0 +1,126 @@
+import uuid
+from datetime import datetime
+
+from app import contadores, models
+
+
+def _progresos(db, *filas):
+    """
+    Crea retos de categorías nuevas y un progreso por cada
+    (usuario, categoría, dificultad, completado, fecha). Devuelve el
+    sufijo de las categorías y los ids de los usuarios.
+    """
+    marca = uuid.uuid4().hex[:8]
+    usuarios = {}
+    retos = {}
+    for usuario, categoria, dificultad, _, _ in filas:
+        usuarios.setdefault(usuario, models.Usuario(nombre=f"estadisticas-{marca}-{usuario}", edad=20,
+                                                    categoria="Estadisticas", activo=True))
+        retos.setdefault((categoria, dificultad), models.MicroReto(categoria=f"{categoria}-{marca}", dificultad=dificultad,
+                                                                   contenido="c", respuesta="r"))
+    db.add_all(list(usuarios.values()) + list(retos.values()))
+    db.flush()
+    db.add_all([
+        models.Progreso(usuario_id=usuarios[usuario].id, reto_id=retos[(categoria, dificultad)].id,
+                        completado=completado, fecha=fecha)
+        for usuario, categoria, dificultad, completado, fecha in filas
+    ])
+    contadores.incrementar(db, contadores.TOTAL_PROGRESOS, len(filas))
+    db.commit()
+    return marca, {usuario: fila.id for usuario, fila in usuarios.items()}
+
+
+def test_tasa_por_categoria_y_dificultad(cliente, db):
+    # Cada prueba usa un año propio: la base es compartida
+    marca, _ = _progresos(
+        db,
+        ("a", "Mate", "Baja", True, datetime(2001, 5, 1, 9)),
+        ("a", "Mate", "Baja", False, datetime(2001, 5, 2, 9)),
+        ("b", "Mate", "Alta", True, datetime(2001, 5, 2, 23, 59)),
+        ("b", "Letras", "Alta", False, datetime(2001, 5, 3, 0, 0)),  # Fuera de la ventana
+    )
+    ventana = {"desde": "2001-05-01", "hasta": "2001-05-02"}
+
+    categorias = cliente.get("/reportes/estadisticas/categorias", params=ventana).json()
+    dificultad = cliente.get("/reportes/estadisticas/dificultad", params=ventana).json()
+
+    assert [g for g in categorias if g["grupo"].endswith(marca)] == [
+        {"grupo": f"Mate-{marca}", "intentos": 3, "completados": 2, "tasa": 0.6667},
+    ]
+    assert dificultad == [
+        {"grupo": "Alta", "intentos": 1, "completados": 1, "tasa": 1.0},
+        {"grupo": "Baja", "intentos": 2, "completados": 1, "tasa": 0.5},
+    ]
+
+
+def test_activos_diarios_serie_continua(cliente, db):
+    _progresos(
+        db,
+        ("a", "Mate", "Baja", True, datetime(2002, 5, 1, 9)),
+        ("a", "Mate", "Baja", False, datetime(2002, 5, 1, 18)),
+        ("b", "Mate", "Baja", False, datetime(2002, 5, 1, 20)),
+        ("b", "Mate", "Baja", True, datetime(2002, 5, 4, 8)),
+    )
+
+    respuesta = cliente.get("/reportes/estadisticas/activos-diarios",
+                            params={"desde": "2002-05-01", "hasta": "2002-05-04"}).json()
+
+    assert respuesta == {
+        "dias": ["2002-05-01", "2002-05-02", "2002-05-03", "2002-05-04"],
+        "usuarios": [2, 0, 0, 1],
+        "media": 0.75,
+        "maximo": 2,
+    }
+
+
+def test_curva_y_distribucion_por_usuario(cliente, db):
+    _, usuarios = _progresos(
+        db,
+        ("a", "Mate", "Baja", True, datetime(2003, 5, 1, 9)),
+        ("a", "Mate", "Baja", True, datetime(2003, 5, 1, 10)),
+        ("a", "Mate", "Baja", False, datetime(2003, 5, 2, 9)),
+        ("a", "Mate", "Baja", True, datetime(2003, 5, 3, 9)),
+        ("b", "Mate", "Baja", False, datetime(2003, 5, 2, 9)),
+    )
+    ventana = {"desde": "2003-05-01", "hasta": "2003-05-03"}
+
+    curva = cliente.get(f"/reportes/estadisticas/usuarios/{usuarios['a']}", params=ventana).json()
+    distribucion = cliente.get("/reportes/estadisticas/usuarios", params=ventana).json()
+
+    assert curva == {
+        "usuario_id": usuarios["a"],
+        "dias": ["2003-05-01", "2003-05-03"],
+        "completados": [2, 1],
+        "acumulado": [2, 3],
+    }
+    assert distribucion["usuarios"] == 2
+    assert distribucion["media"] == 1.5
+    assert distribucion["sin_completar"] == 1
+
+
+def test_cache_hasta_que_entra_progreso_nuevo(cliente, db):
+    marca, usuarios = _progresos(db, ("a", "Mate", "Baja", True, datetime(2004, 5, 1, 9)))
+    ventana = {"desde": "2004-05-01", "hasta": "2004-05-01"}
+
+    def mate():
+        categorias = cliente.get("/reportes/estadisticas/categorias", params=ventana).json()
+        return [g["intentos"] for g in categorias if g["grupo"] == f"Mate-{marca}"]
+
+    assert mate() == [1]
+
+    # Sin pasar por el contador la entrada sigue valiendo
+    reto = db.query(models.MicroReto).filter(models.MicroReto.categoria == f"Mate-{marca}").one()
+    db.add(models.Progreso(usuario_id=usuarios["a"], reto_id=reto.id, completado=False,
+                           fecha=datetime(2004, 5, 1, 10)))
+    db.commit()
+    assert mate() == [1]
+
+    contadores.incrementar(db, contadores.TOTAL_PROGRESOS)
+    db.commit()
+    assert mate() == [2]
+
+
+def test_ventana_invertida(cliente):
+    respuesta = cliente.get("/reportes/estadisticas/categorias", params={"desde": "2005-05-02", "hasta": "2005-05-01"})
+
+    assert respuesta.status_code == 400
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import delete
+
+from app import eventos, models
+from app.paginacion import CABECERA_CURSOR
+
+ANTIGUO = timedelta(minutes=5)
+
+
+@pytest.fixture
+def feed(db):
+    """
+    Tabla de eventos vacía; `feed(id, tipo, antiguo)` inserta un evento con ese id.
+    """
+    db.execute(delete(models.Evento))
+    db.commit()
+
+    def insertar(*ids, tipo="progreso.creado", antiguo=False):
+        creado = datetime.utcnow() - (ANTIGUO if antiguo else timedelta())
+        db.add_all([models.Evento(id=id_, tipo=tipo, entidad_id=id_, datos={}, creado=creado) for id_ in ids])
+        db.commit()
+
+    yield insertar
+    db.execute(delete(models.Evento))
+    db.commit()
+
+
+def _ids(filas):
+    return [fila.id for fila in filas]
+
+
+def test_leer_se_para_en_un_hueco_reciente(db, feed):
+    # El 3 aún no se ha confirmado: el 4 espera
+    feed(1, 2, 4)
+
+    filas, cursor, retenidos = eventos.leer(db, 0, 100)
+
+    assert _ids(filas) == [1, 2]
+    assert cursor == 2
+    assert retenidos
+
+
+def test_leer_desde_cero_no_se_salta_el_primer_id(db, feed):
+    # El 1 está pendiente y el 2 ya confirmado
+    feed(2)
+
+    filas, cursor, retenidos = eventos.leer(db, 0, 100)
+
+    assert filas == [] and cursor == 0 and retenidos
+    assert eventos.horizonte(db) == 0
+
+
+def test_leer_pasa_un_hueco_caducado(db, feed):
+    # El 2 se deshizo hace rato: el hueco ya no retiene al 3
+    feed(1, 3, antiguo=True)
+
+    filas, cursor, retenidos = eventos.leer(db, 0, 100)
+
+    assert _ids(filas) == [1, 3]
+    assert cursor == 3
+    assert not retenidos
+    assert eventos.horizonte(db) == 3
+
+
+def test_leer_desde_cero_tras_una_purga(db, feed):
+    # Los ids purgados no son un hueco: la primera fila ya es antigua
+    feed(50, 51, antiguo=True)
+    feed(52)
+
+    filas, cursor, _ = eventos.leer(db, 0, 100)
+
+    assert _ids(filas) == [50, 51, 52]
+    assert eventos.horizonte(db) == 52
+
+
+def test_filtro_por_tipo_avanza_el_cursor(db, feed):
+    feed(1, 2, tipo="usuario.creado")
+    feed(3, tipo="progreso.creado")
+    feed(4, tipo="usuario.eliminado")
+
+    filas, cursor, _ = eventos.leer(db, 0, 100, "progreso.")
+    assert _ids(filas) == [3]
+    assert cursor == 4
+
+    filas, cursor, _ = eventos.leer(db, 0, 2, "progreso.")
+    assert filas == []
+    assert cursor == 2
+
+
+def test_cursor_purgado_devuelve_410(cliente, feed):
+    feed(10, 11, 12, antiguo=True)
+
+    assert cliente.get("/eventos", params={"desde": 5}).status_code == 410
+
+    respuesta = cliente.get("/eventos", params={"desde": 9})
+    assert respuesta.status_code == 200
+    assert [evento["id"] for evento in respuesta.json()] == [10, 11, 12]
+    assert respuesta.headers[CABECERA_CURSOR] == "12"
@@ -0,0 +1,73 @@
+import uuid
+
+from sqlalchemy import select
+
+from app import models
+
+CSV = {"content-type": "text/csv"}
+
+
+def _prefijo():
+    return f"imp-{uuid.uuid4().hex[:8]}"
+
+
+def test_csv_con_saltos_de_linea_entre_comillas(cliente, db):
+    marca = _prefijo()
+    cuerpo = (
+        "categoria,dificultad,contenido,respuesta\n"
+        f'{marca},Fácil,"Primera línea\nsegunda línea, con coma",r1\n'
+        f'{marca},Media,"Dice ""hola""\n\ny sigue",r2\n'
+        f"{marca},Difícil,Una sola línea,r3\n"
+    )
+
+    respuesta = cliente.post("/microrretos/importar", content=cuerpo.encode(), headers=CSV)
+
+    assert respuesta.json() == {"insertados": 3, "con_error": 0, "errores": []}
+    contenidos = db.execute(
+        select(models.MicroReto.contenido).where(models.MicroReto.categoria == marca).order_by(models.MicroReto.id)
+    ).scalars().all()
+    assert contenidos == ["Primera línea\nsegunda línea, con coma", 'Dice "hola"\n\ny sigue', "Una sola línea"]
+
+
+def test_csv_errores_por_linea(cliente):
+    marca = _prefijo()
+    cuerpo = (
+        "nombre,edad,categoria\n"
+        f"{marca}-a,20,A\n"
+        f"{marca}-b,veinte,A\n"
+        "\n"
+        f"{marca}-c,21\n"
+        f'"{marca}-d",22,"B\nC"\n'
+        f"{marca}-e,no,A\n"
+    )
+
+    respuesta = cliente.post("/usuarios/importar", content=cuerpo.encode(), headers=CSV).json()
+
+    # Número de línea del archivo donde empieza la fila (la cabecera es la 1)
+    assert respuesta["insertados"] == 2
+    assert [error["fila"] for error in respuesta["errores"]] == [3, 5, 8]
+    assert respuesta["errores"][1]["error"] == "Se esperaban 3 columnas y hay 2"
+    assert "edad" in respuesta["errores"][0]["error"]
+
+
+def test_nombres_repetidos_en_el_archivo_y_en_la_base(cliente, db):
+    marca = _prefijo()
+    cliente.post("/usuarios/", json={"nombre": f"{marca}-existe", "edad": 30, "categoria": "A"})
+    filas = [
+        {"nombre": f"{marca}-nuevo", "edad": 20, "categoria": "A"},
+        {"nombre": f"{marca}-existe", "edad": 20, "categoria": "A"},
+        {"nombre": f"{marca}-nuevo", "edad": 25, "categoria": "B"},
+        {"nombre": f"{marca}-otro", "edad": 20, "categoria": "A"},
+    ]
+
+    respuesta = cliente.post("/usuarios/importar", json=filas).json()
+
+    assert respuesta["insertados"] == 2
+    assert respuesta["errores"] == [
+        {"fila": 2, "error": "El usuario ya existe"},
+        {"fila": 3, "error": "El usuario ya existe"},
+    ]
+    nombres = db.execute(
+        select(models.Usuario.nombre, models.Usuario.edad).where(models.Usuario.nombre.like(f"{marca}-%"))
+    ).all()
+    assert sorted(nombres) == [(f"{marca}-existe", 30), (f"{marca}-nuevo", 20), (f"{marca}-otro", 20)]
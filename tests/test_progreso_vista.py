@@ -0,0 +1,25 @@
+from app import models
+
+
+def _crear_progresos(db, cantidad: int):
+    usuarios = [models.Usuario(nombre=f"vista-{n}", edad=20, categoria="Pruebas", activo=True) for n in range(cantidad)]
+    retos = [models.MicroReto(categoria="Pruebas", dificultad="Fácil", contenido=f"Reto {n}", respuesta="r") for n in range(cantidad)]
+    db.add_all(usuarios + retos)
+    db.flush()
+    db.add_all([
+        models.Progreso(usuario_id=usuario.id, reto_id=reto.id, completado=n % 2 == 0)
+        for n, (usuario, reto) in enumerate(zip(usuarios, retos))
+    ])
+    db.commit()
+
+
+def test_vista_progreso_una_sola_consulta(cliente, db, sentencias):
+    # Usuario y reto llegan por JOIN: el número de consultas no depende de las filas
+    _crear_progresos(db, 30)
+    sentencias.clear()
+
+    respuesta = cliente.get("/progreso/vista?limit=25")
+
+    assert respuesta.status_code == 200
+    assert "vista-0" in respuesta.text and "Reto 0" in respuesta.text
+    assert len(sentencias) == 1, sentencias
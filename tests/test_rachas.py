@@ -0,0 +1,118 @@
+import uuid
+from datetime import date, datetime
+
+import pytest
+
+from app import models, rachas
+
+LUNES = date(2026, 3, 2)
+
+
+@pytest.fixture
+def usuario(db):
+    nuevo = models.Usuario(nombre=f"racha-{uuid.uuid4().hex[:8]}", edad=20, categoria="Rachas", activo=True)
+    db.add(nuevo)
+    db.commit()
+    return nuevo.id
+
+
+def _estado(db, usuario_id):
+    db.expire_all()
+    usuario = db.get(models.Usuario, usuario_id)
+    return usuario.racha_dias, usuario.puntos, usuario.nivel, usuario.ultima_actividad
+
+
+def _completar(db, usuario_id, *dias):
+    for dia in dias:
+        rachas.registrar_actividad(db, usuario_id, datetime(dia.year, dia.month, dia.day, 18))
+    db.commit()
+
+
+def test_primera_actividad(db, usuario):
+    _completar(db, usuario, LUNES)
+
+    assert _estado(db, usuario) == (1, 10, 1, LUNES)
+
+
+def test_mismo_dia_no_alarga_la_racha(db, usuario):
+    _completar(db, usuario, LUNES, LUNES)
+
+    assert _estado(db, usuario) == (1, 20, 1, LUNES)
+
+
+def test_dia_siguiente_continua_la_racha(db, usuario):
+    _completar(db, usuario, date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 4))
+
+    assert _estado(db, usuario) == (3, 30, 1, date(2026, 3, 4))
+
+
+def test_un_dia_sin_actividad_rompe_la_racha(db, usuario):
+    _completar(db, usuario, date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 5))
+
+    assert _estado(db, usuario) == (1, 30, 1, date(2026, 3, 5))
+
+
+def test_evento_atrasado_solo_suma_puntos(db, usuario):
+    _completar(db, usuario, date(2026, 3, 2), date(2026, 3, 3), date(2026, 3, 1))
+
+    assert _estado(db, usuario) == (2, 30, 1, date(2026, 3, 3))
+
+
+def test_nivel_sube_cada_100_puntos(db, usuario):
+    _completar(db, usuario, *[LUNES] * 10)
+
+    assert _estado(db, usuario)[1:3] == (100, 2)
+
+
+def test_registrar_actividades_las_ordena_por_fecha(db, usuario):
+    rachas.registrar_actividades(db, [
+        (usuario, datetime(2026, 3, 4, 9)),
+        (usuario, datetime(2026, 3, 2, 9)),
+        (usuario, datetime(2026, 3, 3, 9)),
+    ])
+    db.commit()
+
+    assert _estado(db, usuario) == (3, 30, 1, date(2026, 3, 4))
+
+
+def test_recalcular_todos(db):
+    reto = models.MicroReto(categoria="Rachas", dificultad="Fácil", contenido="c", respuesta="r")
+    seguida, rota, inactiva = [
+        models.Usuario(nombre=f"recalculo-{uuid.uuid4().hex[:8]}", edad=20, categoria="Rachas", activo=True,
+                       racha_dias=9, puntos=999, nivel=9)
+        for _ in range(3)
+    ]
+    db.add_all([reto, seguida, rota, inactiva])
+    db.flush()
+
+    def progreso(usuario, dia, hora=12, completado=True):
+        return models.Progreso(usuario_id=usuario.id, reto_id=reto.id, completado=completado,
+                               fecha=datetime(2026, 3, dia, hora))
+
+    db.add_all([
+        # Tres días seguidos, dos retos el último
+        progreso(seguida, 2), progreso(seguida, 3), progreso(seguida, 4, 8), progreso(seguida, 4, 20),
+        progreso(seguida, 5, completado=False),
+        # Hueco el día 3
+        progreso(rota, 1), progreso(rota, 2), progreso(rota, 4),
+        progreso(inactiva, 4, completado=False),
+    ])
+    db.commit()
+
+    assert rachas.recalcular_todos(db) >= 2
+
+    assert _estado(db, seguida.id) == (3, 40, 1, date(2026, 3, 4))
+    assert _estado(db, rota.id) == (1, 30, 1, date(2026, 3, 4))
+    assert _estado(db, inactiva.id) == (0, 0, 1, None)
+
+
+def test_crear_usuario_ignora_los_valores_calculados(cliente):
+    respuesta = cliente.post("/usuarios/", json={
+        "nombre": f"calculados-{uuid.uuid4().hex[:8]}", "edad": 20, "categoria": "Rachas",
+        "nivel": 7, "racha_dias": 30, "puntos": 5000,
+    })
+
+    assert respuesta.status_code == 201
+    assert {clave: respuesta.json()[clave] for clave in ("nivel", "racha_dias", "puntos")} == {
+        "nivel": 1, "racha_dias": 0, "puntos": 0,
+    }
@@ -0,0 +1,128 @@
+import uuid
+
+from sqlalchemy import insert, update
+
+from app import models
+from app.ranking import Clasificacion, Ranking
+
+
+def _usuarios(db, *puntos):
+    """
+    Un usuario con gamificación por cada valor de `puntos`, todos de una
+    categoría nueva. Devuelve (categoría, [usuario_id]).
+    """
+    categoria = f"ranking-{uuid.uuid4().hex[:8]}"
+    usuarios = [models.Usuario(nombre=f"{categoria}-{n}", edad=20, categoria=categoria, activo=True) for n in range(len(puntos))]
+    db.add_all(usuarios)
+    db.flush()
+    db.add_all([models.Gamificacion(usuario_id=usuario.id, puntos=p) for usuario, p in zip(usuarios, puntos)])
+    db.commit()
+    return categoria, [usuario.id for usuario in usuarios]
+
+
+def _tramo(ranking, db, **filtro):
+    with ranking.consultar(db, **filtro) as clasificacion:
+        return [(usuario_id, puntos) for _, usuario_id, puntos in clasificacion.tramo(0, 100)]
+
+
+class LecturaConCambio:
+    """
+    Sesión para `reconstruir` que ejecuta `cambio` justo después de leer la
+    clasificación y antes de que se publique (una petición concurrente).
+    """
+
+    def __init__(self, db, cambio):
+        self.db = db
+        self.cambio = cambio
+
+    def execute(self, consulta):
+        filas = self.db.execute(consulta).all()
+        self.cambio()
+        return filas
+
+
+def test_empates_por_id():
+    clasificacion = Clasificacion()
+    for usuario_id, puntos in [(7, 10), (3, 10), (5, 20), (9, 10)]:
+        clasificacion.fijar(usuario_id, puntos)
+
+    assert clasificacion.tramo(0, 10) == [(1, 5, 20), (2, 3, 10), (3, 7, 10), (4, 9, 10)]
+    assert [clasificacion.posicion(u) for u in (5, 3, 7, 9)] == [1, 2, 3, 4]
+    assert clasificacion.tramo(2, 3) == [(3, 7, 10)]
+
+    clasificacion.fijar(9, 30)
+    assert clasificacion.posicion(9) == 1 and clasificacion.posicion(7) == 4
+
+
+def test_suma_concurrente_con_la_reconstruccion(db):
+    categoria, (a, b) = _usuarios(db, 10, 4)
+    ranking = Ranking()
+    ranking.reconstruir(db)
+
+    def suma_concurrente():
+        # Lo que hace sumar_puntos: UPDATE ... RETURNING, commit y ranking.sumar
+        db.execute(update(models.Gamificacion).where(models.Gamificacion.usuario_id == a).values(puntos=15))
+        db.commit()
+        ranking.sumar(a, 5, total=15)
+
+    ranking.reconstruir(LecturaConCambio(db, suma_concurrente))
+
+    # La lectura no la incluía: se repite con el total, sin contarla dos veces
+    assert _tramo(ranking, db, categoria=categoria) == [(a, 15), (b, 4)]
+    ranking.reconstruir(db)
+    assert _tramo(ranking, db, categoria=categoria) == [(a, 15), (b, 4)]
+
+
+def test_suma_ya_leida_no_se_cuenta_dos_veces(db):
+    categoria, (a,) = _usuarios(db, 10)
+    ranking = Ranking()
+    ranking.reconstruir(db)
+
+    db.execute(update(models.Gamificacion).where(models.Gamificacion.usuario_id == a).values(puntos=13))
+    db.commit()
+    ranking.sumar(a, 3, total=13)
+
+    ranking.reconstruir(LecturaConCambio(db, lambda: ranking.sumar(a, 0, total=13)))
+
+    assert _tramo(ranking, db, categoria=categoria) == [(a, 13)]
+
+
+def test_quitar(db):
+    categoria, (a, b, c) = _usuarios(db, 5, 9, 1)
+    ranking = Ranking()
+    ranking.reconstruir(db)
+
+    ranking.quitar(b)
+
+    assert _tramo(ranking, db, categoria=categoria) == [(a, 5), (c, 1)]
+    with ranking.consultar(db) as clasificacion:
+        assert b not in clasificacion
+        assert clasificacion.posicion(b) is None
+
+
+def test_filtro_por_comunidad(db):
+    categoria, (a, b, c) = _usuarios(db, 5, 9, 7)
+    comunidad = models.Comunidad(nombre_reto="r", categoria=categoria, duracion=7)
+    db.add(comunidad)
+    db.commit()
+    db.execute(insert(models.usuarios_comunidad), [
+        {"comunidad_id": comunidad.id, "usuario_id": a},
+        {"comunidad_id": comunidad.id, "usuario_id": c},
+    ])
+    db.commit()
+    ranking = Ranking()
+
+    assert _tramo(ranking, db, comunidad_id=comunidad.id) == [(c, 7), (a, 5)]
+
+    # Los cambios llegan a las comunidades ya cargadas
+    ranking.sumar(a, 10)
+    ranking.sumar(b, 10)
+    assert _tramo(ranking, db, comunidad_id=comunidad.id) == [(a, 15), (c, 7)]
+    ranking.quitar(c)
+    assert _tramo(ranking, db, comunidad_id=comunidad.id) == [(a, 15)]
+
+    # Tras un cambio de miembros se vuelve a cargar
+    db.execute(insert(models.usuarios_comunidad), [{"comunidad_id": comunidad.id, "usuario_id": b}])
+    db.commit()
+    ranking.invalidar_comunidad(comunidad.id)
+    assert _tramo(ranking, db, comunidad_id=comunidad.id) == [(b, 19), (a, 15)]
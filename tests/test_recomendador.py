@@ -0,0 +1,82 @@
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from app import models
+from app.recomendador import Recomendador, dificultad_para
+
+
+def _catalogo(db, **por_dificultad):
+    """
+    Retos de una categoría nueva: {dificultad: cantidad}. Devuelve
+    (categoría, {dificultad: [reto_id]}).
+    """
+    categoria = f"recomendador-{uuid.uuid4().hex[:8]}"
+    retos = {
+        dificultad: [models.MicroReto(categoria=categoria, dificultad=dificultad, contenido="c", respuesta="r")
+                     for _ in range(cantidad)]
+        for dificultad, cantidad in por_dificultad.items()
+    }
+    db.add_all([reto for lista in retos.values() for reto in lista])
+    db.commit()
+    return categoria, {dificultad: [reto.id for reto in lista] for dificultad, lista in retos.items()}
+
+
+def _usuario(db, categoria, intentos=()):
+    usuario = models.Usuario(nombre=f"{categoria}-{uuid.uuid4().hex[:4]}", edad=20, categoria=categoria, activo=True)
+    db.add(usuario)
+    db.flush()
+    inicio = datetime(2026, 3, 1)
+    db.add_all([
+        models.Progreso(usuario_id=usuario.id, reto_id=reto_id, completado=completado, fecha=inicio + timedelta(minutes=n))
+        for n, (reto_id, completado) in enumerate(intentos)
+    ])
+    db.commit()
+    return usuario.id
+
+
+def test_dificultad_segun_la_tasa_de_acierto():
+    assert dificultad_para([]) == "Baja"
+    assert dificultad_para([True, False, False]) == "Baja"
+    assert dificultad_para([True, False]) == "Media"
+    assert dificultad_para([True] * 4 + [False]) == "Alta"
+
+
+def test_recomienda_retos_sin_intentar_de_su_dificultad(db):
+    categoria, retos = _catalogo(db, Baja=2, Media=2, Alta=1)
+    baja, media = retos["Baja"], retos["Media"]
+    recomendador = Recomendador()
+
+    # Sin historial: uno de los de dificultad Baja
+    assert recomendador.siguiente(db, _usuario(db, categoria), categoria) in baja
+
+    # Acierta la mitad y ya intentó un reto de Media
+    usuario = _usuario(db, categoria, [(baja[0], True), (media[0], False)])
+    assert recomendador.siguiente(db, usuario, categoria) == media[1]
+
+    # Lo que se registra después también cuenta
+    recomendador.registrar(usuario, media[1], True)
+    recomendador.registrar(usuario, retos["Alta"][0], True)
+    assert recomendador.siguiente(db, usuario, categoria) == baja[1]
+    recomendador.registrar(usuario, baja[1], True)
+    assert recomendador.siguiente(db, usuario, categoria) is None
+
+
+def test_reconstruir_no_bloquea_registrar(db):
+    categoria, _ = _catalogo(db, Baja=1)
+    recomendador = Recomendador()
+    recomendador.reconstruir(db)
+    recomendador.invalidar()
+    terminados = []
+
+    class LecturaConRegistro:
+        def execute(self, consulta):
+            # Otra petición del worker mientras se lee el catálogo
+            hilo = threading.Thread(target=lambda: (recomendador.registrar(1, 1, True), terminados.append(True)))
+            hilo.start()
+            hilo.join(timeout=5)
+            return db.execute(consulta).all()
+
+    recomendador.asegurar(LecturaConRegistro())
+
+    assert terminados == [True]
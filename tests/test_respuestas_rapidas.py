@@ -0,0 +1,64 @@
+import json
+import uuid
+
+from sqlalchemy import select
+
+from app import models, respuestas_rapidas, schemas
+from app.paginacion import CABECERA_CURSOR
+
+
+def _como_pydantic(esquema, objetos):
+    return [esquema.model_validate(objeto).model_dump(mode="json") for objeto in objetos]
+
+
+def test_listado_igual_que_con_pydantic(cliente, db):
+    categoria = f"rapidas-{uuid.uuid4().hex[:8]}"
+    db.add_all([models.Usuario(nombre=f"{categoria}-{n}", edad=20 + n, categoria=categoria, activo=True,
+                               foto="abc" if n == 1 else None) for n in range(3)])
+    db.commit()
+
+    respuesta = cliente.get("/usuarios/", params={"categoria": categoria, "limit": 2})
+
+    usuarios = db.scalars(select(models.Usuario).where(models.Usuario.categoria == categoria)
+                          .order_by(models.Usuario.id)).all()
+    cuerpo = json.loads(respuesta.content)
+    assert cuerpo == _como_pydantic(schemas.Usuario, usuarios[:2])
+    # Mismo orden de campos que el esquema
+    assert list(cuerpo[0]) == list(schemas.Usuario.model_fields)
+    assert respuesta.headers["content-type"] == "application/json"
+    assert respuesta.headers[CABECERA_CURSOR] == str(usuarios[1].id)
+
+    siguiente = cliente.get("/usuarios/", params={"categoria": categoria, "cursor": usuarios[1].id})
+    assert json.loads(siguiente.content) == _como_pydantic(schemas.Usuario, usuarios[2:])
+    assert CABECERA_CURSOR not in siguiente.headers
+
+
+def test_listado_en_cache_igual_que_con_pydantic(cliente, db):
+    categoria = f"rapidas-{uuid.uuid4().hex[:8]}"
+    retos = [models.MicroReto(categoria=categoria, dificultad=d, contenido="¿ñ?", respuesta="r") for d in ("Baja", "Alta")]
+    db.add_all(retos)
+    db.commit()
+
+    primera = cliente.get("/microrretos/", params={"categoria": categoria})
+    segunda = cliente.get("/microrretos/", params={"categoria": categoria})
+
+    assert json.loads(primera.content) == _como_pydantic(schemas.MicroReto, retos)
+    assert segunda.content == primera.content
+
+
+def test_columnas_en_el_orden_del_esquema():
+    assert [c.key for c in respuestas_rapidas.columnas(models.Comunidad, schemas.Comunidad)] == [
+        "nombre_reto", "categoria", "duracion", "id",
+    ]
+    assert respuestas_rapidas.serializar(schemas.Comunidad, [("r", "c", 7, 1)]) == (
+        b'[{"nombre_reto":"r","categoria":"c","duracion":7,"id":1}]'
+    )
+
+
+def test_desactivado_devuelve_los_objetos(monkeypatch):
+    monkeypatch.setattr(respuestas_rapidas, "ACTIVO", False)
+    elementos = [object()]
+
+    assert respuestas_rapidas.cuerpo(schemas.Comunidad, elementos) is elementos
+    assert respuestas_rapidas.responder(schemas.Comunidad, elementos) is elementos
+    assert respuestas_rapidas.seleccion(models.Comunidad, schemas.Comunidad).column_descriptions[0]["entity"] is models.Comunidad
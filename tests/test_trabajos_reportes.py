@@ -0,0 +1,97 @@
+import os
+import time
+
+import pytest
+
+from app import trabajos_reportes
+
+
+def _pdf(carpeta, nombre, acceso, creado=None):
+    ruta = os.path.join(carpeta, nombre)
+    with open(ruta, "wb") as archivo:
+        archivo.write(b"x" * 100)
+    ahora = time.time()
+    os.utime(ruta, (ahora - acceso, ahora - (creado if creado is not None else acceso)))
+    return ruta
+
+
+def _cola(carpeta, max_bytes):
+    return trabajos_reportes.ColaReportes(str(carpeta), 1, 4, 3600, max_bytes)
+
+
+def test_limpiar_borra_los_descargados_hace_mas_tiempo(tmp_path):
+    cola = _cola(tmp_path, max_bytes=250)
+    antiguo = _pdf(tmp_path, "ranking-a.pdf", acceso=300)
+    medio = _pdf(tmp_path, "ranking-b.pdf", acceso=200)
+    nuevo = _pdf(tmp_path, "ranking-c.pdf", acceso=100)
+    # Descargar el más antiguo lo pone el último en salir
+    cola.usado(antiguo)
+
+    assert cola.limpiar() == 1
+
+    assert sorted(os.listdir(tmp_path)) == ["ranking-a.pdf", "ranking-c.pdf"]
+    assert not os.path.exists(medio) and os.path.exists(nuevo)
+
+
+def test_limpiar_por_edad_antes_que_por_tamano(tmp_path):
+    cola = _cola(tmp_path, max_bytes=150)
+    _pdf(tmp_path, "ranking-viejo.pdf", acceso=10, creado=7200)
+    _pdf(tmp_path, "ranking-a.pdf", acceso=300)
+    _pdf(tmp_path, "ranking-b.pdf", acceso=100)
+
+    assert cola.limpiar() == 2
+
+    assert os.listdir(tmp_path) == ["ranking-b.pdf"]
+
+
+def test_recortar_conserva_el_recien_generado(tmp_path):
+    cola = _cola(tmp_path, max_bytes=50)
+    anterior = _pdf(tmp_path, "ranking-a.pdf", acceso=100)
+    generado = _pdf(tmp_path, "ranking-b.pdf", acceso=500)
+
+    cola._recortar(conservar=generado)
+
+    assert not os.path.exists(anterior) and os.path.exists(generado)
+
+
+def _descriptores():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_renderizar_no_deja_descriptores_ni_temporales_si_falla(tmp_path, monkeypatch):
+    def version(db):
+        raise RuntimeError("sin base de datos")
+
+    monkeypatch.setitem(trabajos_reportes.TIPOS, "prueba", (version, None))
+    ruta = os.path.join(tmp_path, "prueba-x.pdf")
+    antes = _descriptores()
+
+    for _ in range(5):
+        with pytest.raises(RuntimeError):
+            trabajos_reportes._renderizar("prueba", {}, ruta, 0)
+
+    assert _descriptores() == antes
+    assert os.listdir(tmp_path) == []
+
+
+def test_renderizar_rechaza_datos_anteriores_al_trabajo(tmp_path, monkeypatch):
+    monkeypatch.setitem(trabajos_reportes.TIPOS, "prueba", (lambda db: 3, None))
+    antes = _descriptores()
+
+    with pytest.raises(RuntimeError, match="versión 3"):
+        trabajos_reportes._renderizar("prueba", {}, os.path.join(tmp_path, "prueba-x.pdf"), 4)
+
+    assert _descriptores() == antes
+    assert os.listdir(tmp_path) == []
+
+
+def test_renderizar_devuelve_la_version_leida(tmp_path, monkeypatch):
+    def renderizar(db, archivo):
+        archivo.write(b"%PDF")
+        return True
+
+    monkeypatch.setitem(trabajos_reportes.TIPOS, "prueba", (lambda db: 7, renderizar))
+    ruta = os.path.join(tmp_path, "prueba-x.pdf")
+
+    assert trabajos_reportes._renderizar("prueba", {}, ruta, 5) == 7
+    assert os.listdir(tmp_path) == ["prueba-x.pdf"]